@@ -1,140 +1,273 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, jsonify, send_file
 import os
+import csv
+import sys
+import time
 import pandas as pd
 import json
 import threading
+import queue
+import subprocess
 from datetime import datetime
-import importlib
+from journal import journal_path_for
+from ledger import StreamingCsvLedger
+from contact_import import save_upload, read_header, start_contacts_file, merge_contacts
+from status_cache import CsvStatusCache, SqliteStatusCache
+from events import bus, emit, format_sse
+from campaign_state import CampaignState
+import metrics
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = '.'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# Contact lists are saved and merged in chunks, so this only bounds a request
+MAX_UPLOAD_MB = 1024
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
 
 EMAILS_FILE = 'emails.csv'
 PDF_FILE = 'attachment.pdf'
 CREDENTIALS_FILE = 'credentials.json'
 
-# Global state for background campaign
-campaign_running = False
-last_campaign_stats = {}
+# Campaigns run in their own process (campaign_worker.py), so any number of
+# dashboard workers can serve requests; they share the campaign state
+CAMPAIGN_WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'campaign_worker.py')
+campaign_state = None
 
-def run_campaign_wrapper():
-    global campaign_running, last_campaign_stats
+# Dashboard counters, answered from memory while the ledger is unchanged
+status_cache = None
+status_lock = threading.Lock()
+
+# Seconds between snapshots on an idle /api/events stream (also a keepalive)
+EVENTS_HEARTBEAT_SECONDS = 30
+# Seconds between checks for events logged by the campaign process
+EVENTS_POLL_SECONDS = 1
+
+def get_campaign_state():
+    """The shared campaign state (reopened if its files are reconfigured)."""
+    global campaign_state
     import send_emails as se
-    importlib.reload(se)
-    
-    try:
-        print("Starting campaign thread...")
-        last_campaign_stats = se.run_campaign()
-    except Exception as e:
-        print(f"Campaign thread error: {e}")
-        last_campaign_stats = {"error": str(e), "message": f"Critical Error: {str(e)}"}
-    finally:
-        campaign_running = False
-        print("Campaign thread finished.")
+    if campaign_state is None or campaign_state.db_path != se.CAMPAIGN_STATE_DB \
+            or campaign_state.lock.path != se.CAMPAIGN_LOCK_FILE:
+        campaign_state = CampaignState(se.CAMPAIGN_STATE_DB, se.CAMPAIGN_LOCK_FILE)
+    return campaign_state
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/api/status', methods=['GET'])
-def get_status():
-    if os.path.exists(EMAILS_FILE):
+def get_status_cache():
+    """Process-wide counters for the configured ledger (rebuilt if the backend changes)."""
+    global status_cache
+    import send_emails as se
+    if se.STORAGE_BACKEND == 'sqlite':
+        if not isinstance(status_cache, SqliteStatusCache) or status_cache.db_path != se.LEDGER_DB_FILE:
+            status_cache = SqliteStatusCache(se.open_ledger, se.LEDGER_DB_FILE)
+    elif not isinstance(status_cache, CsvStatusCache) or status_cache.csv_path != se.EMAILS_FILE:
+        status_cache = CsvStatusCache(se.EMAILS_FILE)
+    return status_cache
+
+def status_payload():
+    import send_emails as se
+    if se.contacts_exist():
         try:
-            df = pd.read_csv(EMAILS_FILE)
-            
-            # Normalize headers
-            df.columns = [c.strip().lower().replace(' ', '_').replace('-', '_') for c in df.columns]
-            
-            # Ensure columns exist
-            if 'status' not in df.columns:
-                df['status'] = 'pending'
-            if 'follow_up_status' not in df.columns:
-                df['follow_up_status'] = 'pending'
-                
-            total = len(df)
-            pending = len(df[df['status'] == 'pending'])
-            sent = len(df[df['status'] == 'sent'])
-            failed = len(df[df['status'] == 'failed'])
-            sent_followups = len(df[df['follow_up_status'] == 'sent'])
+            with status_lock:
+                counts = get_status_cache().get()
+            total = counts['total']
+            pending = counts['pending']
+            sent = counts['sent']
+            failed = counts['failed']
+            sent_followups = counts['sent_followups']
+            replied = counts['replied']
+            bounced = counts['bounced']
         except:
-            total = 0; pending = 0; sent = 0; failed = 0; sent_followups = 0
+            total = 0; pending = 0; sent = 0; failed = 0; sent_followups = 0; replied = 0; bounced = 0
     else:
-        total = 0; pending = 0; sent = 0; failed = 0; sent_followups = 0
+        total = 0; pending = 0; sent = 0; failed = 0; sent_followups = 0; replied = 0; bounced = 0
         
-    return jsonify({
+    return {
         'total': total,
         'pending': pending,
         'sent': sent,
         'failed': failed,
         'sent_followups': sent_followups,
+        'replied': replied,
+        'bounced': bounced,
         'has_pdf': os.path.exists(PDF_FILE),
         'has_credentials': os.path.exists(CREDENTIALS_FILE),
         'has_token': os.path.exists('token.json'),
-        'is_running': campaign_running
-    })
+        'is_running': get_campaign_state().is_running()
+    }
 
-@app.route('/api/mode', methods=['GET'])
-def get_mode():
+# Upcoming sending windows listed by /api/mode
+MODE_UPCOMING_WINDOWS = 6
+
+def window_payload(window):
+    if window is None:
+        return None
+    return {'kind': window.kind, 'start': window.start.isoformat(), 'end': window.end.isoformat()}
+
+def mode_payload():
     current_time = datetime.now()
-    current_weekday = current_time.weekday()
     
     mode = "none"
+    window = None
+    upcoming = []
+    next_opening = None
     try:
         import send_emails as se
-        # We don't reload here every time to save perf, mostly valid
-        if current_weekday in se.ALLOWED_NEW_EMAIL_DAYS:
-            mode = "new"
-        elif current_weekday in se.ALLOWED_FOLLOWUP_DAYS:
-            mode = "followup"
+        calendar = se.get_send_calendar()
+        mode = calendar.day_kind(current_time.weekday()) or "none"
+        window = calendar.current(current_time)
+        upcoming = calendar.upcoming(current_time, count=MODE_UPCOMING_WINDOWS)
+        opening = calendar.next_opening(current_time)
+        next_opening = calendar.describe(opening, current_time) if opening else None
     except:
         mode = "error"
-        
-    return jsonify({
+
+    state = get_campaign_state()
+    return {
         'mode': mode,
         'day': current_time.strftime('%A'),
-        'details': last_campaign_stats.get('message', '') if not campaign_running else "Running..."
-    })
+        'window': window_payload(window),
+        'next_window': next_opening,
+        'upcoming_windows': [window_payload(w) for w in upcoming],
+        'details': state.get('last_stats', {}).get('message', '') if not state.is_running() else "Running..."
+    }
+
+@app.route('/api/status', methods=['GET'])
+def get_status():
+    return jsonify(status_payload())
+
+@app.route('/api/mode', methods=['GET'])
+def get_mode():
+    return jsonify(mode_payload())
+
+@app.route('/api/forecast', methods=['GET'])
+def get_forecast():
+    """Projected sends per day and completion date for the current list (?days= caps the horizon)."""
+    import forecast
+    import send_emails as se
+    try:
+        days = min(request.args.get('days', forecast.FORECAST_MAX_DAYS, type=int), forecast.FORECAST_MAX_DAYS)
+        pending_new = None
+        # The CSV counters are already kept for /api/status
+        if se.STORAGE_BACKEND != 'sqlite' and se.contacts_exist():
+            with status_lock:
+                pending_new = get_status_cache().get()['pending']
+        return jsonify(forecast.forecast_campaign(max_days=max(days, 1), pending_new=pending_new))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics')
+def get_metrics():
+    """Send-path latencies, error counts and capacity in the Prometheus text format.
+
+    The send-path figures are the campaign process's latest snapshot.
+    """
+    state = get_campaign_state()
+    metrics.registry.restore(state.get('metrics', {}))
+    status = status_payload()
+    for name in ('pending', 'sent', 'failed', 'sent_followups', 'replied', 'bounced'):
+        metrics.contacts.set(status[name], status=name)
+    metrics.campaign_running.set(1 if status['is_running'] else 0)
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/events')
+def events():
+    """Server-Sent Events stream of campaign progress.
+
+    Sends a status/mode snapshot on connect, after every campaign event and
+    every EVENTS_HEARTBEAT_SECONDS while idle.
+    """
+    def stream():
+        q = bus.subscribe()
+        try:
+            yield format_sse('snapshot', {'status': status_payload(), 'mode': mode_payload()})
+            while True:
+                try:
+                    event = q.get(timeout=EVENTS_HEARTBEAT_SECONDS)
+                    yield format_sse(event['type'], event)
+                except queue.Empty:
+                    pass
+                yield format_sse('snapshot', {'status': status_payload(), 'mode': mode_payload()})
+        finally:
+            bus.unsubscribe(q)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/templates', methods=['GET'])
 def get_templates():
     try:
         import send_emails as se
-        importlib.reload(se)
-        return jsonify({
-            'new_email_templates': se.EMAIL_TEMPLATES,
-            'followup_templates': se.FOLLOW_UP_TEMPLATES
-        })
+        return jsonify(se.get_config().templates_payload())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/send-emails', methods=['POST'])
 def send_emails():
-    global campaign_running
-    
-    if campaign_running:
+    # Atomic across dashboard workers: only one request gets to start a run
+    if not get_campaign_state().request_start():
         return jsonify({'error': 'Campaign is already running!'}), 400
-        
-    campaign_running = True
-    
-    thread = threading.Thread(target=run_campaign_wrapper)
-    thread.daemon = True
-    thread.start()
+
+    proc = subprocess.Popen([sys.executable, CAMPAIGN_WORKER], cwd=os.getcwd())
+    # Reap the process when it exits; its progress arrives through the campaign state
+    threading.Thread(target=proc.wait, daemon=True).start()
     
     return jsonify({
         'message': 'Campaign started in background! Check status for updates.',
         'started': True
     })
 
+def open_import_ledger(se, upload_path):
+    """The ledger an uploaded list is merged into (emails.csv is started from it if missing)."""
+    if se.STORAGE_BACKEND == 'sqlite':
+        return se.open_ledger()
+    if not os.path.exists(se.EMAILS_FILE):
+        # A journal without its list refers to rows that no longer exist
+        if os.path.exists(journal_path_for(se.EMAILS_FILE)):
+            os.remove(journal_path_for(se.EMAILS_FILE))
+        start_contacts_file(se.EMAILS_FILE, read_header(upload_path))
+    # Appends stream to the file whichever CSV backend is configured
+    return StreamingCsvLedger(se.EMAILS_FILE, se.get_config().follow_up_days, fsync=se.JOURNAL_FSYNC)
+
 # Upload Endpoints
 @app.route('/api/upload-csv', methods=['POST'])
 def upload_csv():
+    """Merge an uploaded contact list into the ledger.
+
+    New addresses are appended; contacts already in the list keep their
+    send and follow-up history.
+    """
     if 'file' not in request.files: return jsonify({'error': 'No file'}), 400
     file = request.files['file']
     if file.filename == '': return jsonify({'error': 'No file selected'}), 400
     if file and file.filename.endswith('.csv'):
-        file.save(EMAILS_FILE)
-        return jsonify({'success': True})
+        # The run lock is held for the whole merge, so no campaign can load
+        # the list meanwhile and write its old copy back afterwards
+        state = get_campaign_state()
+        if state.is_running() or not state.lock.acquire():
+            return jsonify({'error': 'Cannot import contacts while a campaign is running'}), 409
+        import send_emails as se
+        upload_path = se.EMAILS_FILE + '.upload'
+        try:
+            save_upload(file.stream, upload_path)
+            read_header(upload_path)
+            ledger = open_import_ledger(se, upload_path)
+            try:
+                stats = merge_contacts(upload_path, ledger)
+            finally:
+                ledger.close()
+        except (ValueError, csv.Error, UnicodeDecodeError) as e:
+            return jsonify({'error': f'Invalid CSV: {e}'}), 400
+        finally:
+            if os.path.exists(upload_path):
+                os.remove(upload_path)
+            state.lock.release()
+        emit('ledger_changed')
+        message = (f"Added {stats['added']} new contacts ({stats['duplicates']} already in the list, "
+                   f"{stats['invalid']} invalid rows skipped)")
+        print(f"📥 {message}")
+        return jsonify({'success': True, 'message': message, **stats})
     return jsonify({'error': 'Invalid file'}), 400
 
 @app.route('/api/upload-pdf', methods=['POST'])
@@ -184,7 +317,6 @@ def send_test_email():
         
     try:
         import send_emails as se
-        importlib.reload(se)
         
         # Authenticate
         service = se.authenticate_gmail()
@@ -192,12 +324,11 @@ def send_test_email():
             return jsonify({'error': 'Authentication failed. Check credentials/token.'}), 400
             
         # Get Sender
-        profile = service.users().getProfile(userId='me').execute()
-        sender_email = profile['emailAddress']
+        sender_email = se.gmail_auth.get_sender_profile(service)['emailAddress']
         
         # Get Template
-        subject, body_template = se.get_random_template()
-        body = body_template.format(name="Test User")
+        [(subject, body)] = se.render_batch(se.get_compiled_templates('new'),
+                                            [{'name': 'Test User', 'email': test_email}])
         
         # Create Message (No PDF for safety test, or maybe yes?)
         # Let's attach PDF if it exists to test that too
@@ -214,6 +345,33 @@ def send_test_email():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def warm_gmail_service():
+    """Build the Gmail service and sender profile ahead of the first request."""
+    import send_emails as se
+    try:
+        service = se.authenticate_gmail(interactive=False)
+        if service:
+            se.gmail_auth.get_sender_profile(service)
+    except Exception as e:
+        print(f"Gmail warm-up skipped: {e}")
+
+def relay_campaign_events():
+    """Pass events logged by campaign processes to this process's /api/events streams."""
+    last_id = None
+    while True:
+        try:
+            state = get_campaign_state()
+            if last_id is None:
+                last_id = state.last_event_id()
+            for last_id, event in state.events_after(last_id):
+                bus.deliver(event)
+        except Exception as e:
+            print(f"Event relay error: {e}")
+        time.sleep(EVENTS_POLL_SECONDS)
+
+threading.Thread(target=warm_gmail_service, daemon=True).start()
+threading.Thread(target=relay_campaign_events, daemon=True).start()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     print("🚀 Server starting on http://localhost:5000")
@@ -0,0 +1,46 @@
+import os
+import base64
+import hashlib
+import threading
+from io import BytesIO
+from email.generator import BytesGenerator
+from email.mime.base import MIMEBase
+
+# path -> (mtime_ns, size, sha256, serialized MIME part)
+_cache = {}
+# (sha256, filename) -> serialized MIME part, so a touched-but-unchanged file
+# is hashed again but not re-encoded
+_by_hash = {}
+_lock = threading.Lock()
+
+
+def _serialize_part(data, filename):
+    """Encode an attachment once into its final MIME bytes (headers + base64 body)."""
+    part = MIMEBase('application', 'octet-stream')
+    part.set_payload(base64.encodebytes(data).decode('ascii'))  # 76-char lines
+    part['Content-Transfer-Encoding'] = 'base64'
+    part.add_header('Content-Disposition', f'attachment; filename= {filename}')
+    buffer = BytesIO()
+    BytesGenerator(buffer, mangle_from_=False).flatten(part)
+    return buffer.getvalue()
+
+
+def get_attachment_bytes(path):
+    """Serialized MIME part for `path`, re-read and re-encoded only when the file changes."""
+    st = os.stat(path)
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[3]
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        key = (digest, os.path.basename(path))
+        part = _by_hash.get(key)
+        if part is None:
+            part = _serialize_part(data, key[1])
+            _by_hash.clear()  # Keep only the current attachment's encoding
+            _by_hash[key] = part
+        _cache[path] = (st.st_mtime_ns, st.st_size, digest, part)
+        return part
@@ -1,9 +1,13 @@
 import time
-import schedule
 import send_emails as se
+import campaign_worker
 from datetime import datetime
 import logging
 
+# Longest single sleep; the calendar is re-read after each one, so config
+# changes and clock jumps are picked up
+MAX_SLEEP_SECONDS = 3600
+
 # Setup Logging
 logging.basicConfig(
     filename='automation.log',
@@ -15,7 +19,7 @@ print("=" * 60)
 print("🤖 AUTO-PILOT ACTIVATED: Email Automation")
 print("=" * 60)
 print("✓ This script will run seamlessly in the background.")
-print("✓ It checks the schedule every day at 10:00 AM.")
+print("✓ It runs in every sending window (see campaign_config.json) and sleeps in between.")
 print("✓ Keep this terminal OPEN (minimized is fine).")
 print("=" * 60)
 
@@ -23,17 +27,17 @@ def job():
     print(f"\n⏰ Checking schedule for {datetime.now().strftime('%A, %Y-%m-%d')}...")
     logging.info("Checking schedule...")
     
-    # Reload config to ensure latest templates/settings
-    import importlib
-    importlib.reload(se)
-    
-    # Run the campaign
+    # Run the campaign (it reads campaign_config.json if it changed since the last run)
     # The run_campaign function handles all logic (Day checks, Time windows, Limits)
     try:
-        stats = se.run_campaign()
+        # Holds the same run lock as campaigns started from the dashboard
+        stats = campaign_worker.run_campaign_exclusive()
         
         # Log result
-        if stats.get('mode') != 'none':
+        if stats is None:
+            print("⏸ A dashboard campaign or contact import is running; skipping this window.")
+            logging.info("Skipped: another campaign or an import is running.")
+        elif stats.get('mode') != 'none':
             log_msg = f"Campaign Completed. Sent: {stats.get('sent_new', 0)} new, {stats.get('sent_followup', 0)} follow-ups."
             print(f"✅ {log_msg}")
             logging.info(log_msg)
@@ -46,31 +50,48 @@ def job():
         print(f"❌ {err_msg}")
         logging.error(err_msg)
 
-# Schedule the job to run every day at 10:01 AM (Just inside the 9:30-10:30 window)
-schedule.every().day.at("10:01").do(job)
-
-# Also run once immediately on startup if it's within a window? 
-# Better to be safe and just wait for the schedule, or ask the user.
-# We will run a quick check on startup to show status.
-
 def check_status_on_start():
     print("ℹ️  Current System Status:")
-    today = datetime.now().weekday()
-    if today in se.ALLOWED_NEW_EMAIL_DAYS:
+    calendar = se.get_send_calendar()
+    kind = calendar.day_kind(datetime.now().weekday())
+    if kind == 'new':
         print("   • Today is a New Email Day.")
-    elif today in se.ALLOWED_FOLLOWUP_DAYS:
+    elif kind == 'followup':
         print("   • Today is a Follow-up Day.")
     else:
         print("   • Today is a Rest Day.")
-    print(f"   • Next run scheduled for 10:01 AM.")
+    print(f"   • Next window: {se.get_next_allowed_time()}.")
+
+def sleep_until_next_window(last_window):
+    """Sleep until the next window opens (at most MAX_SLEEP_SECONDS at a time).
+
+    Returns the window open now if there is one that has not run yet.
+    """
+    calendar = se.get_send_calendar()
+    now = datetime.now()
+    window = calendar.current(now)
+    if window is not None and window != last_window:
+        return window
+    upcoming = calendar.next_opening(now)
+    if upcoming is None:
+        time.sleep(MAX_SLEEP_SECONDS)
+        return None
+    wait = (upcoming.start - now).total_seconds()
+    print(f"💤 Next window: {calendar.describe(upcoming, now)} ({upcoming.kind}); sleeping {wait / 60:.0f} min.")
+    time.sleep(min(wait, MAX_SLEEP_SECONDS))
+    return None
 
-# Run the job immediately on startup to catch any current valid windows
-job()
+check_status_on_start()
 
+# Each window runs once: the campaign stops at the window's end or once the
+# window's share of what is left of today's cap is sent
+last_window = None
 while True:
     try:
-        schedule.run_pending()
-        time.sleep(60) # Check every minute
+        window = sleep_until_next_window(last_window)
+        if window is not None:
+            last_window = window
+            job()
     except KeyboardInterrupt:
         print("\n🛑 Auto-pilot stopped by user.")
         break
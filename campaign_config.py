@@ -0,0 +1,190 @@
+import os
+import re
+import json
+import threading
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType
+from templating import TemplateError, compile_templates
+
+# Campaign settings (limits, schedule, templates) edited without touching code
+CONFIG_FILE = 'campaign_config.json'
+
+_WINDOW_PATTERN = re.compile(r'(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})')
+
+
+class ConfigError(ValueError):
+    """The config file is missing, unreadable or has an invalid setting."""
+
+
+@dataclass(frozen=True)
+class CampaignConfig:
+    """One validated, read-only snapshot of campaign_config.json.
+
+    A campaign takes a snapshot when it starts and uses it to the end, so
+    edits to the file only apply from the next run. Templates and merge
+    field defaults are read-only mappings.
+    """
+
+    # Sending limits (the Gmail-safe defaults apply to keys left out)
+    max_emails_per_day: int = 20
+    max_emails_per_hour: int = 5
+    min_delay_seconds: int = 180
+    max_delay_seconds: int = 300
+    batch_size: int = 5
+    batch_break_minutes: int = 15
+    batched_send_enabled: bool = False
+    batch_send_size: int = 5
+    # Schedule: weekdays (Monday is 0) and (start_h, start_m, end_h, end_m) windows
+    allowed_new_email_days: tuple = (1, 2, 3)
+    allowed_followup_days: tuple = (0, 4)
+    time_windows: tuple = ((9, 30, 10, 30), (12, 30, 14, 0), (17, 30, 19, 0))
+    # Follow-ups
+    follow_up_days: int = 3
+    follow_up_enabled: bool = True
+    # Content
+    merge_field_defaults: MappingProxyType = field(default_factory=lambda: MappingProxyType({'name': 'there'}))
+    email_templates: tuple = ()
+    follow_up_templates: tuple = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        """Validate the parsed JSON; raises ConfigError naming the bad setting."""
+        if not isinstance(data, dict):
+            raise ConfigError("The config file must hold a JSON object")
+        known = {f.name for f in fields(cls)}
+        unknown = sorted(set(data) - known)
+        if unknown:
+            raise ConfigError(f"Unknown setting(s): {', '.join(unknown)}")
+
+        values = {}
+        for name in ('max_emails_per_day', 'max_emails_per_hour', 'min_delay_seconds', 'max_delay_seconds',
+                     'batch_break_minutes', 'follow_up_days'):
+            if name in data:
+                values[name] = _integer(data, name, minimum=0)
+        for name in ('batch_size', 'batch_send_size'):
+            if name in data:
+                values[name] = _integer(data, name, minimum=1)
+        for name in ('batched_send_enabled', 'follow_up_enabled'):
+            if name in data:
+                if not isinstance(data[name], bool):
+                    raise ConfigError(f"'{name}' must be true or false")
+                values[name] = data[name]
+        for name in ('allowed_new_email_days', 'allowed_followup_days'):
+            if name in data:
+                values[name] = _weekdays(data, name)
+        if 'time_windows' in data:
+            values['time_windows'] = _time_windows(data['time_windows'])
+        if 'merge_field_defaults' in data:
+            defaults = data['merge_field_defaults']
+            if not isinstance(defaults, dict) or not all(isinstance(v, str) for v in defaults.values()):
+                raise ConfigError("'merge_field_defaults' must map field names to text")
+            values['merge_field_defaults'] = MappingProxyType(dict(defaults))
+        for name in ('email_templates', 'follow_up_templates'):
+            values[name] = _templates(data, name)
+
+        config = cls(**values)
+        if config.max_delay_seconds < config.min_delay_seconds:
+            raise ConfigError("'max_delay_seconds' must not be less than 'min_delay_seconds'")
+        for name in ('email_templates', 'follow_up_templates'):
+            try:
+                compile_templates(getattr(config, name), config.merge_field_defaults)
+            except TemplateError as e:
+                raise ConfigError(f"'{name}': {e}") from e
+        return config
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            raise ConfigError(f"{path} not found") from None
+        except ValueError as e:
+            raise ConfigError(f"{path} is not valid JSON: {e}") from e
+        return cls.from_dict(data)
+
+    def templates_payload(self):
+        """The templates as plain dicts, for JSON responses."""
+        return {'new_email_templates': [dict(t) for t in self.email_templates],
+                'followup_templates': [dict(t) for t in self.follow_up_templates]}
+
+
+def _integer(data, name, minimum):
+    value = data[name]
+    if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+        raise ConfigError(f"'{name}' must be a whole number of at least {minimum}")
+    return value
+
+
+def _weekdays(data, name):
+    days = data[name]
+    if not isinstance(days, list) or not all(isinstance(d, int) and 0 <= d <= 6 for d in days):
+        raise ConfigError(f"'{name}' must be a list of weekdays from 0 (Monday) to 6 (Sunday)")
+    return tuple(days)
+
+
+def _time_windows(windows):
+    """["9:30-10:30", ...] -> ((9, 30, 10, 30), ...)."""
+    if not isinstance(windows, list):
+        raise ConfigError("'time_windows' must be a list like [\"9:30-10:30\"]")
+    parsed = []
+    for window in windows:
+        match = _WINDOW_PATTERN.fullmatch(window.strip()) if isinstance(window, str) else None
+        if match is None:
+            raise ConfigError(f"Time window {window!r} must look like \"9:30-10:30\"")
+        start_h, start_m, end_h, end_m = (int(part) for part in match.groups())
+        if start_h > 23 or end_h > 23 or start_m > 59 or end_m > 59 or (start_h, start_m) >= (end_h, end_m):
+            raise ConfigError(f"Time window {window!r} must start before it ends, within one day")
+        parsed.append((start_h, start_m, end_h, end_m))
+    return tuple(sorted(parsed))
+
+
+def _templates(data, name):
+    templates = data.get(name)
+    if not isinstance(templates, list) or not templates:
+        raise ConfigError(f"'{name}' needs at least one {{\"subject\", \"body\"}} template")
+    for template in templates:
+        if not isinstance(template, dict) or not isinstance(template.get('subject'), str) \
+                or not isinstance(template.get('body'), str):
+            raise ConfigError(f"Every template in '{name}' needs a text \"subject\" and \"body\"")
+    return tuple(MappingProxyType({'subject': t['subject'], 'body': t['body']}) for t in templates)
+
+
+class ConfigStore:
+    """The current CampaignConfig for a file, re-read only when the file changes.
+
+    get() costs one os.stat() while the file is unchanged. If an edit makes
+    the file invalid, the last good config stays in use and the problem is
+    kept in `error` until the file is fixed.
+    """
+
+    def __init__(self, path=CONFIG_FILE):
+        self.path = path
+        self.error = None
+        self._config = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self):
+        """The current config; raises ConfigError only if no valid config was ever loaded."""
+        signature = self._file_signature()
+        with self._lock:
+            if signature != self._signature or self._config is None and self.error is None:
+                self._signature = signature
+                try:
+                    self._config = CampaignConfig.load(self.path)
+                    self.error = None
+                except ConfigError as e:
+                    self.error = str(e)
+                    if self._config is not None:
+                        print(f"⚠️ {e}. Keeping the previous settings.")
+            if self._config is None:
+                raise ConfigError(self.error)
+            return self._config
@@ -0,0 +1,196 @@
+import json
+import time
+import sqlite3
+import threading
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# A start request counts as running this long before its worker takes the lock
+START_TIMEOUT_SECONDS = 60
+# Seconds a campaign process retries the lock (status probes hold it briefly)
+LOCK_WAIT_SECONDS = 5
+# Campaign events kept for dashboards in other processes
+EVENT_LOG_SIZE = 1000
+
+
+class RunLock:
+    """An exclusive lock on a file, held for a whole campaign run or contact import.
+
+    The OS drops it when the holding process exits, so a crashed campaign
+    never leaves a stale lock behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        # Threads of one process share the lock object
+        self._thread_lock = threading.Lock()
+
+    def _try_lock(self):
+        f = open(self.path, 'a+')
+        try:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def acquire(self, wait_seconds=0):
+        """Take the lock, retrying for up to `wait_seconds`; False if another process holds it."""
+        deadline = time.monotonic() + wait_seconds
+        while not self._locked(self._try_lock):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def _locked(self, fn):
+        with self._thread_lock:
+            return fn()
+
+    def _release(self):
+        if self._file is None:
+            return
+        if not fcntl:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+    def release(self):
+        self._locked(self._release)
+
+    def _probe(self):
+        if self._file is not None:
+            return True
+        if not self._try_lock():
+            return True
+        self._release()
+        return False
+
+    def is_held(self):
+        """Whether any process (this one included) holds the lock."""
+        return self._locked(self._probe)
+
+
+class CampaignState:
+    """Campaign status, last results and recent events, shared by every process.
+
+    Dashboard workers, the campaign process and the autopilot all read and
+    write the same SQLite file, so any gunicorn worker answers /api/status
+    correctly and can stream events from a campaign running elsewhere.
+    Whether a campaign is running is decided by the RunLock, not by the
+    stored status, which only covers the moment between a start request
+    and its process taking the lock.
+    """
+
+    def __init__(self, db_path, lock_path):
+        self.db_path = db_path
+        self.lock = RunLock(lock_path)
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS events '
+                         '(id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT, data TEXT)')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # One short-lived connection per call, so any thread can use the store
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _get(self, conn, key, default=None):
+        row = conn.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set(self, conn, **values):
+        conn.executemany('INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)',
+                         [(key, json.dumps(value, default=str)) for key, value in values.items()])
+
+    def get(self, key, default=None):
+        conn = self._connect()
+        try:
+            return self._get(conn, key, default)
+        finally:
+            conn.close()
+
+    def set(self, **values):
+        conn = self._connect()
+        try:
+            self._set(conn, **values)
+        finally:
+            conn.close()
+
+    def _running(self, conn):
+        if self.lock.is_held():
+            return True
+        return (self._get(conn, 'status') == 'starting'
+                and time.time() - self._get(conn, 'requested_at', 0) < START_TIMEOUT_SECONDS)
+
+    def is_running(self):
+        conn = self._connect()
+        try:
+            return self._running(conn)
+        finally:
+            conn.close()
+
+    def request_start(self):
+        """Mark a campaign as starting unless one is already running; False if it is.
+
+        Atomic across processes, so two workers handling simultaneous start
+        requests cannot both launch a campaign.
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            if self._running(conn):
+                conn.execute('ROLLBACK')
+                return False
+            self._set(conn, status='starting', requested_at=time.time())
+            conn.execute('COMMIT')
+            return True
+        finally:
+            conn.close()
+
+    def append_event(self, event):
+        conn = self._connect()
+        try:
+            cursor = conn.execute('INSERT INTO events (type, data) VALUES (?, ?)',
+                                  (event['type'], json.dumps(event, default=str)))
+            if cursor.lastrowid % 100 == 0:
+                conn.execute('DELETE FROM events WHERE id <= ?', (cursor.lastrowid - EVENT_LOG_SIZE,))
+        finally:
+            conn.close()
+
+    def events_after(self, event_id):
+        """[(id, event)] logged after `event_id`, oldest first."""
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT id, data FROM events WHERE id > ? ORDER BY id', (event_id,)).fetchall()
+        finally:
+            conn.close()
+        return [(row_id, json.loads(data)) for row_id, data in rows]
+
+    def last_event_id(self):
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+        finally:
+            conn.close()
+
+
+def open_state():
+    """The CampaignState for send_emails' configured files."""
+    import send_emails as se
+    return CampaignState(se.CAMPAIGN_STATE_DB, se.CAMPAIGN_LOCK_FILE)
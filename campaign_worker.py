@@ -0,0 +1,62 @@
+import os
+import time
+import send_emails as se
+import metrics
+from events import bus, emit
+from campaign_state import open_state, LOCK_WAIT_SECONDS
+
+# Seconds between metric snapshots published for the dashboard's /metrics
+METRICS_SNAPSHOT_SECONDS = 5
+
+
+def run_campaign_exclusive(transport=None, clock=se.SYSTEM_CLOCK, wait_seconds=LOCK_WAIT_SECONDS):
+    """Run one campaign while holding the run lock and return its stats.
+
+    Returns None without sending if another process is running a campaign
+    or importing contacts. Progress events go to the shared campaign state
+    as well as this process's bus, so any dashboard worker can stream them;
+    the metrics are snapshotted there too.
+    """
+    state = open_state()
+    if not state.lock.acquire(wait_seconds):
+        print("⏸ Another campaign or a contact import is running.")
+        return None
+
+    # Counters carry on from earlier runs instead of restarting at zero
+    metrics.registry.restore(state.get('metrics', {}))
+    last_snapshot = [0.0]
+
+    def forward(event):
+        state.append_event(event)
+        if time.monotonic() - last_snapshot[0] >= METRICS_SNAPSHOT_SECONDS:
+            last_snapshot[0] = time.monotonic()
+            state.set(metrics=metrics.registry.state())
+
+    bus.add_listener(forward)
+    stats = {}
+    try:
+        state.set(status='running', pid=os.getpid(), started_at=time.time())
+        metrics.campaign_running.set(1)
+        print("Starting campaign...")
+        try:
+            # Settings are taken once here; edits apply from the next run
+            stats = se.run_campaign(transport, clock, config=se.get_config())
+        except Exception as e:
+            print(f"Campaign error: {e}")
+            stats = {"error": str(e), "message": f"Critical Error: {str(e)}"}
+        metrics.campaign_running.set(0)
+        state.set(status='idle', last_stats=stats, finished_at=time.time(), metrics=metrics.registry.state())
+    finally:
+        # Released before campaign_finished, so status read on that event shows it stopped
+        state.lock.release()
+        try:
+            emit('campaign_finished', stats=stats)
+        finally:
+            bus.remove_listener(forward)
+    print("Campaign finished.")
+    return stats
+
+
+if __name__ == '__main__':
+    # Started by the dashboard (POST /api/send-emails) in its own process
+    run_campaign_exclusive()
@@ -0,0 +1,200 @@
+import os
+import re
+import csv
+import math
+import itertools
+import numpy as np
+import pandas as pd
+from ledger import STATUS_DEFAULTS, normalize_column
+
+# Bytes copied at a time when saving an upload to disk
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# New contacts appended to the ledger at a time
+MERGE_BATCH_ROWS = 10000
+# From this many contacts (ledger + upload) on, known addresses are tracked
+# in a Bloom filter instead of a set of every address
+BLOOM_FILTER_MIN_CONTACTS = 1000000
+BLOOM_FILTER_ERROR_RATE = 0.001
+
+_EMAIL_PATTERN = re.compile(r'[^@\s<>,;"]+@[^@\s<>,;"]+\.[^@\s<>,;"]+')
+# pandas hash_array keys for the Bloom filter's two hash functions
+_HASH_KEYS = ('bloomfilterkey01', 'bloomfilterkey02')
+
+
+def normalize_email(value):
+    """Trimmed, lower-cased address, or None if it does not look like one."""
+    email = (value or '').strip().lower().removeprefix('mailto:')
+    return email if _EMAIL_PATTERN.fullmatch(email) else None
+
+
+def _email_keys(values):
+    """Match keys for addresses already in the ledger: normalized, but not validated."""
+    return [value.strip().lower().removeprefix('mailto:') for value in values if isinstance(value, str)]
+
+
+def save_upload(stream, path, chunk_bytes=UPLOAD_CHUNK_BYTES):
+    """Copy an uploaded file to `path` one chunk at a time; returns the bytes written."""
+    tmp_path = path + '.part'
+    written = 0
+    with open(tmp_path, 'wb') as f:
+        while True:
+            chunk = stream.read(chunk_bytes)
+            if not chunk:
+                break
+            f.write(chunk)
+            written += len(chunk)
+    os.replace(tmp_path, path)
+    return written
+
+
+def read_header(path):
+    """The upload's header row; raises ValueError if it has no email column."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        header = next(csv.reader(f), [])
+    if 'email' not in (normalize_column(c) for c in header):
+        raise ValueError("The CSV needs an 'Email' column")
+    return header
+
+
+def start_contacts_file(csv_path, header):
+    """Create an empty contacts CSV with the upload's header (first upload)."""
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f, lineterminator='\n').writerow(header)
+
+
+def _count_lines(path, chunk_bytes=UPLOAD_CHUNK_BYTES):
+    lines = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_bytes)
+            if not chunk:
+                return lines
+            lines += chunk.count(b'\n')
+
+
+class BloomFilter:
+    """Approximate set of strings: no false negatives, `error_rate` false positives.
+
+    At the default 0.1% error rate it takes about 1.8 bytes per item, against
+    ~100 for a set of address strings. Items are added and tested in batches.
+    """
+
+    def __init__(self, capacity, error_rate=BLOOM_FILTER_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, items):
+        # Double hashing: k bit positions per item from two 64-bit hashes
+        values = np.asarray(list(items), dtype=object)
+        h1 = pd.util.hash_array(values, hash_key=_HASH_KEYS[0])
+        h2 = pd.util.hash_array(values, hash_key=_HASH_KEYS[1]) | np.uint64(1)
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        return (h1[:, None] + steps * h2[:, None]) % np.uint64(self.size)
+
+    def update(self, items):
+        positions = self._positions(items).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3),
+                         np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+
+    def contains(self, items):
+        """One bool per item: False means definitely not added."""
+        positions = self._positions(items)
+        if not positions.size:
+            return []
+        bits = self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)
+        return (bits & 1).all(axis=1).tolist()
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def upload_rows(path, stats=None):
+    """Valid contacts from an uploaded CSV, one dict per row keyed by normalized column.
+
+    Emails are normalized; rows without a usable address or with more cells
+    than the header are skipped (and counted in stats['invalid']). Blank
+    status cells get the ledger defaults.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        columns = [normalize_column(c) for c in next(reader, [])]
+        for values in reader:
+            if not any(value.strip() for value in values):
+                continue  # Blank line
+            email = None
+            if not any(value.strip() for value in values[len(columns):]):
+                row = dict(zip(columns, (value.strip() for value in values)))
+                email = normalize_email(row.get('email'))
+            if email is None:
+                if stats is not None:
+                    stats['invalid'] += 1
+                continue
+            row['email'] = email
+            for column, default in STATUS_DEFAULTS.items():
+                row[column] = row.get(column) or default
+            yield row
+
+
+def merge_contacts(upload_path, ledger):
+    """Append the upload's new contacts to `ledger`, leaving existing ones untouched.
+
+    Contacts are matched on normalized email, against the ledger and earlier
+    rows of the same upload. Known addresses are held in a set, or for very
+    large lists in a Bloom filter; its hits are double-checked with one more
+    pass over the ledger so a false positive never drops a new contact.
+    Returns {'added', 'duplicates', 'invalid'}.
+    """
+    header = read_header(upload_path)
+    stats = {'added': 0, 'duplicates': 0, 'invalid': 0}
+    capacity = ledger.counts()['total'] + _count_lines(upload_path)
+    exact = capacity < BLOOM_FILTER_MIN_CONTACTS
+    known = set() if exact else BloomFilter(capacity)
+    for emails in _batches(ledger.emails(), MERGE_BATCH_ROWS):
+        known.update(_email_keys(emails))
+
+    # Bloom hits, settled after the first pass: their row numbers and addresses
+    deferred, maybe_known = set(), set()
+    number = 0
+    for rows in _batches(upload_rows(upload_path, stats), MERGE_BATCH_ROWS):
+        emails = [row['email'] for row in rows]
+        hits = [email in known for email in emails] if exact else known.contains(emails)
+        new, seen = [], set()
+        for row, email, hit in zip(rows, emails, hits):
+            if hit and not exact:
+                deferred.add(number)
+                maybe_known.add(email)
+            elif hit or email in seen:
+                stats['duplicates'] += 1
+            else:
+                seen.add(email)
+                new.append(row)
+            number += 1
+        if new:
+            known.update(seen)
+            stats['added'] += ledger.add_contacts(new, header)
+
+    if deferred:
+        # Which Bloom hits are really in the ledger (rows added above included)
+        present = set()
+        for emails in _batches(ledger.emails(), MERGE_BATCH_ROWS):
+            present.update(email for email in _email_keys(emails) if email in maybe_known)
+        rows = (row for number, row in enumerate(upload_rows(upload_path)) if number in deferred)
+        for batch in _batches(rows, MERGE_BATCH_ROWS):
+            new = []
+            for row in batch:
+                if row['email'] in present:
+                    stats['duplicates'] += 1
+                else:
+                    present.add(row['email'])
+                    new.append(row)
+            if new:
+                stats['added'] += ledger.add_contacts(new, header)
+    return stats
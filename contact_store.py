@@ -0,0 +1,339 @@
+import csv
+import gc
+from array import array
+from datetime import date
+from itertools import accumulate, islice
+
+# Status columns, stored as one-byte codes (wider for free-text statuses)
+CODED_COLUMNS = ('status', 'follow_up_status')
+# The array type a coded column moves to when its codes run out
+WIDER_TYPECODES = {'B': 'H', 'H': 'I'}
+# YYYY-MM-DD columns, stored as day numbers
+DATE_COLUMNS = ('date_sent', 'follow_up_date', 'follow_up_due')
+# Rows parsed at a time when loading or writing
+CHUNK_ROWS = 50000
+# Other columns are dictionary-coded when their first chunk has at most
+# this share of distinct values (company, city, ...)
+DICTIONARY_MAX_DISTINCT = 0.25
+
+
+class CodedColumn:
+    """Values from a limited set as integer codes into `values` (0 is empty)."""
+
+    def __init__(self, typecode='B'):
+        self.values = [None]
+        self._codes = {None: 0, '': 0}
+        self.data = array(typecode)
+        self._limit = 2 ** (8 * self.data.itemsize)
+
+    def code(self, value):
+        """The code for `value`, or None if no row has it."""
+        return self._codes.get(value)
+
+    def _widen(self):
+        typecode = WIDER_TYPECODES.get(self.data.typecode)
+        if typecode is None:
+            raise ValueError(f"Too many distinct values ({len(self.values)})")
+        self.data = array(typecode, self.data)
+        self._limit = 2 ** (8 * self.data.itemsize)
+
+    def _code_for(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            if len(self.values) >= self._limit:
+                self._widen()
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def extend(self, values):
+        codes = self._codes
+        # Coded first: a new value may widen (replace) the array
+        new_codes = [codes[v] if v in codes else self._code_for(v) for v in values]
+        self.data.extend(new_codes)
+
+    def get(self, row):
+        return self.values[self.data[row]]
+
+    def set(self, row, value):
+        self.data[row] = self._code_for(value)
+
+
+class DateColumn:
+    """YYYY-MM-DD dates as day numbers (0 for none).
+
+    Cells that are not plain ISO dates are kept as text in `other`, so
+    nothing in the file is lost.
+    """
+
+    def __init__(self):
+        self.data = array('i')
+        self.other = {}
+
+    @staticmethod
+    def day_number(value):
+        if len(value) == 10:
+            try:
+                day = date.fromisoformat(value)
+            except ValueError:
+                return 0
+            if day.isoformat() == value:
+                return day.toordinal()
+        return 0
+
+    def extend(self, values):
+        start = len(self.data)
+        if not any(values):
+            self.data.frombytes(bytes(self.data.itemsize * len(values)))
+            return
+        numbers = [self.day_number(v) if v else 0 for v in values]
+        for i, (value, number) in enumerate(zip(values, numbers)):
+            if value and not number:
+                self.other[start + i] = value
+        self.data.extend(numbers)
+
+    def get(self, row):
+        number = self.data[row]
+        if number:
+            return date.fromordinal(number).isoformat()
+        return self.other.get(row)
+
+    def set(self, row, value):
+        number = self.day_number(value) if value else 0
+        self.data[row] = number
+        if value and not number:
+            self.other[row] = value
+        else:
+            self.other.pop(row, None)
+
+
+class TextColumn:
+    """Text packed into one UTF-8 buffer, indexed by each row's end offset.
+
+    A column that has been empty so far holds no offsets at all. Values
+    changed after loading (send keys, thread ids) are kept in `changed`
+    until the list is next written and reloaded.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.ends = None
+        self.size = 0
+        self.changed = {}
+
+    def extend(self, values):
+        if self.ends is None:
+            if not any(values):
+                self.size += len(values)
+                return
+            self.ends = array('I', bytes(4 * self.size))
+        encoded = [v.encode('utf-8') for v in values]
+        self.ends.extend(islice(accumulate(map(len, encoded), initial=len(self.buffer)), 1, None))
+        self.buffer += b''.join(encoded)
+        self.size += len(values)
+
+    def get(self, row):
+        if row in self.changed:
+            return self.changed[row]
+        if self.ends is None:
+            return None
+        start = self.ends[row - 1] if row else 0
+        end = self.ends[row]
+        return self.buffer[start:end].decode('utf-8') if end > start else None
+
+    def set(self, row, value):
+        self.changed[row] = value or None
+
+
+class EmailColumn(TextColumn):
+    """Addresses as a packed local part and an interned domain."""
+
+    def __init__(self):
+        super().__init__()
+        self.local = TextColumn()
+        self.domain = CodedColumn('I')
+
+    def extend(self, values):
+        parts = [v.rpartition('@') for v in values]
+        # Text with no domain part is kept whole as the local part
+        self.local.extend([local if at and domain else v for v, (local, at, domain) in zip(values, parts)])
+        self.domain.extend([domain if at else '' for _, at, domain in parts])
+        self.size += len(values)
+
+    def get(self, row):
+        if row in self.changed:
+            return self.changed[row]
+        local = self.local.get(row) or ''
+        domain = self.domain.get(row)
+        return f"{local}@{domain}" if domain is not None else local or None
+
+
+def is_blank_record(values):
+    """Whether csv.reader `values` came from a blank or whitespace-only line.
+
+    Such lines are not rows, as for pandas.read_csv, so every reader of a
+    contacts file numbers its rows the same way.
+    """
+    return not values or (len(values) == 1 and values[0] != '' and not values[0].strip())
+
+
+def make_column(name, sample=()):
+    """The column type for `name`; free text is dictionary-coded if `sample` repeats."""
+    if name in CODED_COLUMNS:
+        return CodedColumn()
+    if name in DATE_COLUMNS:
+        return DateColumn()
+    if name == 'email':
+        return EmailColumn()
+    if len(sample) >= 100 and len(set(sample)) <= len(sample) * DICTIONARY_MAX_DISTINCT:
+        return CodedColumn('I')
+    return TextColumn()
+
+
+class ContactRow:
+    """A read-only view of one contact; reads come from the store's columns."""
+
+    __slots__ = ('store', 'row_id')
+
+    def __init__(self, store, row_id):
+        self.store = store
+        self.row_id = row_id
+
+    def __getitem__(self, name):
+        return self.store.columns[name].get(self.row_id)
+
+    def get(self, name, default=None):
+        column = self.store.columns.get(name)
+        value = column.get(self.row_id) if column is not None else None
+        return default if value is None else value
+
+    def to_dict(self):
+        """The row as a plain dict, with its `row_id`."""
+        row_id = self.row_id
+        row = {name: column.get(row_id) for name, column in self.store.columns.items()}
+        row['row_id'] = row_id
+        return row
+
+
+class ContactStore:
+    """A contact list held column by column in compact arrays.
+
+    Statuses are integer codes (one byte each unless a list has hundreds
+    of distinct ones), dates are day numbers, email domains and repetitive
+    columns are interned, and other text is packed into one buffer per
+    column, instead of a Python object per cell as in a DataFrame. Row ids
+    are positions in the file, blank lines not counted. Empty cells read as
+    None.
+    """
+
+    def __init__(self, columns=()):
+        self.columns = {}
+        self.size = 0
+        for name in columns:
+            self.add_column(name)
+
+    def __len__(self):
+        return self.size
+
+    def add_column(self, name, default=None, column=None):
+        """Add a column filled with `default`; returns False if it exists."""
+        if name in self.columns:
+            return False
+        column = column or make_column(name)
+        column.extend([default or ''] * self.size)
+        self.columns[name] = column
+        return True
+
+    @classmethod
+    def read_csv(cls, path, normalize=lambda name: name):
+        """Load a CSV, with header names passed through `normalize`."""
+        store = cls()
+        # Parsed rows are plain lists of strings; collecting cycles among
+        # a million of them only slows the load down
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            with open(path, newline='', encoding='utf-8') as f:
+                store._load(csv.reader(f), normalize)
+        finally:
+            if collecting:
+                gc.enable()
+        return store
+
+    def _load(self, reader, normalize):
+        names = [normalize(name) for name in next(reader, [])]
+        # A repeated header keeps its first column
+        keep = [i for i, name in enumerate(names) if name not in names[:i]]
+        width = len(names)
+        while True:
+            chunk = [values for values in islice(reader, CHUNK_ROWS) if not is_blank_record(values)]
+            for values in chunk:
+                if len(values) < width:
+                    values += [''] * (width - len(values))
+            cells = list(zip(*chunk)) if chunk else [()] * width
+            for i in keep:
+                if names[i] not in self.columns:
+                    self.add_column(names[i], column=make_column(names[i], cells[i]))
+                self.columns[names[i]].extend(cells[i])
+            self.size += len(chunk)
+            if not chunk:
+                break
+
+    def get(self, row_id, name):
+        return self.columns[name].get(row_id)
+
+    def set(self, row_id, name, value):
+        if name not in self.columns:
+            self.add_column(name)
+        self.columns[name].set(row_id, value)
+
+    def row(self, row_id):
+        return ContactRow(self, row_id)
+
+    def __iter__(self):
+        return (ContactRow(self, row_id) for row_id in range(self.size))
+
+    def find(self, name, value, start=0):
+        """Row ids from `start` on whose `name` column equals `value`, in order."""
+        column = self.columns[name]
+        if isinstance(column, CodedColumn):
+            code = column.code(value)
+            if code is None:
+                return
+            data = column.data
+            row_id = start
+            while True:
+                try:
+                    row_id = data.index(code, row_id)
+                except ValueError:
+                    return
+                yield row_id
+                row_id += 1
+        else:
+            for row_id in range(start, self.size):
+                if column.get(row_id) == value:
+                    yield row_id
+
+    def where(self, **conditions):
+        """Row ids whose columns equal all of `conditions`, in order."""
+        (name, value), *others = conditions.items()
+        others = [(self.columns[other].get, wanted) for other, wanted in others]
+        for row_id in self.find(name, value):
+            if all(get(row_id) == wanted for get, wanted in others):
+                yield row_id
+
+    def count(self, name, value):
+        column = self.columns[name]
+        if isinstance(column, CodedColumn):
+            code = column.code(value)
+            return 0 if code is None else column.data.count(code)
+        return sum(1 for _ in self.find(name, value))
+
+    def write_csv(self, f):
+        """Write the contacts as CSV to an open text file (empty cells for None)."""
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(self.columns)
+        getters = [column.get for column in self.columns.values()]
+        for start in range(0, self.size, CHUNK_ROWS):
+            writer.writerows([get(row_id) for get in getters]
+                             for row_id in range(start, min(start + CHUNK_ROWS, self.size)))
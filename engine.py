@@ -0,0 +1,97 @@
+import asyncio
+import functools
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Blocking Gmail API calls that may run at once across all campaigns
+GMAIL_EXECUTOR_WORKERS = 8
+
+_lock = threading.Lock()
+_executor = None
+# call_blocking() calls submitted and not yet returned to their caller
+_outstanding = 0
+
+
+def get_executor():
+    """The bounded thread pool that blocking Gmail calls run on."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=GMAIL_EXECUTOR_WORKERS, thread_name_prefix='gmail')
+        return _executor
+
+
+async def call_blocking(fn, *args, **kwargs):
+    """Run a blocking call (e.g. a Gmail request) on the executor and await it.
+
+    The call runs in a copy of the caller's context, as with asyncio.to_thread,
+    so context variables (such as the tracing lane) carry over.
+    """
+    global _outstanding
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    with _lock:
+        _outstanding += 1
+    try:
+        return await loop.run_in_executor(get_executor(), context.run, functools.partial(fn, *args, **kwargs))
+    finally:
+        with _lock:
+            _outstanding -= 1
+
+
+def blocking_calls():
+    """Number of call_blocking() calls in progress (the simulator waits for them)."""
+    with _lock:
+        return _outstanding
+
+
+class CampaignEngine:
+    """One event loop, in a background thread, that runs campaign coroutines.
+
+    Campaigns spend nearly all their time waiting on timers, so any number
+    of them (and of their sender accounts) can share the loop; only the
+    Gmail calls themselves occupy a thread, on the bounded executor.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._futures = set()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='campaign-engine',
+                                                daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, coro):
+        """Schedule a coroutine on the engine; returns a concurrent.futures.Future."""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def _discard(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def running(self):
+        """Number of submitted coroutines that have not finished yet."""
+        with self._lock:
+            return len(self._futures)
+
+    def run(self, coro):
+        """Run a coroutine on the engine and block until it returns."""
+        if self._thread is not None and threading.current_thread() is self._thread:
+            raise RuntimeError("CampaignEngine.run() cannot be called from the engine's own loop")
+        return self.submit(coro).result()
+
+
+# Process-wide engine shared by send_emails and app
+engine = CampaignEngine()
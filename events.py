@@ -0,0 +1,67 @@
+import json
+import queue
+import threading
+import time
+
+# Oldest events are dropped for subscribers that stop reading
+SUBSCRIBER_QUEUE_SIZE = 200
+
+
+class EventBus:
+    """In-process publish/subscribe for campaign progress events."""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def add_listener(self, callback):
+        """Call callback(event) for every event, in the publishing thread."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            self._listeners.remove(callback)
+
+    def publish(self, event_type, **data):
+        event = {'type': event_type, 'time': time.time(), **data}
+        return self.deliver(event)
+
+    def deliver(self, event):
+        """Pass an already-built event (e.g. one relayed from another process) to everyone."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback(event)
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    q.put_nowait(event)
+                except (queue.Empty, queue.Full):
+                    pass
+        return event
+
+
+def format_sse(event_type, data):
+    """Encode one Server-Sent Events message."""
+    return f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+# Process-wide bus shared by send_emails and app
+bus = EventBus()
+emit = bus.publish
@@ -0,0 +1,175 @@
+import os
+import random
+from datetime import datetime, timedelta
+import send_emails as se
+from ledger import DATE_FORMAT, StreamingCsvLedger, SqliteLedger, follow_up_due_date
+
+# How far ahead a forecast looks for the list to finish
+FORECAST_MAX_DAYS = 3650
+
+
+def send_window(limiter, opens, closes, count, config):
+    """Book up to `count` sends between `opens` and `closes`; returns how many fit.
+
+    Sends go out when the limiter allows, as in wait_for_send_slot(): the
+    window ends early on the daily limit or when the next send would fall
+    after it closes.
+    """
+    now = opens
+    sent = 0
+    while sent < count:
+        when, blocker = limiter.next_send(now)
+        if when is None or blocker == 'daily' or when >= closes:
+            break
+        now = when
+        size = min(config.batch_send_size, limiter.available(now), count - sent) if config.batched_send_enabled else 1
+        limiter.record(now, size)
+        sent += size
+    return sent
+
+
+def forecast(pending_new, follow_ups_due, config, accounts, start, max_days=FORECAST_MAX_DAYS, seed=1):
+    """Project the campaign day by day from `start` until the list is finished.
+
+    `follow_ups_due` maps YYYY-MM-DD dates to the follow-ups falling due
+    then. Every window of the send calendar is replayed as run_campaign()
+    would run it, against each account's own rate limiter on simulated
+    time. Every send is assumed to succeed and nobody to reply or bounce,
+    so the follow-up figures are an upper bound.
+    """
+    calendar = se.get_send_calendar(config)
+    rng = random.Random(seed)
+    limiters = [se.build_rate_limiter(account, config, persist=False, rng=rng) for account in accounts]
+    # Dates with nothing due are dropped, so `due` empties once all are sent
+    due = {date: count for date, count in follow_ups_due.items() if count} if config.follow_up_enabled else {}
+    due_now = 0
+    result = {
+        'start': start.isoformat(timespec='minutes'),
+        'senders': len(accounts),
+        'pending_new': pending_new,
+        'follow_ups_waiting': sum(due.values()),
+        'days': [],
+        'new_emails_done': None,
+        'completion_date': None,
+    }
+
+    for offset in range(max_days + 1):
+        day = start + timedelta(days=offset)
+        today = day.strftime(DATE_FORMAT)
+        for date in [date for date in due if date <= today]:
+            due_now += due.pop(date)
+
+        sent = {'new': 0, 'followup': 0}
+        for window in calendar.windows_on(day):
+            if window.end <= start or (window.kind == 'followup' and not config.follow_up_enabled):
+                continue
+            opens = max(window.start, start)
+            # Rows are split by each account's share of the window, as in partition()
+            for limiter in limiters:
+                work = pending_new if window.kind == 'new' else due_now
+                daily = limiter.get('daily')
+                left_today = max(daily.capacity - daily.sent_on(opens), 0)
+                share = min(calendar.share(left_today, window), work)
+                count = send_window(limiter, opens, window.end, share, config)
+                sent[window.kind] += count
+                if window.kind == 'new':
+                    pending_new -= count
+                else:
+                    due_now -= count
+
+        if sent['new'] and config.follow_up_enabled:
+            follow_up_day = follow_up_due_date(today, config.follow_up_days)
+            due[follow_up_day] = due.get(follow_up_day, 0) + sent['new']
+        if sent['new'] or sent['followup']:
+            result['days'].append({'date': today, 'new': sent['new'], 'followup': sent['followup'],
+                                   'pending_new': pending_new, 'follow_ups_left': due_now + sum(due.values())})
+
+        if pending_new == 0 and result['new_emails_done'] is None:
+            result['new_emails_done'] = today
+        if pending_new == 0 and due_now == 0 and not due:
+            result['completion_date'] = today
+            break
+    result['simulated_days'] = offset + 1
+    return result
+
+
+def read_ledger(config, today, days, pending_new=None):
+    """(pending new emails, {due date: follow-ups}) read from the contact list.
+
+    Nothing is written or imported. An SQLite ledger is read only once it
+    has been imported; otherwise emails.csv is scanned a few columns at a
+    time, as the streaming ledger does, instead of being loaded whole.
+    That reader holds no open files and is not closed, as close() would
+    fold the journal into the file. `pending_new` may be passed in from
+    the dashboard's status counters.
+    """
+    if se.STORAGE_BACKEND == 'sqlite' and os.path.exists(se.LEDGER_DB_FILE):
+        ledger = SqliteLedger(se.LEDGER_DB_FILE, config.follow_up_days)
+        try:
+            if not ledger.is_empty() or not os.path.exists(se.EMAILS_FILE):
+                return (ledger.counts()['pending'] if pending_new is None else pending_new,
+                        ledger.follow_up_forecast(today, days) if config.follow_up_enabled else {})
+        finally:
+            ledger.close()
+    if not os.path.exists(se.EMAILS_FILE):
+        return 0, {}
+    # Not imported yet: the CSV is what the campaign would start from
+    ledger = StreamingCsvLedger(se.EMAILS_FILE, config.follow_up_days)
+    return (ledger.counts()['pending'] if pending_new is None else pending_new,
+            ledger.follow_up_forecast(today, days) if config.follow_up_enabled else {})
+
+
+def forecast_campaign(now=None, max_days=FORECAST_MAX_DAYS, config=None, pending_new=None):
+    """forecast() for the current ledger, sender accounts and campaign settings."""
+    config = config or se.get_config()
+    now = now or datetime.now()
+    pending_new, follow_ups_due = read_ledger(config, now.strftime(DATE_FORMAT), max_days + 1, pending_new)
+    return forecast(pending_new, follow_ups_due, config, se.get_sender_accounts(config=config), now, max_days)
+
+
+def print_forecast(result, daily=False):
+    print("=" * 60)
+    print(f"📈 Forecast from {datetime.fromisoformat(result['start']):%a %d %b %Y %H:%M} "
+          f"({result['senders']} sender{'s' if result['senders'] != 1 else ''})")
+    print(f"   Pending new emails: {result['pending_new']}, follow-ups waiting: {result['follow_ups_waiting']}")
+    print("=" * 60)
+    rows = result['days']
+    if not daily:
+        # Weekly totals, labelled by the week's Monday
+        weeks = {}
+        for row in rows:
+            date = datetime.strptime(row['date'], DATE_FORMAT)
+            week = weeks.setdefault((date - timedelta(days=date.weekday())).strftime(DATE_FORMAT),
+                                    dict(row, new=0, followup=0))
+            week.update(new=week['new'] + row['new'], followup=week['followup'] + row['followup'],
+                        pending_new=row['pending_new'], follow_ups_left=row['follow_ups_left'])
+        rows = [dict(row, date=monday) for monday, row in weeks.items()]
+    print(f"   {'day' if daily else 'week of':<16}{'new':>7}{'follow-ups':>12}{'new left':>10}{'f/u left':>10}")
+    for row in rows:
+        label = f"{datetime.strptime(row['date'], DATE_FORMAT):%a %d %b %Y}"
+        print(f"   {label:<16}{row['new']:>7}{row['followup']:>12}{row['pending_new']:>10}{row['follow_ups_left']:>10}")
+    print("=" * 60)
+    horizon = f"not within {result['simulated_days']} days"
+    print(f"✓ New emails done: {result['new_emails_done'] or horizon}")
+    print(f"✓ Everything done (incl. follow-ups): {result['completion_date'] or horizon}")
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Forecast when the contact list will be finished.")
+    parser.add_argument('--days', type=int, default=FORECAST_MAX_DAYS, help='Longest horizon to simulate')
+    parser.add_argument('--daily', action='store_true', help='List every sending day instead of weekly totals')
+    parser.add_argument('--json', action='store_true', help='Print the forecast as JSON')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result = forecast_campaign(max_days=args.days)
+    elapsed = time.perf_counter() - started
+    if args.json:
+        import json
+        print(json.dumps(result, indent=2))
+    else:
+        print_forecast(result, daily=args.daily)
+        print(f"⏱  Simulated {result['simulated_days']} days in {elapsed:.2f} s")
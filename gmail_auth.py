@@ -0,0 +1,160 @@
+import os
+import threading
+import weakref
+from datetime import datetime
+import httplib2
+import google_auth_httplib2
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+
+# Refresh access tokens this long before they expire
+REFRESH_MARGIN_SECONDS = 300
+# Retry a failed background refresh after this long
+REFRESH_RETRY_SECONDS = 60
+
+# Module-level, so every caller in the process shares one cache
+_lock = threading.RLock()
+_sessions = {}
+_profiles = weakref.WeakKeyDictionary()
+
+
+class _Session:
+    """Credentials, Gmail service and refresh timer for one token file."""
+
+    def __init__(self, token_file, scopes, creds, token_key):
+        self.token_file = token_file
+        self.scopes = scopes
+        self.creds = creds
+        self.token_key = token_key
+        self.timer = None
+        self.service = _build_service(creds)
+
+    def save_token(self):
+        with open(self.token_file, 'w') as token:
+            token.write(self.creds.to_json())
+        self.token_key = _file_key(self.token_file)
+
+    def schedule_refresh(self, delay=None):
+        if self.timer:
+            self.timer.cancel()
+        if delay is None:
+            if not self.creds.expiry or not self.creds.refresh_token:
+                return
+            delay = (self.creds.expiry - datetime.utcnow()).total_seconds() - REFRESH_MARGIN_SECONDS
+        self.timer = threading.Timer(max(delay, 0), self.refresh)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def refresh(self):
+        """Refresh the access token in the background and persist it."""
+        try:
+            with _lock:
+                self.creds.refresh(Request())
+                self.save_token()
+        except Exception as e:
+            print(f"⚠ Background token refresh failed: {e}")
+            self.schedule_refresh(REFRESH_RETRY_SECONDS)
+            return
+        self.schedule_refresh()
+
+    def close(self):
+        if self.timer:
+            self.timer.cancel()
+
+
+def _file_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _build_service(creds):
+    """Build the Gmail client from the discovery document bundled with the library.
+
+    httplib2 connections are not thread-safe, so every request gets its own
+    authorized Http while the (expensive) service object is shared.
+    """
+    def build_request(http, *args, **kwargs):
+        return HttpRequest(google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http()), *args, **kwargs)
+
+    authorized_http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+    return build('gmail', 'v1', http=authorized_http, requestBuilder=build_request,
+                 static_discovery=True, cache_discovery=False)
+
+
+def _load_credentials(token_file, credentials_file, scopes, interactive):
+    creds = None
+    # The file token.json stores the user's access and refresh tokens, and is
+    # created automatically when the authorization flow completes for the first
+    # time.
+    if os.path.exists(token_file):
+        creds = Credentials.from_authorized_user_file(token_file, scopes)
+
+    # If there are no (valid) credentials available, let the user log in.
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            if not interactive:
+                return None, False
+            if not os.path.exists(credentials_file):
+                raise FileNotFoundError(f"Missing {credentials_file}. Please download it from Google Cloud Console.")
+
+            flow = InstalledAppFlow.from_client_secrets_file(credentials_file, scopes)
+            creds = flow.run_local_server(port=0)
+        return creds, True
+    return creds, False
+
+
+def get_service(token_file, credentials_file, scopes, interactive=True):
+    """Return the cached Gmail service for `token_file`, building it on first use.
+
+    The cache is dropped if token_file changes on disk (e.g. a new upload).
+    With interactive=False no browser login is attempted and None is returned
+    when there is no usable token.
+    """
+    key = (os.path.abspath(token_file), tuple(scopes))
+    with _lock:
+        session = _sessions.get(key)
+        if session and session.token_key == _file_key(token_file):
+            return session.service
+        if session:
+            session.close()
+            del _sessions[key]
+
+        creds, changed = _load_credentials(token_file, credentials_file, scopes, interactive)
+        if creds is None:
+            return None
+        session = _Session(token_file, scopes, creds, _file_key(token_file))
+        if changed:
+            # Save the credentials for the next run
+            session.save_token()
+        session.schedule_refresh()
+        _sessions[key] = session
+        return session.service
+
+
+def get_sender_profile(service):
+    """users().getProfile() for `service`, fetched once per service object."""
+    try:
+        profile = _profiles.get(service)
+    except TypeError:
+        return service.users().getProfile(userId='me').execute()
+    if profile is None:
+        profile = service.users().getProfile(userId='me').execute()
+        _profiles[service] = profile
+    return profile
+
+
+def clear():
+    """Forget all cached sessions and profiles."""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        _profiles.clear()
@@ -0,0 +1,112 @@
+import os
+import json
+
+# Columns whose changes are recorded in the journal
+JOURNAL_FIELDS = ('status', 'date_sent', 'follow_up_status', 'follow_up_date', 'follow_up_due', 'send_key',
+                  'thread_id')
+
+
+def journal_path_for(csv_path):
+    """Journal file that sits next to a contacts CSV."""
+    return csv_path + '.journal'
+
+
+class SendJournal:
+    """Append-only log of per-row status changes for a contacts CSV.
+
+    Each record is one JSON line: {"row": <index>, "<field>": <value>, ...}.
+    A line is written with a single os.write on an O_APPEND descriptor, so a
+    crash can at worst leave one torn trailing line, which replay ignores.
+    """
+
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self._fd = None
+        self.records = 0
+
+    def open(self):
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def append(self, row, **fields):
+        """Append one status change for `row` and return the record count."""
+        self.open()
+        record = {'row': int(row)}
+        record.update(fields)
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+        os.write(self._fd, line)
+        if self.fsync:
+            os.fsync(self._fd)
+        self.records += 1
+        return self.records
+
+    def read(self):
+        """Iterate over every complete record in the journal, skipping torn lines."""
+        records, _ = self.read_from(0)
+        return iter(records)
+
+    def read_from(self, offset):
+        """Read complete records after byte `offset`.
+
+        Returns (records, new_offset); new_offset stops before any torn or
+        still-being-written trailing line so it can be read again later.
+        """
+        if not os.path.exists(self.path):
+            return [], 0
+        records = []
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Torn write from a crash; nothing after it is valid
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and 'row' in record:
+                    records.append(record)
+        return records, offset
+
+    def replay(self, contacts):
+        """Apply journal records over a ContactStore loaded from the base CSV."""
+        self.records = 0
+        for record in self.read():
+            row = record.pop('row')
+            if not 0 <= row < len(contacts):
+                continue
+            for field, value in record.items():
+                contacts.set(row, field, value)
+            self.records += 1
+        return self.records
+
+    def truncate(self):
+        """Drop all records (after they have been folded into the CSV)."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.records = 0
+
+
+def write_csv_atomic(contacts, path, fsync=True):
+    """Write a ContactStore to CSV via a temp file and an atomic rename."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        contacts.write_csv(f)
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def compact(contacts, csv_path, journal, fsync=True):
+    """Fold the journal into the base CSV and start a fresh journal."""
+    write_csv_atomic(contacts, csv_path, fsync=fsync)
+    journal.truncate()
@@ -0,0 +1,859 @@
+import io
+import os
+import csv
+import json
+import bisect
+import sqlite3
+from datetime import datetime, timedelta
+import pandas as pd
+from journal import SendJournal, journal_path_for, compact, write_csv_atomic
+from contact_store import ContactStore
+
+# Columns every ledger guarantees, in the order they are appended to a CSV
+# that lacks them
+CORE_COLUMNS = ['email', 'name', 'status', 'date_sent', 'follow_up_status', 'follow_up_date', 'follow_up_due',
+                'send_key', 'thread_id']
+STATUS_DEFAULTS = {'status': 'pending', 'follow_up_status': 'pending'}
+# Columns a send is allowed to change
+UPDATABLE_COLUMNS = ('status', 'date_sent', 'follow_up_status', 'follow_up_date', 'follow_up_due', 'send_key',
+                     'thread_id')
+DATE_FORMAT = '%Y-%m-%d'
+# Rows read at a time by StreamingCsvLedger
+STREAM_CHUNK_ROWS = 50000
+
+
+def normalize_column(name):
+    """Normalize headers to support "Name", "Email", "Status", "Follow Up Status"."""
+    return name.strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def read_contacts_csv(path):
+    """Read a contacts CSV into a ContactStore with normalized headers and all ledger columns present."""
+    contacts = ContactStore.read_csv(path, normalize_column)
+    for column, default in STATUS_DEFAULTS.items():
+        contacts.add_column(column, default)
+    for column in ('date_sent', 'follow_up_date', 'follow_up_due', 'send_key', 'thread_id'):
+        contacts.add_column(column)
+    return contacts
+
+
+def follow_up_due_date(date_sent, follow_up_days):
+    """Date (YYYY-MM-DD) on which a follow-up for `date_sent` becomes due."""
+    return (datetime.strptime(date_sent, DATE_FORMAT) + timedelta(days=follow_up_days)).strftime(DATE_FORMAT)
+
+
+def forecast_dates(today, days):
+    """The `days` consecutive dates starting at `today`, as YYYY-MM-DD strings."""
+    start = datetime.strptime(today, DATE_FORMAT)
+    return [(start + timedelta(days=i)).strftime(DATE_FORMAT) for i in range(days)]
+
+
+class FollowUpDueIndex:
+    """Sorted (due_date, row_id) index of rows waiting for a follow-up.
+
+    Rows enter the index when their initial send is recorded; dates are
+    YYYY-MM-DD strings so they sort correctly as text. Rows that stop being
+    eligible are left in place and skipped (and pruned) when read.
+    """
+
+    def __init__(self, is_eligible, entries=()):
+        self._entries = sorted(entries)
+        self._is_eligible = is_eligible
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, due, row_id):
+        # New sends are due later than anything already indexed, so this is
+        # almost always an append
+        i = bisect.bisect_left(self._entries, (due, row_id))
+        if i == len(self._entries) or self._entries[i] != (due, row_id):
+            self._entries.insert(i, (due, row_id))
+
+    def due(self, today, limit=None):
+        """Row ids due on or before `today`, oldest first."""
+        end = bisect.bisect_right(self._entries, (today, float('inf')))
+        live = [entry for entry in self._entries[:end] if self._is_eligible(*entry)]
+        self._entries[:end] = live
+        row_ids = [row_id for _, row_id in live]
+        return row_ids if limit is None else row_ids[:limit]
+
+    def forecast(self, today, days):
+        """Number of follow-ups due on each of the next `days` days.
+
+        Today's count includes everything overdue.
+        """
+        dates = forecast_dates(today, days)
+        counts = {date: 0 for date in dates}
+        end = bisect.bisect_right(self._entries, (dates[-1], float('inf')))
+        for due, row_id in self._entries[:end]:
+            if self._is_eligible(due, row_id):
+                counts[max(due, today)] += 1
+        return counts
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, float) and value != value) or value == ''
+
+
+def _clean(value):
+    """Turn pandas NaN into None so rows can be stored and rendered as-is."""
+    return None if _is_blank(value) else value
+
+
+class CsvLedger:
+    """Contact ledger kept in emails.csv, with status changes in the send journal.
+
+    The list is held in memory as a compact ContactStore.
+    """
+
+    backend = 'csv'
+
+    def __init__(self, csv_path, follow_up_days, journal=True, fsync=True, compact_threshold=500):
+        self.csv_path = csv_path
+        self.follow_up_days = follow_up_days
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+        self.contacts = read_contacts_csv(csv_path)
+        # Position of the first row that may still be pending (the queue head)
+        self._pending_head = 0
+        self.journal = None
+        if journal:
+            self.journal = SendJournal(journal_path_for(csv_path), fsync=fsync)
+            self.journal.replay(self.contacts)
+        self._build_due_index()
+
+    def _build_due_index(self):
+        """Index every row awaiting a follow-up by its due date (once per load)."""
+        contacts = self.contacts
+        entries = []
+        for row_id in contacts.where(status='sent', follow_up_status='pending'):
+            due = contacts.get(row_id, 'follow_up_due')
+            sent = contacts.get(row_id, 'date_sent')
+            if due is None and sent is not None:
+                # Lists written before follow_up_due existed only carry date_sent
+                try:
+                    due = follow_up_due_date(sent, self.follow_up_days)
+                except ValueError:
+                    continue
+                contacts.set(row_id, 'follow_up_due', due)
+            if due is not None:
+                entries.append((due, row_id))
+        self.due_index = FollowUpDueIndex(self._is_waiting, entries)
+
+    def _is_waiting(self, due, row_id):
+        contacts = self.contacts
+        return (contacts.get(row_id, 'status') == 'sent' and contacts.get(row_id, 'follow_up_status') == 'pending'
+                and contacts.get(row_id, 'follow_up_due') == due)
+
+    def _rows(self, row_ids):
+        for row_id in row_ids:
+            yield self.contacts.row(row_id).to_dict()
+
+    def columns(self):
+        return list(self.contacts.columns)
+
+    def pending(self, limit=None):
+        """Rows that have not been emailed yet, in file order.
+
+        Scans from the queue head, which moves past rows that have left the
+        queue, instead of from the top of the file each time.
+        """
+        row_ids = []
+        head = None
+        for row_id in self.contacts.find('status', 'pending', start=self._pending_head):
+            if head is None:
+                head = row_id
+            if limit is not None and len(row_ids) >= limit:
+                break
+            row_ids.append(row_id)
+        self._pending_head = len(self.contacts) if head is None else head
+        return list(self._rows(row_ids))
+
+    def in_flight(self):
+        """Rows claimed for sending whose outcome was never recorded."""
+        contacts = self.contacts
+        row_ids = set(contacts.find('status', 'in_flight')) | set(contacts.find('follow_up_status', 'in_flight'))
+        return list(self._rows(sorted(row_ids)))
+
+    def due_follow_ups(self, today, limit=None):
+        """Rows whose follow-up is due on or before `today` (YYYY-MM-DD)."""
+        return list(self._rows(self.due_index.due(today, limit)))
+
+    def awaiting_follow_ups(self):
+        """Rows that were sent and still wait for a follow-up, due or not."""
+        return list(self._rows(self.contacts.where(status='sent', follow_up_status='pending')))
+
+    def follow_up_forecast(self, today, days=7):
+        """How many follow-ups become due on each of the next `days` days."""
+        return self.due_index.forecast(today, days)
+
+    def counts(self):
+        contacts = self.contacts
+        return {
+            'total': len(contacts),
+            'pending': contacts.count('status', 'pending'),
+            'sent': contacts.count('status', 'sent'),
+            'failed': contacts.count('status', 'failed'),
+            'sent_followups': contacts.count('follow_up_status', 'sent'),
+            'replied': contacts.count('follow_up_status', 'replied'),
+            'bounced': contacts.count('follow_up_status', 'bounced'),
+        }
+
+    def update(self, row_id, **fields):
+        """Apply a status change to one row and persist it."""
+        for field, value in fields.items():
+            self.contacts.set(row_id, field, value)
+        if fields.get('status') == 'pending':
+            # Back in the queue, possibly ahead of the head
+            self._pending_head = min(self._pending_head, row_id)
+        if fields.get('follow_up_due'):
+            self.due_index.add(fields['follow_up_due'], row_id)
+
+        if self.journal is None:
+            write_csv_atomic(self.contacts, self.csv_path, fsync=self.fsync)  # Save immediately
+            return
+
+        if self.journal.append(row_id, **fields) >= self.compact_threshold:
+            compact(self.contacts, self.csv_path, self.journal, fsync=self.fsync)
+
+    def export_csv(self, path):
+        write_csv_atomic(self.contacts, path, fsync=False)
+
+    def close(self):
+        """Persist the ledger at the end of a run, folding in the journal."""
+        if self.journal is None:
+            write_csv_atomic(self.contacts, self.csv_path, fsync=self.fsync)
+        else:
+            compact(self.contacts, self.csv_path, self.journal, fsync=self.fsync)
+
+
+class StreamingCsvLedger:
+    """Contact ledger streamed from emails.csv in chunks, never loaded whole.
+
+    Lookups read the file STREAM_CHUNK_ROWS rows at a time, only the columns
+    they test, and pending() stops as soon as it has enough rows. Status
+    changes go to the send journal (and an in-memory overlay of it); they
+    are folded back by rewriting the file row by row, which also records the
+    byte offset of the first pending row in `<csv>.head` so the next run
+    starts reading there instead of at the top.
+    """
+
+    backend = 'stream'
+
+    def __init__(self, csv_path, follow_up_days, fsync=True, compact_threshold=500, chunk_rows=None):
+        self.csv_path = csv_path
+        self.follow_up_days = follow_up_days
+        self.fsync = fsync
+        self.compact_threshold = compact_threshold
+        self.chunk_rows = chunk_rows or STREAM_CHUNK_ROWS
+        with open(csv_path, newline='', encoding='utf-8') as f:
+            self.header = next(csv.reader(f), [])
+        self.file_columns = [normalize_column(c) for c in self.header]
+        # (row, byte offset) of the queue head when the file was last rewritten
+        self._checkpoint = self._load_checkpoint()
+        # First row that may still be pending (the queue head)
+        self._pending_head = self._checkpoint[0] if self._checkpoint else 0
+
+        # Journaled changes not yet folded into the file, by row id
+        self.changes = {}
+        self.journal = SendJournal(journal_path_for(csv_path), fsync=fsync)
+        for record in self.journal.read():
+            self.changes.setdefault(record.pop('row'), {}).update(record)
+            self.journal.records += 1
+
+    def _head_path(self):
+        return self.csv_path + '.head'
+
+    def _file_key(self):
+        st = os.stat(self.csv_path)
+        return [st.st_mtime_ns, st.st_size]
+
+    def _load_checkpoint(self):
+        try:
+            with open(self._head_path(), encoding='utf-8') as f:
+                head = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Only valid for the exact file it was written with
+        if head.get('key') != self._file_key():
+            return None
+        return head['row'], head['offset']
+
+    def _chunks(self, columns=None, start=0):
+        """Yield DataFrame chunks from row `start` on, with journal changes applied.
+
+        With `columns` only those columns are parsed. Values are strings,
+        blanks are ''. Blank lines are not rows and take no row id, as for
+        every other reader of the file (the journal's row ids are shared).
+        """
+        wanted = None if columns is None else set(columns)
+        # The first column is always read, so rows are seen even when none of
+        # `columns` exist in the file yet
+        first = self.header[0] if self.header else None
+        usecols = None if wanted is None else (lambda c: c == first or normalize_column(c) in wanted)
+        base, offset = 0, None
+        if start and self._checkpoint and self._checkpoint[0] <= start:
+            base, offset = self._checkpoint
+        with open(self.csv_path, 'rb') as f:
+            options = dict(dtype=str, keep_default_na=False, usecols=usecols,
+                           chunksize=self.chunk_rows)
+            if offset is not None:
+                f.seek(offset)
+                options.update(header=None, names=self.header)
+            try:
+                yield from self._apply_changes(pd.read_csv(f, **options), wanted, base, start)
+            except pd.errors.EmptyDataError:
+                return
+
+    def _apply_changes(self, reader, wanted, base, start):
+        for chunk in reader:
+            chunk.columns = [normalize_column(c) for c in chunk.columns]
+            chunk.index = pd.RangeIndex(base, base + len(chunk))
+            base += len(chunk)
+            if base <= start:
+                continue
+            if chunk.index[0] < start:
+                chunk = chunk[chunk.index >= start]
+            start, end = int(chunk.index[0]), base
+            blank = None
+            for column in (CORE_COLUMNS if wanted is None else wanted):
+                if column not in chunk.columns:
+                    default = STATUS_DEFAULTS.get(column, '')
+                    if default and blank is None:
+                        blank = (chunk == '').all(axis=1)
+                    chunk[column] = default
+                    if default:
+                        # Blank lines are not contacts
+                        chunk.loc[blank, column] = ''
+            for row_id, fields in self.changes.items():
+                if start <= row_id < end:
+                    for field, value in fields.items():
+                        if field in chunk.columns:
+                            chunk.at[row_id, field] = '' if value is None else value
+            start = end
+            yield chunk
+
+    def _rows(self, frame):
+        for row_id, values in zip(frame.index, frame.to_dict('records')):
+            row = {k: _clean(v) for k, v in values.items()}
+            row['row_id'] = int(row_id)
+            yield row
+
+    def _fetch(self, row_ids):
+        """Full rows for `row_ids`, in the order given (one pass up to the last id)."""
+        if not row_ids:
+            return []
+        wanted = set(row_ids)
+        last = max(wanted)
+        found = {}
+        for chunk in self._chunks(start=min(wanted)):
+            hits = chunk[chunk.index.isin(wanted)]
+            for row in self._rows(hits):
+                found[row['row_id']] = row
+            if chunk.index[-1] >= last:
+                break
+        return [found[row_id] for row_id in row_ids if row_id in found]
+
+    def _waiting(self, chunk):
+        """Due dates of rows in `chunk` waiting for a follow-up (backfilled from date_sent)."""
+        waiting = chunk[(chunk['status'] == 'sent') & (chunk['follow_up_status'] == 'pending')]
+        due = waiting['follow_up_due']
+        missing = (due == '') & (waiting['date_sent'] != '')
+        if missing.any():
+            sent = pd.to_datetime(waiting.loc[missing, 'date_sent'], format=DATE_FORMAT, errors='coerce')
+            backfill = (sent + pd.Timedelta(days=self.follow_up_days)).dt.strftime(DATE_FORMAT)
+            due = due.copy()
+            due[missing] = backfill.fillna('')
+        return due[due != '']
+
+    def columns(self):
+        return self.file_columns + [c for c in CORE_COLUMNS if c not in self.file_columns]
+
+    def pending(self, limit=None):
+        """Rows that have not been emailed yet, in file order.
+
+        Scans only the status column from the queue head, stops once `limit`
+        rows are found, then reads just those rows in full.
+        """
+        row_ids = []
+        for chunk in self._chunks(['status'], start=self._pending_head):
+            hits = chunk.index[chunk['status'] == 'pending']
+            if not row_ids:
+                self._pending_head = int(hits[0]) if len(hits) else int(chunk.index[-1]) + 1
+            row_ids.extend(int(i) for i in hits[:None if limit is None else limit - len(row_ids)])
+            if limit is not None and len(row_ids) >= limit:
+                break
+        return self._fetch(row_ids)
+
+    def in_flight(self):
+        """Rows claimed for sending whose outcome was never recorded."""
+        row_ids = []
+        for chunk in self._chunks(['status', 'follow_up_status']):
+            hits = chunk[(chunk['status'] == 'in_flight') | (chunk['follow_up_status'] == 'in_flight')]
+            row_ids.extend(int(i) for i in hits.index)
+        return self._fetch(row_ids)
+
+    def due_follow_ups(self, today, limit=None):
+        """Rows whose follow-up is due on or before `today` (YYYY-MM-DD)."""
+        entries = []
+        for chunk in self._chunks(['status', 'follow_up_status', 'follow_up_due', 'date_sent']):
+            due = self._waiting(chunk)
+            due = due[due <= today]
+            entries.extend(zip(due.tolist(), (int(i) for i in due.index)))
+        entries.sort()
+        if limit is not None:
+            entries = entries[:limit]
+        rows = self._fetch([row_id for _, row_id in entries])
+        for row, (due, _) in zip(rows, entries):
+            row['follow_up_due'] = due
+        return rows
+
+    def awaiting_follow_ups(self):
+        """Rows that were sent and still wait for a follow-up, due or not."""
+        row_ids = []
+        for chunk in self._chunks(['status', 'follow_up_status']):
+            hits = chunk[(chunk['status'] == 'sent') & (chunk['follow_up_status'] == 'pending')]
+            row_ids.extend(int(i) for i in hits.index)
+        return self._fetch(row_ids)
+
+    def follow_up_forecast(self, today, days=7):
+        """How many follow-ups become due on each of the next `days` days."""
+        dates = forecast_dates(today, days)
+        counts = {date: 0 for date in dates}
+        for chunk in self._chunks(['status', 'follow_up_status', 'follow_up_due', 'date_sent']):
+            due = self._waiting(chunk)
+            due = due[due <= dates[-1]]
+            for day, count in due.where(due > today, today).value_counts().items():
+                counts[day] += int(count)
+        return counts
+
+    def counts(self):
+        counts = {'total': 0, 'pending': 0, 'sent': 0, 'failed': 0, 'sent_followups': 0, 'replied': 0, 'bounced': 0}
+        for chunk in self._chunks(['status', 'follow_up_status']):
+            status = chunk['status']
+            counts['total'] += int((chunk != '').any(axis=1).sum())  # Not counting blank lines
+            counts['pending'] += int((status == 'pending').sum())
+            counts['sent'] += int((status == 'sent').sum())
+            counts['failed'] += int((status == 'failed').sum())
+            counts['sent_followups'] += int((chunk['follow_up_status'] == 'sent').sum())
+            counts['replied'] += int((chunk['follow_up_status'] == 'replied').sum())
+            counts['bounced'] += int((chunk['follow_up_status'] == 'bounced').sum())
+        return counts
+
+    def emails(self):
+        """Every email address in the file, in row order."""
+        for chunk in self._chunks(['email']):
+            yield from chunk['email'].tolist()
+
+    def add_contacts(self, rows, header=()):
+        """Append new contacts (dicts keyed by normalized column) to the end of the file.
+
+        Existing rows keep their row ids, so the journal and the queue head
+        checkpoint stay valid. Columns in `header` that the file lacks are
+        added first, which costs one rewrite.
+        """
+        if any(normalize_column(c) not in self.file_columns for c in header):
+            self._rewrite(self.csv_path, add_columns=header)
+            self.journal.truncate()
+            self.changes.clear()
+        size = os.path.getsize(self.csv_path)
+        with open(self.csv_path, 'rb+') as f:
+            line_end = '\r\n' if f.readline().endswith(b'\r\n') else '\n'
+            f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(size - 1)
+                if f.read(1) != b'\n':
+                    f.write(line_end.encode('utf-8'))
+                    if self._checkpoint and self._checkpoint[1] == size:
+                        self._checkpoint = (self._checkpoint[0], size + len(line_end))
+            for row in rows:
+                values = ['' if row.get(c) is None else row[c] for c in self.file_columns]
+                f.write(self._encode(values, line_end))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        if self._checkpoint:
+            # Rows only went after the checkpointed offset
+            with open(self._head_path(), 'w', encoding='utf-8') as f:
+                json.dump({'row': self._checkpoint[0], 'offset': self._checkpoint[1], 'key': self._file_key()}, f)
+        return len(rows)
+
+    def update(self, row_id, **fields):
+        """Record a status change for one row in the journal."""
+        self.changes.setdefault(row_id, {}).update(fields)
+        if fields.get('status') == 'pending':
+            self._pending_head = min(self._pending_head, row_id)
+        if self.journal.append(row_id, **fields) >= self.compact_threshold:
+            self._rewrite(self.csv_path)
+            self.journal.truncate()
+            self.changes.clear()
+
+    @staticmethod
+    def _records(src):
+        """Raw CSV records (bytes, line ending included) from a binary file.
+
+        A line with an odd number of quotes continues a quoted field, so
+        records with embedded newlines are kept whole.
+        """
+        record = b''
+        for line in src:
+            record += line
+            if record.count(b'"') % 2 == 0:
+                yield record
+                record = b''
+        if record:
+            yield record
+
+    @staticmethod
+    def _encode(values, line_end):
+        out = io.StringIO()
+        csv.writer(out, lineterminator=line_end).writerow(values)
+        return out.getvalue().encode('utf-8')
+
+    def _rewrite(self, path, add_columns=()):
+        """Stream the base file to `path` with the journaled changes applied.
+
+        Unchanged records are copied as raw bytes; only changed ones (or all
+        of them, the first time missing ledger columns are added) are parsed
+        and re-encoded. `add_columns` are extra (raw) header names to add,
+        empty for every existing row.
+        """
+        # Header names to add: missing ledger columns, then `add_columns`
+        names = [c for c in CORE_COLUMNS if c not in self.file_columns]
+        for name in add_columns:
+            if normalize_column(name) not in self.file_columns + [normalize_column(c) for c in names]:
+                names.append(name)
+        new_header = self.header + names
+        missing = [normalize_column(c) for c in names]
+        columns = self.file_columns + missing
+        positions = {c: i for i, c in enumerate(columns)}
+        defaults = [STATUS_DEFAULTS.get(c, '') for c in missing]
+        width = len(self.file_columns)
+        suffix = ''.join(',' + value for value in defaults).encode('utf-8')
+
+        # The first pending row, from a status-only scan
+        first_pending = None
+        for chunk in self._chunks(['status'], start=self._pending_head):
+            hits = chunk.index[chunk['status'] == 'pending']
+            if len(hits):
+                first_pending = int(hits[0])
+                break
+
+        tmp_path = path + '.tmp'
+        with open(self.csv_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            records = self._records(src)
+            header = next(records, b'')
+            line_end = '\r\n' if header.endswith(b'\r\n') else '\n'
+            if missing:
+                header = self._encode(new_header, line_end)
+            dst.write(header)
+            written = len(header)
+            head = None
+            row_id = -1
+            for record in records:
+                if not record.strip():
+                    # Blank lines are not rows; they are kept as they are
+                    dst.write(record)
+                    written += len(record)
+                    continue
+                row_id += 1
+                changes = self.changes.get(row_id)
+                if missing and not changes and b'"' not in record and record.count(b',') == width - 1:
+                    # Plain full-width row: the default cells can just be appended
+                    body = record.rstrip(b'\r\n')
+                    record = body + suffix + record[len(body):]
+                elif changes or missing:
+                    values = next(csv.reader(io.StringIO(record.decode('utf-8'))), [])
+                    values = values[:width] + [''] * (width - len(values)) + defaults
+                    for field, value in (changes or {}).items():
+                        if field in positions:
+                            values[positions[field]] = '' if value is None else value
+                    record = self._encode(values, '\r\n' if record.endswith(b'\r\n') else '\n')
+                if row_id == first_pending:
+                    head = (row_id, written)
+                dst.write(record)
+                written += len(record)
+            if head is None:
+                head = (row_id + 1, written)
+            dst.flush()
+            if self.fsync:
+                os.fsync(dst.fileno())
+        os.replace(tmp_path, path)
+        if path == self.csv_path:
+            self.header = new_header
+            self.file_columns = columns
+            self._checkpoint = head
+            self._pending_head = head[0]
+            with open(self._head_path(), 'w', encoding='utf-8') as f:
+                json.dump({'row': head[0], 'offset': head[1], 'key': self._file_key()}, f)
+
+    def export_csv(self, path):
+        self._rewrite(path)
+
+    def close(self):
+        """Fold the journal into the file at the end of a run."""
+        if self.changes:
+            self._rewrite(self.csv_path)
+        self.journal.truncate()
+        self.changes.clear()
+
+
+class SqliteLedger:
+    """Contact ledger in SQLite, indexed on status, follow-up status and send date.
+
+    Columns beyond the core ledger columns (e.g. "sr_no") are kept as JSON in
+    `extra` so the list can be exported back in its original CSV layout.
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, db_path, follow_up_days):
+        self.db_path = db_path
+        self.follow_up_days = follow_up_days
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS contacts (
+                    row_id INTEGER PRIMARY KEY,
+                    email TEXT,
+                    name TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    date_sent TEXT,
+                    follow_up_status TEXT NOT NULL DEFAULT 'pending',
+                    follow_up_date TEXT,
+                    follow_up_due TEXT,
+                    send_key TEXT,
+                    thread_id TEXT,
+                    extra TEXT
+                )""")
+            columns = [r[1] for r in self.conn.execute("PRAGMA table_info(contacts)")]
+            for column in ('follow_up_due', 'send_key', 'thread_id'):
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE contacts ADD COLUMN {column} TEXT")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_contacts_status ON contacts(status, row_id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_contacts_follow_up_status ON contacts(follow_up_status)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_contacts_date_sent ON contacts(date_sent)")
+            # Only rows still waiting for a follow-up are indexed by due date
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_contacts_follow_up_due ON contacts(follow_up_due, row_id) "
+                "WHERE status = 'sent' AND follow_up_status = 'pending'")
+            self._backfill_follow_up_due()
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._create_counters()
+
+    def _create_counters(self):
+        """Keep per-status row counts in `status_counts`, maintained by triggers.
+
+        counts() then reads a handful of rows instead of scanning contacts.
+        """
+        self.conn.execute("CREATE TABLE IF NOT EXISTS status_counts (name TEXT PRIMARY KEY, n INTEGER NOT NULL)")
+        bump = ("INSERT INTO status_counts (name, n) VALUES ({name}, {delta}) "
+                "ON CONFLICT(name) DO UPDATE SET n = n + {delta};")
+        self.conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS contacts_count_insert AFTER INSERT ON contacts BEGIN "
+            + bump.format(name="'total'", delta=1)
+            + bump.format(name="'status:' || NEW.status", delta=1)
+            + bump.format(name="'follow_up_status:' || NEW.follow_up_status", delta=1)
+            + " END")
+        self.conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS contacts_count_delete AFTER DELETE ON contacts BEGIN "
+            + bump.format(name="'total'", delta=-1)
+            + bump.format(name="'status:' || OLD.status", delta=-1)
+            + bump.format(name="'follow_up_status:' || OLD.follow_up_status", delta=-1)
+            + " END")
+        self.conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS contacts_count_update AFTER UPDATE OF status, follow_up_status "
+            "ON contacts BEGIN "
+            + bump.format(name="'status:' || OLD.status", delta=-1)
+            + bump.format(name="'status:' || NEW.status", delta=1)
+            + bump.format(name="'follow_up_status:' || OLD.follow_up_status", delta=-1)
+            + bump.format(name="'follow_up_status:' || NEW.follow_up_status", delta=1)
+            + " END")
+
+        # Databases created before the counters existed: seed them once
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'counters'").fetchone() is None:
+            self.conn.execute("DELETE FROM status_counts")
+            self.conn.execute("INSERT INTO status_counts SELECT 'total', COUNT(*) FROM contacts")
+            self.conn.execute("INSERT INTO status_counts SELECT 'status:' || status, COUNT(*) "
+                              "FROM contacts GROUP BY status")
+            self.conn.execute("INSERT INTO status_counts SELECT 'follow_up_status:' || follow_up_status, COUNT(*) "
+                              "FROM contacts GROUP BY follow_up_status")
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('counters', '1')")
+
+    def _backfill_follow_up_due(self):
+        """Compute due dates for rows sent before follow_up_due was tracked."""
+        self.conn.execute(
+            "UPDATE contacts SET follow_up_due = date(date_sent, ?) "
+            "WHERE follow_up_due IS NULL AND date_sent IS NOT NULL AND status = 'sent'",
+            (f"+{int(self.follow_up_days)} days",))
+
+    def _columns(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'columns'").fetchone()
+        return json.loads(row['value']) if row else list(CORE_COLUMNS)
+
+    def _to_dict(self, record):
+        row = json.loads(record['extra']) if record['extra'] else {}
+        for column in CORE_COLUMNS:
+            row[column] = record[column]
+        row['row_id'] = record['row_id']
+        return row
+
+    def is_empty(self):
+        return self.conn.execute("SELECT 1 FROM contacts LIMIT 1").fetchone() is None
+
+    def _record(self, row_id, values, extra_columns):
+        """INSERT parameters for one contact (dict keyed by normalized column)."""
+        values = {k: _clean(v) for k, v in values.items()}
+        for column, default in STATUS_DEFAULTS.items():
+            values[column] = values.get(column) or default
+        extra = {c: values.get(c) for c in extra_columns}
+        return (int(row_id), *(values.get(c) for c in CORE_COLUMNS), json.dumps(extra, default=str))
+
+    def _insert(self, records):
+        self.conn.executemany(
+            f"INSERT INTO contacts (row_id, {', '.join(CORE_COLUMNS)}, extra) "
+            f"VALUES ({', '.join('?' * (len(CORE_COLUMNS) + 2))})",
+            records,
+        )
+
+    def import_csv(self, path):
+        """Replace the ledger contents with a contacts CSV."""
+        contacts = read_contacts_csv(path)
+        columns = list(contacts.columns)
+        extra_columns = [c for c in columns if c not in CORE_COLUMNS]
+
+        with self.conn:
+            self.conn.execute("DELETE FROM contacts")
+            self._insert(self._record(row.row_id, row.to_dict(), extra_columns) for row in contacts)
+            self._backfill_follow_up_due()
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('columns', ?)", (json.dumps(columns),))
+        return len(contacts)
+
+    def emails(self):
+        """Every email address in the ledger, in row order."""
+        cursor = self.conn.cursor()
+        cursor.row_factory = None  # Plain tuples; this can be millions of rows
+        for (email,) in cursor.execute("SELECT email FROM contacts ORDER BY row_id"):
+            yield email
+
+    def add_contacts(self, rows, header=()):
+        """Insert new contacts (dicts keyed by normalized column) after the existing ones."""
+        columns = self._columns()
+        for name in header:
+            if normalize_column(name) not in columns:
+                columns.append(normalize_column(name))
+        extra_columns = [c for c in columns if c not in CORE_COLUMNS]
+        start = self.conn.execute("SELECT COALESCE(MAX(row_id), -1) + 1 FROM contacts").fetchone()[0]
+        with self.conn:
+            self._insert(self._record(start + i, row, extra_columns) for i, row in enumerate(rows))
+            if any(row.get('date_sent') for row in rows):
+                self._backfill_follow_up_due()
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('columns', ?)", (json.dumps(columns),))
+        return len(rows)
+
+    def export_csv(self, path):
+        """Write the ledger out in the current emails.csv format."""
+        columns = self._columns()
+        for column in CORE_COLUMNS:
+            if column not in columns:
+                columns.append(column)
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            for record in self.conn.execute("SELECT * FROM contacts ORDER BY row_id"):
+                writer.writerow(self._to_dict(record))
+        os.replace(tmp_path, path)
+
+    def columns(self):
+        return self._columns() + [c for c in CORE_COLUMNS if c not in self._columns()]
+
+    def pending(self, limit=None):
+        """Rows that have not been emailed yet, in file order (index lookup)."""
+        sql = "SELECT * FROM contacts WHERE status = 'pending' ORDER BY row_id"
+        params = ()
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = (limit,)
+        return [self._to_dict(r) for r in self.conn.execute(sql, params)]
+
+    def in_flight(self):
+        """Rows claimed for sending whose outcome was never recorded (index lookups)."""
+        sql = ("SELECT * FROM contacts WHERE status = 'in_flight' "
+               "UNION SELECT * FROM contacts WHERE follow_up_status = 'in_flight' ORDER BY row_id")
+        return [self._to_dict(r) for r in self.conn.execute(sql)]
+
+    def due_follow_ups(self, today, limit=None):
+        """Rows whose follow-up is due on or before `today` (YYYY-MM-DD)."""
+        sql = ("SELECT * FROM contacts WHERE status = 'sent' AND follow_up_status = 'pending' "
+               "AND follow_up_due <= ? ORDER BY follow_up_due, row_id")
+        params = (today,)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (limit,)
+        return [self._to_dict(r) for r in self.conn.execute(sql, params)]
+
+    def awaiting_follow_ups(self):
+        """Rows that were sent and still wait for a follow-up, due or not."""
+        return [self._to_dict(r) for r in self.conn.execute(
+            "SELECT * FROM contacts WHERE status = 'sent' AND follow_up_status = 'pending' ORDER BY row_id")]
+
+    def follow_up_forecast(self, today, days=7):
+        """How many follow-ups become due on each of the next `days` days."""
+        dates = forecast_dates(today, days)
+        counts = {date: 0 for date in dates}
+        sql = ("SELECT max(follow_up_due, ?) AS day, COUNT(*) FROM contacts "
+               "WHERE status = 'sent' AND follow_up_status = 'pending' AND follow_up_due <= ? "
+               "GROUP BY day")
+        for day, count in self.conn.execute(sql, (today, dates[-1])):
+            counts[day] = count
+        return counts
+
+    def counts(self):
+        counters = dict(self.conn.execute("SELECT name, n FROM status_counts"))
+        return {
+            'total': counters.get('total', 0),
+            'pending': counters.get('status:pending', 0),
+            'sent': counters.get('status:sent', 0),
+            'failed': counters.get('status:failed', 0),
+            'sent_followups': counters.get('follow_up_status:sent', 0),
+            'replied': counters.get('follow_up_status:replied', 0),
+            'bounced': counters.get('follow_up_status:bounced', 0),
+        }
+
+    def update(self, row_id, **fields):
+        """Apply a status change to one row in its own transaction."""
+        unknown = set(fields) - set(UPDATABLE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Cannot update ledger columns: {', '.join(sorted(unknown))}")
+        assignments = ', '.join(f"{field} = ?" for field in fields)
+        with self.conn:
+            self.conn.execute(f"UPDATE contacts SET {assignments} WHERE row_id = ?", (*fields.values(), row_id))
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == '__main__':
+    import sys
+    import send_emails as se
+
+    if len(sys.argv) != 2 or sys.argv[1] not in ('import', 'export'):
+        print("Usage: python ledger.py import|export")
+        sys.exit(1)
+
+    ledger = SqliteLedger(se.LEDGER_DB_FILE, se.get_config().follow_up_days)
+    if sys.argv[1] == 'import':
+        count = ledger.import_csv(se.EMAILS_FILE)
+        print(f"✓ Imported {count} contacts from {se.EMAILS_FILE} into {se.LEDGER_DB_FILE}")
+    else:
+        ledger.export_csv(se.EMAILS_FILE)
+        print(f"✓ Exported {se.LEDGER_DB_FILE} to {se.EMAILS_FILE}")
+    ledger.close()
@@ -0,0 +1,200 @@
+import re
+import json
+import os
+import threading
+from datetime import timedelta
+from email.utils import getaddresses, parseaddr
+from googleapiclient.errors import HttpError
+
+# Message lookups sent per batch HTTP request
+SYNC_BATCH_SIZE = 50
+# Headers fetched for each new message (format='metadata')
+METADATA_HEADERS = ['From', 'In-Reply-To', 'References', 'X-Failed-Recipients', 'Auto-Submitted', 'Content-Type']
+# Local parts of the addresses delivery failure notices come from
+BOUNCE_SENDERS = ('mailer-daemon', 'postmaster')
+
+_file_lock = threading.Lock()
+
+
+def _headers(message):
+    return {h['name'].lower(): h['value'] for h in message.get('payload', {}).get('headers', [])}
+
+
+def classify(message, sender_email):
+    """What an incoming message means for the ledger.
+
+    Returns None for mail that needs no action (our own messages,
+    auto-replies such as out-of-office notices), otherwise a dict with
+    'kind' ('replied' or 'bounced'), 'thread_id', the send keys found in
+    In-Reply-To/References ('keys') and the contact addresses it concerns
+    ('addresses').
+    """
+    headers = _headers(message)
+    from_address = parseaddr(headers.get('from', ''))[1].lower()
+    if not from_address or from_address == sender_email.lower():
+        return None
+
+    failed = [address.lower() for _, address in getaddresses([headers.get('x-failed-recipients', '')]) if address]
+    if failed or from_address.split('@')[0] in BOUNCE_SENDERS or \
+            'report-type=delivery-status' in headers.get('content-type', '').lower():
+        kind, addresses = 'bounced', failed
+    elif headers.get('auto-submitted', 'no').lower() != 'no':
+        return None
+    else:
+        kind, addresses = 'replied', [from_address]
+
+    # Our Message-IDs are <send key@sender domain> (see send_queue.message_id_for)
+    references = f"{headers.get('in-reply-to', '')} {headers.get('references', '')}"
+    keys = [reference.split('@')[0] for reference in re.findall(r'<([^<>@\s]+@[^<>\s]+)>', references)]
+    return {'kind': kind, 'thread_id': message.get('threadId'), 'keys': keys, 'addresses': addresses}
+
+
+class MailboxSync:
+    """Marks contacts who replied or bounced, so they get no follow-up.
+
+    Each sender mailbox is read incrementally: the last Gmail historyId
+    seen is kept in `state_file` (per sender address) and only messages
+    added to the inbox since then are fetched, so a sync costs one
+    history.list call plus one metadata lookup per new message, whatever
+    the size of the mailbox. On the first sync, or when Gmail has expired
+    the saved historyId, the last `backfill_days` of the inbox are searched
+    instead.
+
+    Messages are matched to rows still awaiting a follow-up by Gmail
+    thread, by the send key in In-Reply-To/References, or by address, and
+    the rows' follow_up_status becomes 'replied' or 'bounced'.
+    """
+
+    def __init__(self, ledger, state_file, backfill_days=14):
+        self.ledger = ledger
+        self.state_file = state_file
+        self.backfill_days = backfill_days
+
+    def _load(self):
+        with _file_lock:
+            try:
+                with open(self.state_file, encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                return {}
+
+    def _save(self, sender_email, history_id):
+        with _file_lock:
+            try:
+                with open(self.state_file, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            data[sender_email] = {'history_id': history_id}
+            tmp_path = self.state_file + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.state_file)
+
+    def _history(self, service, start_history_id):
+        """(ids of inbox messages added since `start_history_id`, latest history id)."""
+        message_ids = []
+        latest = start_history_id
+        page_token = None
+        while True:
+            response = service.users().history().list(userId='me', startHistoryId=start_history_id,
+                                                      historyTypes=['messageAdded'], labelId='INBOX',
+                                                      pageToken=page_token).execute()
+            for record in response.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    message_ids.append(added['message']['id'])
+            latest = response.get('historyId', latest)
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return message_ids, latest
+
+    def _search(self, service, since):
+        """Ids of inbox messages received on or after `since` (a datetime)."""
+        message_ids = []
+        page_token = None
+        while True:
+            response = service.users().messages().list(userId='me', q=f"in:inbox after:{since:%Y/%m/%d}",
+                                                       pageToken=page_token).execute()
+            message_ids.extend(m['id'] for m in response.get('messages', []))
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return message_ids
+
+    def _fetch(self, service, message_ids):
+        """Metadata for `message_ids`, SYNC_BATCH_SIZE lookups per batch request."""
+        messages = []
+
+        def callback(request_id, response, exception):
+            if exception is None:
+                messages.append(response)
+            else:
+                print(f"⚠ Could not read message {request_id}: {exception}")
+
+        for start in range(0, len(message_ids), SYNC_BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=callback)
+            for message_id in message_ids[start:start + SYNC_BATCH_SIZE]:
+                batch.add(service.users().messages().get(userId='me', id=message_id, format='metadata',
+                                                         metadataHeaders=METADATA_HEADERS),
+                          request_id=message_id)
+            batch.execute()
+        return messages
+
+    def new_messages(self, account, now):
+        """(new inbox messages for `account`, history id to resume from next time)."""
+        service = account.service
+        saved = self._load().get(account.sender_email, {}).get('history_id')
+        if saved:
+            try:
+                message_ids, latest = self._history(service, saved)
+                return self._fetch(service, message_ids), latest
+            except HttpError as error:
+                if error.resp.status != 404:
+                    raise
+                print(f"⚠ Mail history for {account.sender_email} has expired; searching recent mail instead.")
+        # Taken before the search, so nothing arriving meanwhile is skipped
+        latest = service.users().getProfile(userId='me').execute()['historyId']
+        message_ids = self._search(service, now - timedelta(days=self.backfill_days))
+        return self._fetch(service, message_ids), latest
+
+    def sync(self, accounts, now):
+        """Sync every account's new mail into the ledger; returns (replied, bounced)."""
+        events = []
+        checkpoints = []
+        for account in accounts:
+            try:
+                messages, latest = self.new_messages(account, now)
+            except HttpError as error:
+                print(f"⚠ Could not read mail for {account.sender_email}: {error}")
+                continue
+            events.extend(e for e in (classify(m, account.sender_email) for m in messages) if e)
+            checkpoints.append((account.sender_email, latest))
+
+        counts = {'replied': 0, 'bounced': 0}
+        if events:
+            # Only rows still awaiting a follow-up can change
+            by_thread, by_key, by_address = {}, {}, {}
+            for row in self.ledger.awaiting_follow_ups():
+                if row.get('thread_id'):
+                    by_thread[row['thread_id']] = row
+                if row.get('send_key'):
+                    by_key[row['send_key']] = row
+                by_address.setdefault((row['email'] or '').strip().lower(), row)
+
+            matched = set()
+            for event in events:
+                candidates = [by_thread.get(event['thread_id'])]
+                candidates += [by_key.get(key) for key in event['keys']]
+                candidates += [by_address.get(address) for address in event['addresses']]
+                row = next((r for r in candidates if r is not None and r['row_id'] not in matched), None)
+                if row is None:
+                    continue
+                matched.add(row['row_id'])
+                self.ledger.update(row['row_id'], follow_up_status=event['kind'])
+                counts[event['kind']] += 1
+                print(f"{'💬' if event['kind'] == 'replied' else '📭'} {row['email']} {event['kind']}; "
+                      f"no follow-up will be sent.")
+
+        # Only after the ledger has the changes, so a crash re-reads the same mail
+        for sender_email, latest in checkpoints:
+            self._save(sender_email, latest)
+        return counts['replied'], counts['bounced']
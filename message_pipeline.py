@@ -0,0 +1,72 @@
+import asyncio
+from engine import call_blocking
+
+# Queued after the last job
+_END = object()
+
+
+class MessagePipeline:
+    """Builds the next few messages of a send loop while the loop waits to send.
+
+    A producer task calls `prepare(*item)` on the executor for each item in
+    turn and keeps up to `ahead` results ready, so the sender only waits out
+    the limiter and then sends a message that is already encoded. Items left
+    unprepared or unsent when the loop stops are simply dropped: nothing is
+    claimed in the send queue until a message is actually sent.
+
+        async with MessagePipeline(items, prepare, ahead=3) as pipeline:
+            while await pipeline.more() and await wait_for_slot():
+                job = await pipeline.get()
+    """
+
+    def __init__(self, items, prepare, ahead):
+        self._items = items
+        self._prepare = prepare
+        self._ready = asyncio.Queue(maxsize=max(ahead, 1))
+        self._task = None
+        self._next = None
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._produce())
+        return self
+
+    async def __aexit__(self, *exc):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return False
+
+    async def _produce(self):
+        try:
+            for item in self._items:
+                await self._ready.put(await call_blocking(self._prepare, *item))
+        except Exception as e:
+            await self._ready.put(e)
+        await self._ready.put(_END)
+
+    async def more(self):
+        """Whether another job is coming (waits for it to be prepared)."""
+        if self._next is None:
+            self._next = await self._ready.get()
+        if isinstance(self._next, Exception):
+            raise self._next
+        return self._next is not _END
+
+    async def get(self):
+        """The next prepared job, or None when every item has been handed out."""
+        if not await self.more():
+            return None
+        job, self._next = self._next, None
+        return job
+
+    async def take(self, count):
+        """Up to `count` prepared jobs (fewer only at the end)."""
+        jobs = []
+        while len(jobs) < count:
+            job = await self.get()
+            if job is None:
+                break
+            jobs.append(job)
+        return jobs
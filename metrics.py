@@ -0,0 +1,208 @@
+import bisect
+import threading
+import time
+from contextlib import ContextDecorator
+
+# Latency buckets (seconds) for API calls and file work
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Buckets for deliberate waits (spacing, batch breaks, hourly limit)
+WAIT_BUCKETS = (1, 5, 15, 30, 60, 120, 180, 300, 600, 900, 1800, 3600)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def state(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def restore(self, state):
+        with self._lock:
+            self._values = {tuple(key): value for key, value in state}
+
+    def _samples(self):
+        with self._lock:
+            return sorted(self._values.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self._samples():
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """A count that only goes up (sends, errors, retries)."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that goes up and down (queue depth, remaining budget)."""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, plus their sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def time(self, **labels):
+        """Context manager / decorator that observes the wall time it wraps."""
+        return _Timer(self, labels)
+
+    def _samples(self):
+        with self._lock:
+            return sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, (counts, total) in self._samples():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, [('le', _format_number(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The process's metrics, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def state(self):
+        """Every metric's values, JSON-serializable (see restore())."""
+        return {metric.name: metric.state() for metric in self._metrics}
+
+    def restore(self, state, names=None):
+        """Load values saved by state(), e.g. by the campaign process."""
+        for metric in self._metrics:
+            if metric.name in state and (names is None or metric.name in names):
+                metric.restore(state[metric.name])
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# Send path
+gmail_api_seconds = registry.register(Histogram(
+    'email_gmail_api_seconds', 'Latency of Gmail send calls (one attempt each).', ['call']))
+create_message_seconds = registry.register(Histogram(
+    'email_create_message_seconds', 'Time to build and encode one MIME message.'))
+auth_seconds = registry.register(Histogram(
+    'email_auth_seconds', 'Time to authenticate a sender account and look up its address.'))
+ledger_seconds = registry.register(Histogram(
+    'email_ledger_seconds', 'Contact ledger persistence time by operation.', ['operation']))
+wait_seconds = registry.register(Histogram(
+    'email_wait_seconds', 'Deliberate waits between sends by reason.', ['reason'], buckets=WAIT_BUCKETS))
+sent_total = registry.register(Counter(
+    'email_sent_total', 'Emails sent, by kind.', ['kind']))
+send_errors_total = registry.register(Counter(
+    'email_send_errors_total', 'Failed sends by error type.', ['error_type']))
+send_retries_total = registry.register(Counter(
+    'email_send_retries_total', 'Sends retried after a temporary error.'))
+
+# Capacity
+queue_depth = registry.register(Gauge(
+    'email_send_queue_depth', "Rows picked for the running campaign that are not sent yet.", ['kind']))
+rate_limit_remaining = registry.register(Gauge(
+    'email_rate_limit_remaining', 'Sends left in each sender\'s daily and hourly budget.', ['sender', 'limit']))
+contacts = registry.register(Gauge(
+    'email_contacts', 'Contacts in the ledger by status.', ['status']))
+campaign_running = registry.register(Gauge(
+    'email_campaign_running', '1 while a campaign is running.'))
+
+
+def record_budget(account, now):
+    """Publish an account's remaining daily and hourly sends."""
+    for limit in ('daily', 'hourly'):
+        rate_limit_remaining.set(account.limiter.get(limit).available(now), sender=account.sender_email, limit=limit)
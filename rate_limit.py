@@ -0,0 +1,223 @@
+import json
+import math
+import os
+import random
+import threading
+from datetime import datetime, timedelta
+
+# One lock for the shared state file (sender threads save concurrently)
+_file_lock = threading.Lock()
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+class DailyLimit:
+    """At most `capacity` sends per calendar day; the count resets at midnight."""
+
+    def __init__(self, name, capacity):
+        self.name = name
+        self.capacity = capacity
+        self.day = None
+        self.count = 0
+
+    def _roll(self, now):
+        if self.day != now.date():
+            self.day = now.date()
+            self.count = 0
+
+    def sent_on(self, now):
+        """Sends already made on `now`'s day."""
+        return self.count if self.day == now.date() else 0
+
+    def available(self, now):
+        """Sends left today."""
+        self._roll(now)
+        return max(self.capacity - self.count, 0)
+
+    def next_available(self, now):
+        """Earliest time one send is allowed: now, or the next midnight."""
+        if self.capacity <= 0:
+            return None
+        if self.available(now) > 0:
+            return now
+        return datetime.combine(self.day + timedelta(days=1), datetime.min.time())
+
+    def record(self, now, count=1):
+        self._roll(now)
+        self.count += count
+
+    def state(self):
+        return {'day': self.day.isoformat() if self.day else None, 'count': self.count}
+
+    def restore(self, state):
+        if 'tokens' in state:
+            # Saved by the old token bucket: what it had used up of that day
+            updated = _parse_time(state.get('updated'))
+            self.day = updated.date() if updated else None
+            self.count = max(self.capacity - int(state['tokens']), 0)
+            return
+        day = state.get('day')
+        self.day = datetime.fromisoformat(day).date() if day else None
+        self.count = state.get('count', 0)
+
+
+class SlidingWindowLimit:
+    """At most `capacity` sends in any `period_seconds` (a log of recent sends)."""
+
+    def __init__(self, name, capacity, period_seconds):
+        self.name = name
+        self.capacity = capacity
+        self.period = timedelta(seconds=period_seconds)
+        # (time, count) of sends within the last period, oldest first
+        self.sends = []
+
+    def _expire(self, now):
+        while self.sends and self.sends[0][0] <= now - self.period:
+            self.sends.pop(0)
+
+    def available(self, now):
+        """Sends allowed right now."""
+        self._expire(now)
+        return max(self.capacity - sum(count for _, count in self.sends), 0)
+
+    def next_available(self, now):
+        """Earliest time one send is allowed: when enough logged sends age out."""
+        if self.capacity <= 0:
+            return None
+        self._expire(now)
+        used = sum(count for _, count in self.sends)
+        for at, count in self.sends:
+            if used < self.capacity:
+                break
+            now = at + self.period
+            used -= count
+        return now
+
+    def record(self, now, count=1):
+        self._expire(now)
+        if count:
+            self.sends.append((now, count))
+
+    def state(self):
+        return {'sends': [[at.isoformat(), count] for at, count in self.sends]}
+
+    def restore(self, state):
+        self.sends = [(datetime.fromisoformat(at), count) for at, count in state.get('sends', [])]
+
+
+class JitteredSpacing:
+    """A random gap of min_seconds..max_seconds between sends.
+
+    Every `batch_size` sends the gap is replaced by `break_seconds`.
+    """
+
+    def __init__(self, name, min_seconds, max_seconds, batch_size=None, break_seconds=0, rng=random):
+        self.name = name
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.batch_size = batch_size
+        self.break_seconds = break_seconds
+        self.rng = rng
+        self.next_time = None
+        self.in_batch = 0
+        self.on_break = False
+
+    def available(self, now):
+        # Spacing limits when, not how many: an open slot fits a whole batch
+        return math.inf if self.next_time is None or now >= self.next_time else 0
+
+    def next_available(self, now):
+        if self.next_time is None or now >= self.next_time:
+            return now
+        return self.next_time
+
+    def record(self, now, count=1):
+        # A batched submission counts as one send here
+        self.in_batch += 1
+        if self.batch_size and self.in_batch >= self.batch_size:
+            self.in_batch = 0
+            self.on_break = True
+            gap = self.break_seconds
+        else:
+            self.on_break = False
+            gap = self.rng.uniform(self.min_seconds, self.max_seconds)
+        self.next_time = now + timedelta(seconds=gap)
+
+    def state(self):
+        return {'next_time': self.next_time.isoformat() if self.next_time else None,
+                'in_batch': self.in_batch, 'on_break': self.on_break}
+
+    def restore(self, state):
+        self.next_time = _parse_time(state.get('next_time'))
+        self.in_batch = state.get('in_batch', 0)
+        self.on_break = state.get('on_break', False)
+
+
+class RateLimiter:
+    """Combines several limits; a send is allowed when all of them allow it.
+
+    The limiter never sleeps: next_send() says when the next send is allowed
+    and which limit is holding it back, and record() books a send. With a
+    `state_file` the state is saved after every send under `key`, so a
+    restart picks up the same budgets.
+    """
+
+    def __init__(self, limits, state_file=None, key='default'):
+        self.limits = list(limits)
+        self.state_file = state_file
+        self.key = key
+        if state_file:
+            self.load()
+
+    def next_send(self, now):
+        """(time, limit name) of the earliest allowed send; time is None if never."""
+        when, blocker = now, None
+        for limit in self.limits:
+            at = limit.next_available(now)
+            if at is None:
+                return None, limit.name
+            if at > when:
+                when, blocker = at, limit.name
+        return when, blocker
+
+    def available(self, now):
+        """Sends allowed right now without waiting."""
+        return min((limit.available(now) for limit in self.limits), default=0)
+
+    def record(self, now, count=1):
+        for limit in self.limits:
+            limit.record(now, count)
+        if self.state_file:
+            self.save()
+
+    def get(self, name):
+        for limit in self.limits:
+            if limit.name == name:
+                return limit
+        return None
+
+    def load(self):
+        with _file_lock:
+            try:
+                with open(self.state_file, encoding='utf-8') as f:
+                    saved = json.load(f).get(self.key, {})
+            except (OSError, ValueError):
+                return
+        for limit in self.limits:
+            if limit.name in saved:
+                limit.restore(saved[limit.name])
+
+    def save(self):
+        with _file_lock:
+            try:
+                with open(self.state_file, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            data[self.key] = {limit.name: limit.state() for limit in self.limits}
+            tmp_path = self.state_file + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.state_file)
@@ -0,0 +1,86 @@
+import math
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+# One sending window: kind is 'new' or 'followup'; start <= now < end
+SendWindow = namedtuple('SendWindow', 'kind start end')
+
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+class SendCalendar:
+    """The sending windows that follow from the day and time-window settings.
+
+    New-email days and follow-up days each get every (start_h, start_m,
+    end_h, end_m) window in `time_windows`; a day listed as both sends new
+    emails.
+    """
+
+    def __init__(self, new_email_days, followup_days, time_windows):
+        self.new_email_days = set(new_email_days)
+        self.followup_days = set(followup_days)
+        self.time_windows = sorted(time_windows)
+
+    def day_kind(self, weekday):
+        """'new', 'followup' or None for a weekday (Monday is 0)."""
+        if weekday in self.new_email_days:
+            return 'new'
+        if weekday in self.followup_days:
+            return 'followup'
+        return None
+
+    def windows_on(self, day):
+        """The windows on the date of `day`, in order."""
+        kind = self.day_kind(day.weekday())
+        if kind is None:
+            return []
+        midnight = datetime.combine(day.date(), time.min)
+        return [SendWindow(kind, midnight.replace(hour=start_h, minute=start_m),
+                           midnight.replace(hour=end_h, minute=end_m))
+                for start_h, start_m, end_h, end_m in self.time_windows]
+
+    def upcoming(self, now, count=None, days=14):
+        """Windows that have not ended by `now`, looking up to `days` days ahead."""
+        windows = []
+        for offset in range(days + 1):
+            for window in self.windows_on(now + timedelta(days=offset)):
+                if window.end > now:
+                    windows.append(window)
+                    if count is not None and len(windows) >= count:
+                        return windows
+        return windows
+
+    def current(self, now):
+        """The window open at `now`, or None."""
+        for window in self.windows_on(now):
+            if window.start <= now < window.end:
+                return window
+        return None
+
+    def next_opening(self, now):
+        """The first window that opens after `now`, or None if there is none in two weeks."""
+        for window in self.upcoming(now):
+            if window.start > now:
+                return window
+        return None
+
+    def share(self, available, window):
+        """Sends to allow in `window` out of `available` left for its day.
+
+        The remainder is split evenly over the day's windows from this one
+        on, so what an earlier window did not use rolls over to later ones.
+        """
+        windows_left = sum(1 for w in self.windows_on(window.start) if w.start >= window.start)
+        return math.ceil(available / max(windows_left, 1))
+
+    def describe(self, window, now):
+        """'Today at 12:30', 'Friday at 9:30', ... for when `window` opens."""
+        if window.start.date() == now.date():
+            day = "Today"
+        elif window.start.date() == (now + timedelta(days=1)).date():
+            day = "Tomorrow"
+        elif window.start - now < timedelta(days=7):
+            day = DAY_NAMES[window.start.weekday()]
+        else:
+            day = f"{DAY_NAMES[window.start.weekday()]} {window.start:%d %b}"
+        return f"{day} at {window.start.hour}:{window.start.minute:02d}"
@@ -1,18 +1,29 @@
 import os
-import time
 import base64
-import pandas as pd
 import random
-from datetime import datetime, timedelta
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+import uuid
+from datetime import datetime
 from googleapiclient.errors import HttpError
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
+from email.generator import BytesGenerator
+from io import BytesIO
+import gmail_auth
+from attachments import get_attachment_bytes
+from ledger import CsvLedger, SqliteLedger, StreamingCsvLedger
+from events import emit
+import metrics
+import tracing
+from transport import GmailTransport, SYSTEM_CLOCK
+from sender_pool import SenderAccount, run_accounts
+from engine import engine, call_blocking
+from send_queue import SendQueue, new_send_key, message_id_for
+from message_pipeline import MessagePipeline
+from mailbox_sync import MailboxSync
+from send_calendar import SendCalendar
+from campaign_config import ConfigStore, ConfigError
+from rate_limit import RateLimiter, DailyLimit, SlidingWindowLimit, JitteredSpacing
+from templating import TemplateError, compile_templates, validate_templates, render_batch
 
 # --- Configuration ---
 SCOPES = [
@@ -25,597 +36,617 @@ CREDENTIALS_FILE = 'credentials.json'
 TOKEN_FILE = 'token.json'
 SENDER_NAME = "Yashwanth L"  # Name to appear in the "From" field
 
-# --- Anti-Blocking Configuration (GMAIL-SAFE) ---
-# ⚠️ CRITICAL: These settings prevent Gmail from detecting automation
-# DO NOT increase these values unless you want to get blocked!
+# --- Campaign Settings ---
+# Sending limits, days, time windows, follow-up timing and templates live in
+# CONFIG_FILE (see campaign_config.py). It is read once and cached; edits are
+# picked up on the next run without restarting the dashboard or autopilot.
+# A running campaign keeps the settings it started with.
+# ⚠️ CRITICAL: its limits keep Gmail from detecting automation.
+CONFIG_FILE = 'campaign_config.json'
 
-MAX_EMAILS_PER_DAY = 20  # Ultra-conservative for Gmail automation safety
-MAX_EMAILS_PER_HOUR = 5  # Maximum 4-5 emails per hour (Gmail-safe)
-MIN_DELAY_SECONDS = 180  # Minimum 3 minutes between emails (human-like)
-MAX_DELAY_SECONDS = 300  # Maximum 5 minutes between emails
-BATCH_SIZE = 5  # Small batches to avoid detection
-BATCH_BREAK_MINUTES = 15  # Longer breaks between batches (15 minutes)
 MAX_RETRIES = 2  # Reduced retries to avoid spam flags
 EXPONENTIAL_BACKOFF_BASE = 3  # Longer backoff (3s, 9s, 27s)
 
-# --- Specific Day Configuration ---
-# New Emails: Tuesday(1), Wednesday(2), Thursday(3)
-ALLOWED_NEW_EMAIL_DAYS = [1, 2, 3]
-
-# Follow-ups: Monday(0), Friday(4)
-ALLOWED_FOLLOWUP_DAYS = [0, 4]
-
-# Time windows stay the same (Morning/Afternoon/Evening)
-TIME_WINDOWS = [
-    (9, 30, 10, 30),   # 9:30 AM - 10:30 AM
-    (12, 30, 14, 0),   # 12:30 PM - 2:00 PM
-    (17, 30, 19, 0),   # 5:30 PM - 7:00 PM
-]
-
-def get_next_allowed_time():
-    """Get the next allowed sending time window."""
-    # (Simplified logic for display)
-    return "Check schedule guide"
-
-# ... (Templates code remains same) ...
-
-def main():
-    """Main execution function."""
-    print("\n" + "=" * 60)
-    print("🚀 Gmail Bulk Email Sender with Anti-Blocking Protection")
-    print("=" * 60)
-    
-    # 1. Load Data
-    if not os.path.exists(EMAILS_FILE):
-        print(f"❌ Error: {EMAILS_FILE} not found.")
-        print("Please create the CSV file with 'email' and 'name' columns.")
-        return
-    
-    df = pd.read_csv(EMAILS_FILE)
-    
-    # Normalize headers to support "Name", "Email", "Status", "Follow Up Status"
-    df.columns = [c.strip().lower().replace(' ', '_').replace('-', '_') for c in df.columns]
-    
-    if 'status' not in df.columns:
-        df['status'] = 'pending'
-    if 'date_sent' not in df.columns:
-        df['date_sent'] = None
-    df['date_sent'] = df['date_sent'].astype(object)
-
-    if 'follow_up_status' not in df.columns:
-        df['follow_up_status'] = 'pending'
-
-    if 'follow_up_date' not in df.columns:
-        df['follow_up_date'] = None
-    df['follow_up_date'] = df['follow_up_date'].astype(object)
-    
-    pending_emails = df[df['status'] == 'pending']
-    
-    # Check for PDF
-    pdf_path = PDF_FILE if os.path.exists(PDF_FILE) else None
-    if pdf_path:
-        print(f"📎 PDF Attachment found: {os.path.basename(pdf_path)}")
-    else:
-        print("ℹ️  No PDF attachment found (sending plain text only).")
-    
-    # 2. Authenticate
-    print("\n🔐 Authenticating with Gmail...")
-    service = authenticate_gmail()
-    if not service:
-        print("❌ Authentication failed.")
-        return
-    
-    # Get user profile
-    profile = service.users().getProfile(userId='me').execute()
-    sender_email = profile['emailAddress']
-    print(f"✓ Authenticated as: {sender_email}")
-
-    # 3. Display Configuration
-    print("\n⚙️  Anti-Blocking Configuration:")
-    print(f"   • Daily limit: {MAX_EMAILS_PER_DAY} emails")
-    print(f"   • New Emails: Tuesday, Wednesday, Thursday")
-    print(f"   • Follow-ups: Monday, Friday")
-    
-    current_time = datetime.now()
-    current_weekday = current_time.weekday()
-    day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    current_day_name = day_names[current_weekday]
-    
-    print(f"\n📅 Today is: {current_day_name}")
-    
-    # Determine Mode
-    mode = "none"
-    if current_weekday in ALLOWED_NEW_EMAIL_DAYS:
-        mode = "new"
-        print("✅ Mode: Sending NEW EMAILS today")
-    elif current_weekday in ALLOWED_FOLLOWUP_DAYS:
-        mode = "followup"
-        print("✅ Mode: Sending FOLLOW-UPS today")
-    else:
-        print("⏸ No sending allowed today (Weekend).")
-        return
-
-    # 4. Execute based on Day
-    total_sent = 0
-    total_failed = 0
-    
-    # Check time window first
-    in_window, window_time = is_in_allowed_time_window()
-    if not in_window:
-        print(f"\n⏸ Outside allowed time windows.")
-        print(f"⏰ Current time: {current_time.strftime('%I:%M %p')}")
-        print(f"💡 Allowed time windows:")
-        for start_h, start_m, end_h, end_m in TIME_WINDOWS:
-            print(f"   - {start_h}:{start_m:02d} - {end_h}:{end_m:02d}")
-        return
-
-    hour_start_time = datetime.now()
-    hourly_count = 0
-    batch_count = 0
-
-    if mode == "new":
-        print("\n📧 Starting NEW Email Loop...")
-        for index, row in pending_emails.iterrows():
-            # (Loop logic for new emails - mostly same as before)
-            if total_sent >= MAX_EMAILS_PER_DAY:
-                print(f"\n⏸ Daily limit of {MAX_EMAILS_PER_DAY} reached.")
-                break
-            
-            if hourly_count >= MAX_EMAILS_PER_HOUR:
-                wait_time = 3600 - (datetime.now() - hour_start_time).seconds
-                print(f"\n⏸ Hourly limit reached. Waiting...")
-                time.sleep(wait_time)
-                hourly_count = 0
-                hour_start_time = datetime.now()
-
-            # Batch break
-            if total_sent > 0 and total_sent % BATCH_SIZE == 0:
-                print(f"⏸ Taking {BATCH_BREAK_MINUTES} min break...")
-                time.sleep(BATCH_BREAK_MINUTES * 60)
-
-            to_email = row['email']
-            name = row.get('name', 'there')
-            print(f"\n[{total_sent + 1}] Sending to: {to_email}")
-            
-            current_subject, current_body_template = get_random_template()
-            try:
-                body = current_body_template.format(name=name)
-            except:
-                body = current_body_template.replace("{name}", name)
-            
-            # NO PDF for first email (Safety)
-            message = create_message(sender_email, to_email, current_subject, body, None)
-            success, error_type = send_message(service, 'me', message)
-            
-            if success:
-                df.at[index, 'status'] = 'sent'
-                df.at[index, 'date_sent'] = datetime.now().strftime('%Y-%m-%d')
-                df.to_csv(EMAILS_FILE, index=False)  # Save immediately
-                total_sent += 1
-                hourly_count += 1
-                delay = random.uniform(MIN_DELAY_SECONDS, MAX_DELAY_SECONDS)
-                print(f"⏳ Waiting {delay:.1f} seconds...")
-                time.sleep(delay)
-            else:
-                total_failed += 1
-                if error_type in ['quota_exceeded', 'auth_error']:
-                    break
-        
-        # Save after new loop
-        df.to_csv(EMAILS_FILE, index=False)
-
-    elif mode == "followup":
-        # Run follow-up logic ONLY
-        if FOLLOW_UP_ENABLED:
-            total_sent = send_follow_ups(service, df) 
-            # Note: send_follow_ups needs to return count to update total_sent
-            # I will need to update send_follow_ups to be standalone or handle the counting
-        
-        # Save after followups
-        df.to_csv(EMAILS_FILE, index=False)
-
-    print("\n" + "=" * 60)
-    print("📊 Daily Summary")
-    print(f"✓ Total Activities: {total_sent}")
-    print("=" * 60)
+# Limiter state (token buckets, next send time) per sender, kept across restarts
+RATE_LIMIT_STATE_FILE = 'rate_limits.json'
+
+# --- Sender Pool ---
+# Extra sending mailboxes, each with its own token/credentials pair and
+# optionally its own limits, e.g.
+#   {'token': 'token_sales.json', 'credentials': 'credentials.json',
+#    'max_per_day': 20, 'max_per_hour': 5}
+# Limits default to max_emails_per_day / max_emails_per_hour. The day's rows
+# are split between the accounts, which send in parallel. Leave empty to send
+# from TOKEN_FILE only.
+SENDER_ACCOUNTS = []
+
+# --- Send Journal ---
+# Status changes are appended to emails.csv.journal instead of rewriting the
+# whole CSV after every send. The journal is folded back into the CSV at the
+# end of each run, or sooner once it grows past the threshold.
+JOURNAL_ENABLED = True
+JOURNAL_FSYNC = True  # fsync every record (safest; disable on slow disks)
+JOURNAL_COMPACT_THRESHOLD = 500  # Records before an early compaction
+
+# --- Contact Storage ---
+# 'csv': emails.csv + send journal (default)
+# 'stream': emails.csv + send journal, read in chunks instead of loaded whole
+#           (for lists with millions of rows)
+# 'sqlite': indexed SQLite ledger in LEDGER_DB_FILE, imported from emails.csv
+# on first use (see `python ledger.py import|export`)
+STORAGE_BACKEND = 'csv'
+LEDGER_DB_FILE = 'emails.db'
+
+# --- Message Preparation ---
+# Messages built ahead of their send time while the sender waits out its
+# spacing, so each send goes out as soon as the limiter allows it
+PREPARE_AHEAD = 3
 
 # --- PDF Attachment ---
 PDF_FILE = 'attachment.pdf'  # Name of the PDF file to attach (place in same folder)
 
-# --- Email Content ---
-# --- Email Templates (ROTATING TO PREVENT BLOCKING) ---
-import random
-
-# Default fallback (if rotation fails)
-SUBJECT = "QA Engineer - Exploring Opportunities"
-BODY_TEMPLATE = """Hi {name},
-
-I came across your profile and noticed you recruit for your company. I'm a QA Engineer with experience in manual and API testing.
-
-I'm currently exploring new opportunities and wanted to check if you have any QA positions that might be a good fit.
-
-Happy to share my resume if there's interest.
-
-Best regards,
-Yashwanth
-"""
-
-# List of templates to rotate through
-EMAIL_TEMPLATES = [
-    {
-        "subject": "QA / Software Testing Opportunity",
-        "body": """Dear Recruiter,
-
-I hope you are doing well.
-
-I am reaching out to explore Quality Assurance / Software Testing opportunities that match my experience. I have over 2 years of experience in manual testing, API testing, and QA processes across web and enterprise applications.
-
-I would be happy to share my resume for your review. Let me know if there are any suitable openings matching my profile.
-
-Thank you for your time.
-
-Best regards,
-Yashwanth L
-+91 8792350265
-yashwanthlakshmipathi3@gmail.com"""
-    },
-    {
-        "subject": "Application for Quality Assurance Engineer",
-        "body": """Dear Hiring Team,
-
-I am writing to apply for Quality Assurance / Software Testing roles. I have 2+ years of hands-on experience in functional, regression, exploratory, and UAT testing, along with API testing using Postman and Swagger.
-
-I have worked in Agile environments, validated backend data using SQL, and tracked defects using JIRA. I can share my resume if this aligns with your needs.
-
-Regards,
-Yashwanth L
-+91 8792350265
-yashwanthlakshmipathi3@gmail.com"""
-    },
-    {
-        "subject": "QA Engineer Profile",
-        "body": """Hi,
-
-I am writing to express my interest in QA / Software Testing openings. I have experience in manual testing, API testing, backend validation, and Agile QA processes.
-
-Please let me know if my profile suits any current or upcoming requirements. I am happy to provide my resume upon request.
-
-Thanks & regards,
-Yashwanth L
-+91 8792350265
-yashwanthlakshmipathi3@gmail.com"""
-    },
-    {
-        "subject": "Exploring QA / Testing Opportunities",
-        "body": """Hi {name},
-
-I hope you are doing well.
-
-I am reaching out to check if there are any Quality Assurance / Software Testing opportunities available. I have 2+ years of experience in manual testing, API testing, and defect tracking using JIRA in Agile environments.
-
-I'd be glad to share my resume for your reference if there is interest.
-
-Thank you,
-Yashwanth L
-+91 8792350265
-yashwanthlakshmipathi3@gmail.com"""
-    }
-]
-
-
-# --- Follow-Up Configuration ---
-FOLLOW_UP_DAYS = 3  # Send follow-up after 3 days
-FOLLOW_UP_ENABLED = True
-
-# Follow-up Templates (Rotated)
-FOLLOW_UP_TEMPLATES = [
-    {
-        "subject": "Re: QA Engineer – Exploring Opportunities", # Re: keeps thread context
-        "body": """Hi {name},
-
-I wanted to quickly follow up on my previous email.
-
-I’m very interested in exploring QA opportunities with your team. I’ve attached my resume for your review, which details my experience in manual and API testing.
-
-Please let me know if you have any questions or if there’s a good time to connect.
-
-Best regards,
-Yashwanth"""
-    },
-    {
-        "subject": "Re: QA Engineer | Open to New Roles",
-        "body": """Hi {name},
-
-Following up on my note from a few days ago.
-
-I’ve attached my resume to give you a better idea of my background in QA automation and manual testing. I'd love to see if my skills match any open roles you have.
-
-Looking forward to hearing from you.
-
-Thanks,
-Yashwanth"""
-    },
-    {
-        "subject": "Re: Checking on QA Opportunities",
-        "body": """Hi {name},
-
-I know you’re busy, so I’ll be brief.
-
-I’m attaching my resume here for your reference. I really believe my experience in API and manual testing could be valuable to your clients/company.
-
-Would love to chat if you have a moment.
+# --- Reply & Bounce Sync ---
+# Before each run, new inbox mail is checked for replies and bounces; those
+# contacts get follow_up_status 'replied'/'bounced' and no follow-up. Only
+# mail since the last run is read (its Gmail historyId is kept per sender).
+REPLY_SYNC_ENABLED = True
+MAILBOX_SYNC_STATE_FILE = 'mailbox_sync.json'
+REPLY_SYNC_BACKFILL_DAYS = 14  # Inbox searched on the first sync
+
+# --- Tracing ---
+# Time every phase of a run (ledger load, authentication, message building,
+# API calls, retries, pacing). The spans are written to TRACE_FILE as Chrome
+# trace JSON (chrome://tracing, ui.perfetto.dev) and summarized at the end.
+TRACING_ENABLED = False
+TRACE_FILE = 'campaign_trace.json'
+
+# --- Campaign State ---
+# Shared by the dashboard's workers, the campaign process and the autopilot:
+# whether a campaign runs (an OS file lock, CAMPAIGN_LOCK_FILE), its last
+# results and recent progress events (SQLite, CAMPAIGN_STATE_DB).
+CAMPAIGN_STATE_DB = 'campaign_state.db'
+CAMPAIGN_LOCK_FILE = 'campaign.lock'
+
+_config_store = None
+
+def get_config():
+    """The current campaign settings from CONFIG_FILE (cached until the file changes)."""
+    global _config_store
+    if _config_store is None or _config_store.path != CONFIG_FILE:
+        _config_store = ConfigStore(CONFIG_FILE)
+    return _config_store.get()
+
+def print_follow_up_forecast(ledger, today_str):
+    """Print the follow-ups coming up this week (overdue ones count under today)."""
+    forecast = ledger.follow_up_forecast(today_str, days=7)
+    print("📅 Follow-ups due:")
+    for day, due_count in forecast.items():
+        print(f"   • {datetime.strptime(day, '%Y-%m-%d').strftime('%a %d %b')}: {due_count}")
+
+async def send_follow_ups(account, queue, due_rows, config, clock=SYSTEM_CLOCK):
+    """Send follow-ups for `due_rows` from one sender account.
+
+    Each row is claimed in the send queue before its message goes out.
+    Returns (sent, failed).
+    """
+    sender_email = account.sender_email
+    tracing.set_lane(sender_email)
+    count = 0
+    failed = 0
+    templates = get_compiled_templates('followup', config)
+    with tracing.span('render_templates', rows=len(due_rows)):
+        rendered = render_batch(templates, due_rows)
+
+    # ATTACH RESUME FOR FOLLOW-UP
+    resume_path = PDF_FILE if os.path.exists(PDF_FILE) else None
+    if not resume_path:
+        print(f"⚠️ Resume file {PDF_FILE} not found. Skipping attachment.")
+
+    # Follow-up template was picked at random from the rotation above.
+    # We use the rotated "Re: ..." subjects for simplicity and safety.
+    pipeline = message_pipeline(account, zip(due_rows, rendered), resume_path, config, clock)
+    if config.batched_send_enabled:
+        async with pipeline:
+            count, failed, _ = await send_jobs_batched(account, queue, pipeline, 'followup', config, clock=clock)
+        return count, failed
+
+    # Only rows whose follow_up_due (date_sent + follow_up_days) has passed
+    async with pipeline:
+        # Wait for this account's limiter (daily budget shared with new emails)
+        while await pipeline.more() and await wait_for_send_slot(account, clock):
+            row, message, key = await pipeline.get()
+
+            # READY TO SEND FOLLOW-UP
+            to_email = row['email']
+            print(f"\nSending Follow-up to: {to_email} (Sent {row.get('date_sent')}) from {sender_email}")
+            count, failed, error = await send_one(account, queue, row, message, key, 'followup',
+                                                  count, failed, clock)
+            if error:
+                print(f"❌ Failed to send follow-up.")
+                
+    return count, failed
 
-Best,
-Yashwanth"""
-    }
-]
+def message_pipeline(account, rendered_rows, pdf_path, config, clock=SYSTEM_CLOCK):
+    """A MessagePipeline building (row, message, send_key) jobs for `rendered_rows`.
 
-def get_random_followup_template():
-    """Select a random follow-up template."""
-    template = random.choice(FOLLOW_UP_TEMPLATES)
-    return template["subject"], template["body"]
+    Each item is (row, (subject, body)). Up to PREPARE_AHEAD messages (a
+    whole batch when sending batched) are built while the account waits.
+    """
+    sender_email = account.sender_email
 
-def send_follow_ups(service, df):
-    """Check for emails that need a follow-up and send them."""
-    print("\n" + "=" * 60)
-    print("🔄 Checking for Follow-ups...")
-    print("=" * 60)
-    
-    count = 0
-    today = datetime.now()
-    
-    # Ensure date_sent column exists
-    if 'date_sent' not in df.columns:
-        df['date_sent'] = None
-    if 'follow_up_status' not in df.columns:
-        df['follow_up_status'] = 'pending'
-        
-    for index, row in df.iterrows():
-        # Check daily limit (shared with new emails)
-        if count >= MAX_EMAILS_PER_DAY:
-            print(f"Daily limit reached during follow-ups.")
-            break
+    def prepare(row, rendered):
+        subject, body = rendered
+        key = new_send_key(clock.now())
+        message = create_message(sender_email, row['email'], subject, body, pdf_path,
+                                 message_id=message_id_for(key, sender_email))
+        return row, message, key
 
-        # Criteria for follow-up:
-        # 1. Status is 'sent' (initial email sent)
-        # 2. Follow-up status is 'pending' (not yet followed up)
-        # 3. Date sent was > FOLLOW_UP_DAYS ago
-        
-        status = row.get('status', '')
-        f_status = row.get('follow_up_status', 'pending')
-        date_sent_str = str(row.get('date_sent', ''))
-        
-        if status == 'sent' and f_status == 'pending' and date_sent_str and date_sent_str != 'nan':
-            try:
-                date_sent = datetime.strptime(date_sent_str, '%Y-%m-%d').date()
-                days_diff = (today.date() - date_sent).days
-                
-                if days_diff >= FOLLOW_UP_DAYS:
-                    # READY TO SEND FOLLOW-UP
-                    to_email = row['email']
-                    name = row.get('name', 'there')
-                    
-                    print(f"\nSending Follow-up to: {to_email} (Sent {days_diff} days ago)")
-                    
-                    # Select random follow-up template
-                    f_subject, f_body_template = get_random_followup_template()
-                    
-                    # If original subject exists, maybe keep it? For now using new subject with Re:
-                    # Users often prefer 'Re: Original Subject' to thread it. 
-                    # But rotating subjects makes threading harder unless we saved original subject.
-                    # We will use the rotated "Re: ..." subjects for simplicity and safety.
-                    
-                    try:
-                        body = f_body_template.format(name=name)
-                    except:
-                        body = f_body_template.replace("{name}", name)
-                        
-                    # ATTACH RESUME FOR FOLLOW-UP
-                    resume_path = PDF_FILE
-                    if not os.path.exists(resume_path):
-                        print(f"⚠️ Resume file {resume_path} not found. Skipping attachment.")
-                        resume_path = None
-                    
-                    message = create_message(sender_email, to_email, f_subject, body, resume_path)
-                    success, error_type = send_message(service, 'me', message)
-                    
-                    if success:
-                        df.at[index, 'follow_up_status'] = 'sent'
-                        df.at[index, 'follow_up_date'] = today.strftime('%Y-%m-%d')
-                        df.to_csv(EMAILS_FILE, index=False)  # Save immediately
-                        count += 1
-                        
-                        # Random delay
-                        delay = random.uniform(MIN_DELAY_SECONDS, MAX_DELAY_SECONDS)
-                        print(f"⏳ Waiting {delay:.1f} seconds before next email...")
-                        time.sleep(delay)
-                    else:
-                        print(f"❌ Failed to send follow-up.")
-                        
-            except ValueError:
-                continue # Skip if date format error
-                
-    return count
+    ahead = max(PREPARE_AHEAD, config.batch_send_size) if config.batched_send_enabled else PREPARE_AHEAD
+    return MessagePipeline(rendered_rows, prepare, ahead)
 
-def get_random_template():
-    """Select a random template from the list."""
-    template = random.choice(EMAIL_TEMPLATES)
-    return template["subject"], template["body"]
+async def send_one(account, queue, row, message, key, kind, sent, failed, clock=SYSTEM_CLOCK):
+    """Claim `row`, send its prepared message and record the result.
 
-def is_in_allowed_time_window():
+    Returns the updated (sent, failed) counts and the send error, if any.
+    """
+    queue.claim(row, kind, key)
+    success, result = await call_blocking(send_message, account.service, 'me', message, clock=clock)
+    if success:
+        queue.commit(row, kind, clock.now().strftime('%Y-%m-%d'), thread_id=result.get('threadId'))
+        sent += 1
+        account.limiter.record(clock.now())
+        metrics.sent_total.inc(kind=kind)
+        emit('sent', kind=kind, email=row['email'], count=sent, account=account.sender_email)
+    else:
+        queue.release(row, kind)
+        failed += 1
+        emit('failed', kind=kind, email=row['email'], error=result, account=account.sender_email)
+    return sent, failed, None if success else result
+
+def open_ledger(config=None):
+    """Open the contact ledger for the configured storage backend."""
+    follow_up_days = (config or get_config()).follow_up_days
+    if STORAGE_BACKEND == 'sqlite':
+        ledger = SqliteLedger(LEDGER_DB_FILE, follow_up_days)
+        if ledger.is_empty() and os.path.exists(EMAILS_FILE):
+            print(f"📥 Importing {EMAILS_FILE} into {LEDGER_DB_FILE}...")
+            ledger.import_csv(EMAILS_FILE)
+        return ledger
+    if STORAGE_BACKEND == 'stream':
+        return StreamingCsvLedger(EMAILS_FILE, follow_up_days, fsync=JOURNAL_FSYNC,
+                                  compact_threshold=JOURNAL_COMPACT_THRESHOLD)
+    return CsvLedger(EMAILS_FILE, follow_up_days, journal=JOURNAL_ENABLED, fsync=JOURNAL_FSYNC,
+                     compact_threshold=JOURNAL_COMPACT_THRESHOLD)
+
+def contacts_exist():
+    """Whether there is a contact list to work from."""
+    if STORAGE_BACKEND == 'sqlite' and os.path.exists(LEDGER_DB_FILE):
+        return True
+    return os.path.exists(EMAILS_FILE)
+
+def get_compiled_templates(kind='new', config=None):
+    """Compiled email templates ('new') or follow-up templates ('followup')."""
+    config = config or get_config()
+    templates = config.email_templates if kind == 'new' else config.follow_up_templates
+    return compile_templates(templates, config.merge_field_defaults)
+
+def get_send_calendar(config=None):
+    """Sending windows from the configured days and time windows."""
+    config = config or get_config()
+    return SendCalendar(config.allowed_new_email_days, config.allowed_followup_days, config.time_windows)
+
+def is_in_allowed_time_window(clock=SYSTEM_CLOCK, config=None):
     """Check if current time is within allowed sending windows."""
-    current_time = datetime.now()
-    current_hour = current_time.hour
-    current_minute = current_time.minute
-    
-    for start_hour, start_min, end_hour, end_min in TIME_WINDOWS:
-        # Convert to minutes for easier comparison
-        current_total_min = current_hour * 60 + current_minute
-        start_total_min = start_hour * 60 + start_min
-        end_total_min = end_hour * 60 + end_min
-        
-        if start_total_min <= current_total_min <= end_total_min:
-            return True, f"{start_hour}:{start_min:02d} - {end_hour}:{end_min:02d}"
-    
-    return False, None
-
-def get_next_allowed_time():
-    """Get the next allowed sending time window."""
-    current_time = datetime.now()
-    current_hour = current_time.hour
-    current_minute = current_time.minute
-    current_total_min = current_hour * 60 + current_minute
-    
-    # Check today's remaining windows
-    for start_hour, start_min, end_hour, end_min in TIME_WINDOWS:
-        start_total_min = start_hour * 60 + start_min
-        if current_total_min < start_total_min:
-            return f"Today at {start_hour}:{start_min:02d}"
-    
-    # Otherwise, next allowed day
-    current_weekday = current_time.weekday()
-    if current_weekday in ALLOWED_WEEKDAYS:
-        # Check if there's a next allowed day this week
-        for day in ALLOWED_WEEKDAYS:
-            if day > current_weekday:
-                days_ahead = day - current_weekday
-                next_day = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"][day]
-                return f"{next_day} at {TIME_WINDOWS[0][0]}:{TIME_WINDOWS[0][1]:02d}"
-    
-    # Next week
-    next_allowed_day = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"][ALLOWED_WEEKDAYS[0]]
-    return f"Next {next_allowed_day} at {TIME_WINDOWS[0][0]}:{TIME_WINDOWS[0][1]:02d}"
-
-def authenticate_gmail():
-    """Shows basic usage of the Gmail API.
-    Lists the user's Gmail labels.
+    window = get_send_calendar(config).current(clock.now())
+    if window is None:
+        return False, None
+    return True, f"{window.start:%H:%M} - {window.end:%H:%M}"
+
+def get_next_allowed_time(clock=SYSTEM_CLOCK, config=None):
+    """When the next sending window opens, e.g. "Today at 12:30"."""
+    calendar = get_send_calendar(config)
+    window = calendar.next_opening(clock.now())
+    if window is None:
+        return "No sending days configured"
+    return calendar.describe(window, clock.now())
+
+def authenticate_gmail(interactive=True, token_file=None, credentials_file=None):
+    """Return an authenticated Gmail service.
+
+    The service and credentials are cached per process (see gmail_auth), so
+    only the first call loads token.json and builds the client; tokens are
+    refreshed in the background before they expire.
     """
-    creds = None
-    # The file token.json stores the user's access and refresh tokens, and is
-    # created automatically when the authorization flow completes for the first
-    # time.
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            if not os.path.exists(CREDENTIALS_FILE):
-                raise FileNotFoundError(f"Missing {CREDENTIALS_FILE}. Please download it from Google Cloud Console.")
-            
-            flow = InstalledAppFlow.from_client_secrets_file(
-                CREDENTIALS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        
-        # Save the credentials for the next run
-        with open(TOKEN_FILE, 'w') as token:
-            token.write(creds.to_json())
-
     try:
-        service = build('gmail', 'v1', credentials=creds)
-        return service
+        return gmail_auth.get_service(token_file or TOKEN_FILE, credentials_file or CREDENTIALS_FILE,
+                                      SCOPES, interactive=interactive)
     except HttpError as error:
         print(f'An error occurred: {error}')
         return None
 
-def create_message(sender, to, subject, message_text, pdf_path=None):
+@metrics.create_message_seconds.time()
+@tracing.traced('create_message')
+def create_message(sender, to, subject, message_text, pdf_path=None, message_id=None):
     """Create a message for an email with optional PDF attachment."""
-    # Create multipart message
-    message = MIMEMultipart()
+    # Create multipart message (a unique boundary saves scanning the content for one)
+    boundary = f"==============={uuid.uuid4().hex}=="
+    message = MIMEMultipart(boundary=boundary)
     message['to'] = to
     message['from'] = f"{SENDER_NAME} <{sender}>"
     message['subject'] = subject
+    if message_id:
+        message['Message-ID'] = message_id
     
     # Attach the email body
     message.attach(MIMEText(message_text, 'plain'))
+
+    buffer = BytesIO()
+    BytesGenerator(buffer, mangle_from_=False).flatten(message)
     
-    # Attach PDF if provided
+    # Attach PDF if provided: its encoded MIME part is built once and cached,
+    # then spliced in ahead of the closing boundary
     if pdf_path and os.path.exists(pdf_path):
-        with open(pdf_path, 'rb') as attachment:
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload(attachment.read())
-        
-        encoders.encode_base64(part)
-        part.add_header(
-            'Content-Disposition',
-            f'attachment; filename= {os.path.basename(pdf_path)}',
-        )
-        message.attach(part)
-    
-    return {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode()}
-
-def send_message(service, user_id, message, retry_count=0):
-    """Send an email message with retry logic and quota detection."""
+        part = get_attachment_bytes(pdf_path)
+        closing = f"--{boundary}--".encode('ascii')
+        head = buffer.getvalue()
+        cut = head.rindex(closing)
+        buffer = BytesIO()
+        buffer.write(head[:cut])
+        buffer.write(f"--{boundary}\n".encode('ascii'))
+        buffer.write(part)
+        buffer.write(b"\n")
+        buffer.write(head[cut:])
+    
+    return {'raw': base64.urlsafe_b64encode(buffer.getbuffer()).decode('ascii')}
+
+def classify_send_error(error):
+    """Map a Gmail API error to 'quota_exceeded', 'auth_error', 'retryable' or 'send_error'."""
+    error_details = str(error)
+    if '429' in error_details or 'quotaExceeded' in error_details or 'userRateLimitExceeded' in error_details:
+        return 'quota_exceeded'
+    if '401' in error_details or 'invalid_grant' in error_details:
+        return 'auth_error'
+    if '500' in error_details or '503' in error_details:
+        return 'retryable'
+    return 'send_error'
+
+@tracing.traced('send_message')
+def send_message(service, user_id, message, retry_count=0, clock=SYSTEM_CLOCK):
+    """Send an email message with retry logic and quota detection.
+
+    Returns (True, sent message resource) or (False, error type).
+    """
     try:
-        message = (service.users().messages().send(userId=user_id, body=message).execute())
-        print(f'✓ Message Id: {message["id"]} sent successfully.')
-        return True, None
+        with metrics.gmail_api_seconds.time(call='send'), tracing.span('gmail.send', attempt=retry_count + 1):
+            sent = (service.users().messages().send(userId=user_id, body=message).execute())
+        print(f'✓ Message Id: {sent["id"]} sent successfully.')
+        return True, sent
     except HttpError as error:
-        error_details = str(error)
+        error_type = classify_send_error(error)
         
         # Check for quota exceeded errors
-        if '429' in error_details or 'quotaExceeded' in error_details or 'userRateLimitExceeded' in error_details:
+        if error_type == 'quota_exceeded':
             print(f'⚠ QUOTA EXCEEDED: {error}')
             print(f'⏸ You have hit Gmail\'s rate limit. Waiting for extended period...')
+            metrics.send_errors_total.inc(error_type='quota_exceeded')
             return False, 'quota_exceeded'
         
         # Check for authentication errors
-        if '401' in error_details or 'invalid_grant' in error_details:
+        if error_type == 'auth_error':
             print(f'⚠ AUTHENTICATION ERROR: {error}')
+            metrics.send_errors_total.inc(error_type='auth_error')
             return False, 'auth_error'
         
         # Retry with exponential backoff for temporary errors
-        if retry_count < MAX_RETRIES and ('500' in error_details or '503' in error_details):
+        if retry_count < MAX_RETRIES and error_type == 'retryable':
             wait_time = EXPONENTIAL_BACKOFF_BASE ** retry_count
             print(f'⚠ Temporary error. Retrying in {wait_time} seconds... (Attempt {retry_count + 1}/{MAX_RETRIES})')
-            time.sleep(wait_time)
-            return send_message(service, user_id, message, retry_count + 1)
+            metrics.send_retries_total.inc()
+            metrics.wait_seconds.observe(wait_time, reason='retry_backoff')
+            with tracing.span('retry_backoff', seconds=wait_time):
+                clock.sleep(wait_time)
+            return send_message(service, user_id, message, retry_count + 1, clock=clock)
         
         print(f'✗ An error occurred: {error}')
+        metrics.send_errors_total.inc(error_type='send_error')
         return False, 'send_error'
 
-def run_campaign():
-    """Run the email campaign and return stats."""
+@tracing.traced('send_batch')
+def send_batch(service, user_id, messages, clock=SYSTEM_CLOCK):
+    """Send several messages in one batch HTTP request.
+
+    `messages` maps a key (e.g. a ledger row id) to a message built by
+    create_message(). Returns {key: (success, sent message or error_type)},
+    as send_message() does; items that fail with a temporary error are
+    re-submitted with exponential backoff.
+    """
+    results = {}
+    remaining = dict(messages)
+
+    for attempt in range(MAX_RETRIES + 1):
+        retry = {}
+
+        def callback(request_id, response, exception):
+            key = keys[request_id]
+            if exception is None:
+                print(f'✓ Message Id: {response["id"]} sent successfully.')
+                results[key] = (True, response)
+                return
+            error_type = classify_send_error(exception)
+            if error_type == 'retryable' and attempt < MAX_RETRIES:
+                retry[key] = remaining[key]
+                return
+            print(f'✗ Batch item failed ({error_type}): {exception}')
+            results[key] = (False, 'send_error' if error_type == 'retryable' else error_type)
+            metrics.send_errors_total.inc(error_type=results[key][1])
+
+        keys = {}
+        batch = service.new_batch_http_request(callback=callback)
+        for i, (key, message) in enumerate(remaining.items()):
+            keys[str(i)] = key
+            batch.add(service.users().messages().send(userId=user_id, body=message), request_id=str(i))
+        try:
+            with metrics.gmail_api_seconds.time(call='batch_send'), \
+                    tracing.span('gmail.batch_send', size=len(remaining), attempt=attempt + 1):
+                batch.execute()
+        except HttpError as error:
+            # The whole batch request was rejected; every item shares its fate
+            error_type = classify_send_error(error)
+            if error_type == 'retryable' and attempt < MAX_RETRIES:
+                retry = dict(remaining)
+            else:
+                print(f'✗ Batch request failed: {error}')
+                for key in remaining:
+                    results[key] = (False, 'send_error' if error_type == 'retryable' else error_type)
+                metrics.send_errors_total.inc(len(remaining), error_type=results[key][1])
+
+        if not retry:
+            break
+        wait_time = EXPONENTIAL_BACKOFF_BASE ** attempt
+        print(f'⚠ {len(retry)} temporary errors. Retrying in {wait_time} seconds... (Attempt {attempt + 1}/{MAX_RETRIES})')
+        metrics.send_retries_total.inc(len(retry))
+        metrics.wait_seconds.observe(wait_time, reason='retry_backoff')
+        with tracing.span('retry_backoff', seconds=wait_time):
+            clock.sleep(wait_time)
+        remaining = retry
+
+    return results
+
+async def send_jobs_batched(account, queue, pipeline, kind, config, clock=SYSTEM_CLOCK):
+    """Submit jobs from `pipeline` in batches while keeping the account's hourly limit.
+
+    Each job is (row, message, send_key), built while the previous batch
+    waits out its break. A batch's rows are claimed in the send queue
+    before it is submitted, and committed or released by result.
+    Returns (sent, failed, stop_error) where stop_error is set when a quota
+    or auth error ended the run early.
+    """
+    sent = 0
+    failed = 0
+
+    while await pipeline.more() and await wait_for_send_slot(account, clock):
+        size = min(config.batch_send_size, account.limiter.available(clock.now()))
+        chunk = await pipeline.take(size)
+        print(f"\n📦 Sending batch of {len(chunk)} {kind} emails from {account.sender_email}...")
+        for row, _, key in chunk:
+            queue.claim(row, kind, key)
+        results = await call_blocking(send_batch, account.service, 'me',
+                                      {row['row_id']: message for row, message, _ in chunk}, clock=clock)
+
+        stop_error = None
+        batch_sent = 0
+        date = clock.now().strftime('%Y-%m-%d')
+        for row, _, _ in chunk:
+            success, result = results.get(row['row_id'], (False, 'send_error'))
+            if success:
+                queue.commit(row, kind, date, thread_id=result.get('threadId'))
+                sent += 1
+                batch_sent += 1
+                metrics.sent_total.inc(kind=kind)
+                emit('sent', kind=kind, email=row['email'], count=sent, account=account.sender_email)
+            else:
+                queue.release(row, kind)
+                failed += 1
+                emit('failed', kind=kind, email=row['email'], error=result, account=account.sender_email)
+                if result in ['quota_exceeded', 'auth_error']:
+                    stop_error = result
+        # Only delivered messages use up the daily and hourly budget, as in
+        # send_one(); the batch still counts for spacing
+        account.limiter.record(clock.now(), batch_sent)
+
+        if stop_error:
+            return sent, failed, stop_error
+
+    return sent, failed, None
+
+async def send_new_emails(account, queue, rows, config, clock=SYSTEM_CLOCK):
+    """Send first-touch emails to `rows` from one sender account.
+
+    Keeps the account's own daily and hourly limits, and claims each row in
+    the send queue before its message goes out. Returns (sent, failed).
+    """
+    sender_email = account.sender_email
+    tracing.set_lane(sender_email)
+    templates = get_compiled_templates('new', config)
+    with tracing.span('render_templates', rows=len(rows)):
+        rendered = render_batch(templates, rows)
+
+    pipeline = message_pipeline(account, zip(rows, rendered), None, config, clock)
+    if config.batched_send_enabled:
+        async with pipeline:
+            sent, failed, _ = await send_jobs_batched(account, queue, pipeline, 'new', config, clock=clock)
+        return sent, failed
+
+    total_sent = 0
+    total_failed = 0
+
+    # The next messages are built while this waits for the send slot
+    async with pipeline:
+        while await pipeline.more() and await wait_for_send_slot(account, clock):
+            row, message, key = await pipeline.get()
+
+            print(f"\n[{total_sent + 1}] Sending to: {row['email']} from {sender_email}")
+            total_sent, total_failed, error = await send_one(account, queue, row, message, key, 'new',
+                                                             total_sent, total_failed, clock)
+            if error in ['quota_exceeded', 'auth_error']:
+                break
+
+    return total_sent, total_failed
+
+def build_rate_limiter(account, config, persist=True, rng=random):
+    """Daily and hourly send caps plus send spacing for one sender account.
+
+    State is kept in RATE_LIMIT_STATE_FILE under the sender's address, so a
+    restarted campaign does not get a fresh budget. With persist=False the
+    limiter starts fresh and saves nothing (the forecast uses this).
+    """
+    break_seconds = config.batch_break_minutes * 60
+    if config.batched_send_enabled:
+        # Whole batches are spaced by the batch break instead
+        spacing = JitteredSpacing('spacing', break_seconds, break_seconds, rng=rng)
+    else:
+        spacing = JitteredSpacing('spacing', config.min_delay_seconds, config.max_delay_seconds,
+                                  batch_size=config.batch_size, break_seconds=break_seconds, rng=rng)
+    return RateLimiter([DailyLimit('daily', account.max_per_day),
+                        SlidingWindowLimit('hourly', account.max_per_hour, 3600),
+                        spacing],
+                       state_file=RATE_LIMIT_STATE_FILE if persist else None, key=account.sender_email)
+
+async def wait_for_send_slot(account, clock=SYSTEM_CLOCK):
+    """Wait (without blocking the loop) until the account's limiter allows the next send.
+
+    Returns False instead of waiting when the daily budget is used up, or
+    when the next send would fall after the account's window closes.
+    """
+    metrics.record_budget(account, clock.now())
+    when, blocker = account.limiter.next_send(clock.now())
+    if when is None or blocker == 'daily':
+        print(f"\n⏸ Daily limit of {account.max_per_day} reached for {account.sender_email}.")
+        return False
+    if account.window_end is not None and when >= account.window_end:
+        print(f"\n⏸ Window closes at {account.window_end:%H:%M}; {account.sender_email} stops for now.")
+        return False
+    wait_time = (when - clock.now()).total_seconds()
+    if wait_time <= 0:
+        return True
+    if blocker == 'hourly':
+        print(f"\n⏸ Hourly limit reached. Waiting {wait_time:.0f}s...")
+        emit('hourly_limit', seconds=round(wait_time), account=account.sender_email)
+        reason = 'hourly_limit'
+    elif account.limiter.get('spacing').on_break:
+        print(f"⏸ Taking {wait_time / 60:.0f} min break...")
+        emit('batch_break', seconds=round(wait_time), account=account.sender_email)
+        reason = 'batch_break'
+    else:
+        print(f"⏳ Waiting {wait_time:.1f} seconds...")
+        emit('waiting', seconds=round(wait_time, 1), account=account.sender_email)
+        reason = 'spacing'
+    metrics.wait_seconds.observe(wait_time, reason=reason)
+    with tracing.span('wait', reason=reason):
+        await clock.sleep_async(wait_time)
+    return True
+
+def get_sender_accounts(transport=None, config=None):
+    """Sender accounts for this run.
+
+    `transport` may be a single transport or a list (one account each);
+    otherwise the accounts come from SENDER_ACCOUNTS, falling back to
+    TOKEN_FILE / CREDENTIALS_FILE.
+    """
+    config = config or get_config()
+    if transport is not None:
+        transports = transport if isinstance(transport, (list, tuple)) else [transport]
+        return [SenderAccount(f"account{i + 1}", t, config.max_emails_per_day, config.max_emails_per_hour)
+                for i, t in enumerate(transports)]
+
+    entries = SENDER_ACCOUNTS or [{'token': TOKEN_FILE, 'credentials': CREDENTIALS_FILE}]
+    accounts = []
+    for entry in entries:
+        name = os.path.splitext(os.path.basename(entry['token']))[0]
+        accounts.append(SenderAccount(name,
+                                      GmailTransport(entry['token'], entry.get('credentials', CREDENTIALS_FILE)),
+                                      entry.get('max_per_day', config.max_emails_per_day),
+                                      entry.get('max_per_hour', config.max_emails_per_hour)))
+    return accounts
+
+def run_campaign(transport=None, clock=SYSTEM_CLOCK, config=None):
+    """Run the email campaign to completion and return stats.
+
+    Synchronous wrapper around run_campaign_async() on the shared engine.
+    """
+    return engine.run(run_campaign_async(transport, clock, config))
+
+async def run_campaign_async(transport=None, clock=SYSTEM_CLOCK, config=None):
+    """Run the email campaign and return stats.
+
+    `transport` supplies the Gmail service (the real API by default) and
+    `clock` supplies now()/sleep_async(), so the loop can run against a fake
+    service on simulated time (see transport.simulate_campaign). `config`
+    defaults to the current CONFIG_FILE settings, taken once so edits made
+    while the campaign runs do not change it halfway.
+
+    With several sender accounts the day's rows are split between them and
+    the accounts send their shares concurrently; per-account results are in
+    stats["accounts"]. With TRACING_ENABLED each phase is timed and the
+    trace written to TRACE_FILE.
+    """
+    if not TRACING_ENABLED:
+        return await _run_campaign_async(transport, clock, config)
+    tracer = tracing.start(clock)
+    try:
+        with tracer.span('run_campaign', lane='campaign'):
+            return await _run_campaign_async(transport, clock, config)
+    finally:
+        tracing.stop()
+        tracer.print_summary()
+        tracer.export(TRACE_FILE)
+        print(f"🧭 Trace written to {TRACE_FILE} (open it in chrome://tracing or ui.perfetto.dev)")
+
+async def _run_campaign_async(transport, clock, config):
+    tracing.set_lane('campaign')
     stats = {
         "sent_new": 0,
         "sent_followup": 0,
         "failed": 0,
+        "replied": 0,
+        "bounced": 0,
         "mode": "none",
-        "message": ""
+        "message": "",
+        "accounts": {}
     }
 
     print("\n" + "=" * 60)
     print("🚀 Gmail Bulk Email Sender with Anti-Blocking Protection")
     print("=" * 60)
+
+    if config is None:
+        try:
+            config = get_config()
+        except ConfigError as e:
+            print(f"❌ Config error: {e}")
+            stats["message"] = f"Config error: {e}"
+            return stats
     
     # 1. Load Data
-    if not os.path.exists(EMAILS_FILE):
+    if not contacts_exist():
         print(f"❌ Error: {EMAILS_FILE} not found.")
         stats["message"] = f"Error: {EMAILS_FILE} not found."
         return stats
     
-    df = pd.read_csv(EMAILS_FILE)
-    
-    # Normalize headers to support "Name", "Email", "Status", "Follow Up Status"
-    df.columns = [c.strip().lower().replace(' ', '_').replace('-', '_') for c in df.columns]
-
-    if 'status' not in df.columns:
-        df['status'] = 'pending'
-    if 'date_sent' not in df.columns:
-        df['date_sent'] = None
-    df['date_sent'] = df['date_sent'].astype(object)
-
-    if 'follow_up_status' not in df.columns:
-        df['follow_up_status'] = 'pending'
-
-    if 'follow_up_date' not in df.columns:
-        df['follow_up_date'] = None
-    df['follow_up_date'] = df['follow_up_date'].astype(object)
-    
-    pending_emails = df[df['status'] == 'pending']
+    # Loading and saving the ledger are file-bound, so they go to the executor too
+    with metrics.ledger_seconds.time(operation='open'), tracing.span('load_ledger'):
+        ledger = await call_blocking(open_ledger, config)
     
+    try:
+        return await _send_from_ledger(ledger, stats, transport, clock, config)
+    finally:
+        # Early returns (weekend, template error, window closed) close it too:
+        # SQLite's connection is released and CSV journals are folded in
+        with metrics.ledger_seconds.time(operation='close'), tracing.span('save_ledger'):
+            await call_blocking(ledger.close)
+
+async def _send_from_ledger(ledger, stats, transport, clock, config):
+    """The rest of a run once the ledger is open (the caller closes it)."""
     # Check for PDF
     pdf_path = PDF_FILE if os.path.exists(PDF_FILE) else None
     if pdf_path:
@@ -623,29 +654,54 @@ def run_campaign():
     else:
         print("ℹ️  No PDF attachment found (sending plain text only).")
     
-    # 2. Authenticate
+    # 2. Authenticate every sender account up front (the OAuth flow is interactive)
     print("\n🔐 Authenticating with Gmail...")
-    service = authenticate_gmail()
-    if not service:
+    accounts = []
+    for account in get_sender_accounts(transport, config):
+        try:
+            connected = await call_blocking(account.connect)
+        except Exception as e:
+            print(f"❌ {account.name}: {e}")
+            connected = False
+        if connected:
+            account.limiter = build_rate_limiter(account, config)
+            account.budget = account.limiter.get('daily').available(clock.now())
+            metrics.record_budget(account, clock.now())
+            print(f"✓ Authenticated as: {account.sender_email} ({account.budget} sends left today)")
+            accounts.append(account)
+        else:
+            print(f"❌ Authentication failed for {account.name}.")
+    if not accounts:
         print("❌ Authentication failed.")
         stats["message"] = "Authentication failed."
         return stats
-    
-    # Get user profile
-    profile = service.users().getProfile(userId='me').execute()
-    sender_email = profile['emailAddress']
-    print(f"✓ Authenticated as: {sender_email}")
+
+    # Settle sends an interrupted run left in flight (checks only those rows)
+    queue = SendQueue(ledger, config.follow_up_days)
+    with tracing.span('reconcile'):
+        recovered, requeued = await call_blocking(queue.reconcile, accounts)
+    if recovered or requeued:
+        print(f"🔁 Recovered {recovered} interrupted sends, re-queued {requeued}.")
+
+    # Stop following up with contacts who replied or bounced since the last run
+    if REPLY_SYNC_ENABLED:
+        print("\n📬 Checking for replies and bounces...")
+        mailbox_sync = MailboxSync(ledger, MAILBOX_SYNC_STATE_FILE, REPLY_SYNC_BACKFILL_DAYS)
+        with tracing.span('mailbox_sync'):
+            replied, bounced = await call_blocking(mailbox_sync.sync, accounts, clock.now())
+        stats["replied"], stats["bounced"] = replied, bounced
+        print(f"✓ {replied} replies, {bounced} bounces")
+        if replied or bounced:
+            emit('mailbox_synced', replied=replied, bounced=bounced)
 
     # 3. Determine Mode
-    current_time = datetime.now()
-    current_weekday = current_time.weekday()
+    calendar = get_send_calendar(config)
+    current_time = clock.now()
     
-    mode = "none"
-    if current_weekday in ALLOWED_NEW_EMAIL_DAYS:
-        mode = "new"
+    mode = calendar.day_kind(current_time.weekday()) or "none"
+    if mode == "new":
         print("✅ Mode: Sending NEW EMAILS today")
-    elif current_weekday in ALLOWED_FOLLOWUP_DAYS:
-        mode = "followup"
+    elif mode == "followup":
         print("\n✅ Mode: Sending FOLLOW-UPS today")
     else:
         print("\n⏸ No sending allowed today (Weekend).")
@@ -654,86 +710,84 @@ def run_campaign():
         
     stats["mode"] = mode
 
+    # Templates are compiled once and checked against the list's columns
+    try:
+        with tracing.span('compile_templates'):
+            templates = get_compiled_templates(mode, config)
+            validate_templates(templates, ledger.columns())
+    except TemplateError as e:
+        print(f"❌ Template error: {e}")
+        stats["message"] = f"Template error: {e}"
+        return stats
+
     # 4. Check Time Window
-    in_window, window_time = is_in_allowed_time_window()
-    if not in_window:
+    window = calendar.current(current_time)
+    if window is None:
         print(f"\n⏸ Outside allowed time windows.")
-        msg = f"Outside allowed time ({current_time.strftime('%I:%M %p')}). Next: {get_next_allowed_time()}"
+        msg = f"Outside allowed time ({current_time.strftime('%I:%M %p')}). Next: {get_next_allowed_time(clock, config)}"
         print(msg)
         stats["message"] = msg
+        emit('window_closed', message=msg)
         return stats
 
+    # Spread what is left of each account's daily cap after today's sends
+    # over the remaining windows, and stop at the end of this one
+    for account in accounts:
+        left_today = max(account.max_per_day - account.limiter.get('daily').sent_on(current_time), 0)
+        account.budget = calendar.share(left_today, window)
+        account.window_end = window.end
+    print(f"🕘 Window {window.start:%H:%M} - {window.end:%H:%M}: up to "
+          f"{sum(account.budget for account in accounts)} sends")
+
     # 5. Execute
-    total_sent = 0
-    total_failed = 0
-    hour_start_time = datetime.now()
-    hourly_count = 0
+    emit('campaign_started', mode=mode, sender=accounts[0].sender_email,
+         senders=[account.sender_email for account in accounts])
+    budget = sum(account.budget for account in accounts)
 
     if mode == "new":
-        print("\n📧 Starting NEW Email Loop...")
-        for index, row in pending_emails.iterrows():
-            if total_sent >= MAX_EMAILS_PER_DAY:
-                print(f"\n⏸ Daily limit of {MAX_EMAILS_PER_DAY} reached.")
-                stats["message"] = "Daily limit reached."
-                break
-            
-            if hourly_count >= MAX_EMAILS_PER_HOUR:
-                wait_time = 3600 - (datetime.now() - hour_start_time).seconds
-                if wait_time > 0:
-                    print(f"\n⏸ Hourly limit reached. Waiting {wait_time}s...")
-                    time.sleep(wait_time)
-                hourly_count = 0
-                hour_start_time = datetime.now()
-
-            # Batch break
-            if total_sent > 0 and total_sent % BATCH_SIZE == 0:
-                print(f"⏸ Taking {BATCH_BREAK_MINUTES} min break...")
-                time.sleep(BATCH_BREAK_MINUTES * 60)
-
-            to_email = row['email']
-            name = row.get('name', 'there')
-            print(f"\n[{total_sent + 1}] Sending to: {to_email}")
-            
-            current_subject, current_body_template = get_random_template()
-            try:
-                body = current_body_template.format(name=name)
-            except:
-                body = current_body_template.replace("{name}", name)
-            
-            message = create_message(sender_email, to_email, current_subject, body, None)
-            success, error_type = send_message(service, 'me', message)
-            
-            if success:
-                df.at[index, 'status'] = 'sent'
-                df.at[index, 'date_sent'] = datetime.now().strftime('%Y-%m-%d')
-                df.to_csv(EMAILS_FILE, index=False)  # Save immediately
-                total_sent += 1
-                hourly_count += 1
-                delay = random.uniform(MIN_DELAY_SECONDS, MAX_DELAY_SECONDS)
-                print(f"⏳ Waiting {delay:.1f} seconds...")
-                time.sleep(delay)
-            else:
-                total_failed += 1
-                if error_type in ['quota_exceeded', 'auth_error']:
-                    break
-        
-        # Save
-        df.to_csv(EMAILS_FILE, index=False)
-        stats["sent_new"] = total_sent
-        stats["failed"] = total_failed
-
-    elif mode == "followup":
-        if FOLLOW_UP_ENABLED:
-            follow_up_count = send_follow_ups(service, df) 
-            stats["sent_followup"] = follow_up_count
-        
-        # Save
-        df.to_csv(EMAILS_FILE, index=False)
+        print(f"\n📧 Starting NEW Email Loop{' (batched)' if config.batched_send_enabled else ''}...")
+        with tracing.span('select_rows'):
+            rows = ledger.pending(budget)
+        metrics.queue_depth.set(len(rows), kind='new')
+        with tracing.span('send', rows=len(rows)):
+            results = await run_accounts(accounts, rows,
+                                         lambda account, share: send_new_emails(account, queue, share, config, clock=clock))
+    elif mode == "followup" and config.follow_up_enabled:
+        print("\n" + "=" * 60)
+        print("🔄 Checking for Follow-ups...")
+        print("=" * 60)
+        today_str = clock.now().strftime('%Y-%m-%d')
+        print_follow_up_forecast(ledger, today_str)
+        with tracing.span('select_rows'):
+            rows = ledger.due_follow_ups(today_str, limit=budget)
+        metrics.queue_depth.set(len(rows), kind='followup')
+        with tracing.span('send', rows=len(rows)):
+            results = await run_accounts(accounts, rows,
+                                         lambda account, share: send_follow_ups(account, queue, share, config, clock=clock))
+    else:
+        results = []
+
+    sent_key = "sent_new" if mode == "new" else "sent_followup"
+    for account, result in zip(accounts, results):
+        sent, failed = result if isinstance(result, tuple) else (0, 0)
+        stats["accounts"][account.sender_email] = {"sent": sent, "failed": failed}
+        stats[sent_key] += sent
+        stats["failed"] += failed
+    if mode == "new" and stats["sent_new"] >= budget:
+        stats["message"] = f"Window budget reached. Next: {get_next_allowed_time(clock, config)}"
+
+    # Rows this window did not reach stay pending for the next one
+    metrics.queue_depth.set(0, kind=mode)
+    for account in accounts:
+        metrics.record_budget(account, clock.now())
 
     print("\n" + "=" * 60)
     print("📊 Daily Summary")
     print(f"✓ New Emails: {stats['sent_new']}")
     print(f"✓ Follow-ups: {stats['sent_followup']}")
+    if len(accounts) > 1:
+        for sender, account_stats in stats["accounts"].items():
+            print(f"   • {sender}: {account_stats['sent']} sent, {account_stats['failed']} failed")
     print("=" * 60)
     
     return stats
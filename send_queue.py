@@ -0,0 +1,122 @@
+import uuid
+from datetime import datetime, timedelta
+from googleapiclient.errors import HttpError
+from ledger import DATE_FORMAT, follow_up_due_date
+import metrics
+import tracing
+
+IN_FLIGHT = 'in_flight'
+# Ledger column that tracks each kind of send
+STATUS_FIELDS = {'new': 'status', 'followup': 'follow_up_status'}
+
+
+def new_send_key(now):
+    """A unique idempotency key for one send attempt, prefixed with its date."""
+    return f"{now:%Y%m%d}.{uuid.uuid4().hex}"
+
+
+def key_date(key):
+    """The YYYY-MM-DD date a send key was issued on."""
+    return datetime.strptime(key.split('.', 1)[0], '%Y%m%d').strftime(DATE_FORMAT)
+
+
+def message_id_for(key, sender_email):
+    """The Message-ID header that ties a sent message back to its send key."""
+    return f"<{key}@{sender_email.rsplit('@', 1)[-1]}>"
+
+
+def find_sent(service, sender_email, key, to_email, kind='new'):
+    """The sent message ({'id', 'threadId'}) for send key `key`, or None.
+
+    Looks the message up by its Message-ID first. For a first email, if
+    Gmail replaced the header, it falls back to anything sent to the same
+    address since the key was issued (erring towards not sending twice).
+    A follow-up is matched by Message-ID only: by date it could match the
+    first email to the same contact.
+    """
+    queries = [f"rfc822msgid:{message_id_for(key, sender_email).strip('<>')}"]
+    if kind == 'new':
+        since = (datetime.strptime(key_date(key), DATE_FORMAT) - timedelta(days=1)).strftime('%Y/%m/%d')
+        queries.append(f"in:sent to:{to_email} after:{since}")
+    for query in queries:
+        result = service.users().messages().list(userId='me', q=query, maxResults=1).execute()
+        if result.get('messages'):
+            return result['messages'][0]
+    return None
+
+
+class SendQueue:
+    """Claims ledger rows before they are sent and commits them afterwards.
+
+    claim() marks a row in_flight with its send key (also the message's
+    Message-ID, see new_send_key) and persists it before anything goes out; commit()
+    records the send. A crash in between leaves the row in_flight, and
+    reconcile() settles it on the next start by checking the Sent folder,
+    instead of emailing the contact again.
+    """
+
+    def __init__(self, ledger, follow_up_days):
+        self.ledger = ledger
+        self.follow_up_days = follow_up_days
+
+    def claim(self, row, kind, key):
+        """Mark a row in_flight under `key`, just before its message is sent."""
+        metrics.queue_depth.dec(kind=kind)
+        with metrics.ledger_seconds.time(operation='claim'), tracing.span('ledger.claim'):
+            self.ledger.update(row['row_id'], **{STATUS_FIELDS[kind]: IN_FLIGHT, 'send_key': key})
+
+    def commit(self, row, kind, date, thread_id=None):
+        """Mark a claimed row as sent on `date` (YYYY-MM-DD).
+
+        The first email's Gmail thread is kept so replies can be matched to it.
+        """
+        with metrics.ledger_seconds.time(operation='commit'), tracing.span('ledger.commit'):
+            if kind == 'new':
+                self.ledger.update(row['row_id'], status='sent', date_sent=date,
+                                   follow_up_due=follow_up_due_date(date, self.follow_up_days), thread_id=thread_id)
+            else:
+                self.ledger.update(row['row_id'], follow_up_status='sent', follow_up_date=date)
+
+    def release(self, row, kind):
+        """Put a claimed row back in the queue after a failed send."""
+        fields = {STATUS_FIELDS[kind]: 'pending'}
+        if kind == 'followup' and row.get('follow_up_due'):
+            # Back into the follow-up due index
+            fields['follow_up_due'] = row['follow_up_due']
+        with metrics.ledger_seconds.time(operation='release'), tracing.span('ledger.release'):
+            self.ledger.update(row['row_id'], **fields)
+
+    def reconcile(self, accounts):
+        """Settle rows left in_flight by an interrupted run.
+
+        Only the in-flight rows are checked, against the Sent folder of every
+        connected sender account. Returns (recovered, requeued).
+        """
+        recovered = requeued = 0
+        for row in self.ledger.in_flight():
+            kind = 'new' if row['status'] == IN_FLIGHT else 'followup'
+            key = row.get('send_key')
+            sent = None
+            unknown = False
+            if key:
+                for account in accounts:
+                    try:
+                        sent = find_sent(account.service, account.sender_email, key, row['email'], kind)
+                    except HttpError as error:
+                        print(f"⚠ Could not check Sent folder for {row['email']}: {error}")
+                        unknown = True
+                        break
+                    if sent:
+                        break
+            if unknown:
+                # Leave it in flight for the next run
+                continue
+            if sent:
+                self.commit(row, kind, key_date(key), thread_id=sent.get('threadId'))
+                recovered += 1
+                print(f"✓ {row['email']} was already sent before the interruption.")
+            else:
+                self.release(row, kind)
+                requeued += 1
+                print(f"↩ {row['email']} was not sent; back in the queue.")
+        return recovered, requeued
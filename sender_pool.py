@@ -0,0 +1,58 @@
+import asyncio
+import gmail_auth
+import metrics
+import tracing
+
+
+class SenderAccount:
+    """One sending mailbox: its transport plus its own daily and hourly budget."""
+
+    def __init__(self, name, transport, max_per_day, max_per_hour):
+        self.name = name
+        self.transport = transport
+        self.max_per_day = max_per_day
+        self.max_per_hour = max_per_hour
+        self.service = None
+        self.sender_email = None
+        self.limiter = None
+        # Rows this account can take this run (its share in partition())
+        self.budget = max_per_day
+        # Sends stop when the next one would fall after this time
+        self.window_end = None
+
+    def connect(self):
+        """Authenticate and look up the sender address; False if it failed."""
+        with metrics.auth_seconds.time():
+            with tracing.span('authenticate', account=self.name):
+                self.service = self.transport.connect()
+            if not self.service:
+                return False
+            with tracing.span('get_profile', account=self.name):
+                self.sender_email = gmail_auth.get_sender_profile(self.service)['emailAddress']
+        return True
+
+
+def partition(rows, accounts):
+    """Split rows into consecutive, non-overlapping slices sized by each account's budget."""
+    slices = []
+    start = 0
+    for account in accounts:
+        slices.append(rows[start:start + account.budget])
+        start += account.budget
+    return slices
+
+
+async def run_accounts(accounts, rows, work):
+    """Await work(account, rows) for every account concurrently.
+
+    Each row goes to exactly one account. Returns the results in account
+    order; an exception in one account is returned in place of its result
+    rather than stopping the others.
+    """
+    slices = partition(rows, accounts)
+    results = await asyncio.gather(*(work(account, share) for account, share in zip(accounts, slices)),
+                                   return_exceptions=True)
+    for account, result in zip(accounts, results):
+        if isinstance(result, Exception):
+            print(f"❌ Sender {account.sender_email} stopped: {result}")
+    return results
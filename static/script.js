@@ -4,10 +4,104 @@ document.addEventListener('DOMContentLoaded', function () {
     loadTemplates();
     setupFileUploads();
 
-    // Start polling if page refresh happened during run
-    setInterval(loadStatus, 5000); // Poll every 5s generally
+    // Live updates over Server-Sent Events; polling is only a fallback
+    connectEvents();
 });
 
+let pollTimer = null;
+let liveStatusText = '';
+let countdownTimer = null;
+
+function startPolling() {
+    if (!pollTimer) {
+        pollTimer = setInterval(loadStatus, 5000); // Poll every 5s while the stream is down
+    }
+}
+
+function stopPolling() {
+    if (pollTimer) {
+        clearInterval(pollTimer);
+        pollTimer = null;
+    }
+}
+
+// Subscribe to campaign progress pushed by /api/events
+function connectEvents() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+
+    const source = new EventSource('/api/events');
+
+    source.addEventListener('snapshot', function (e) {
+        const data = JSON.parse(e.data);
+        stopPolling();
+        updateModeBadge(data.mode);
+        renderStatus(data.status);
+    });
+
+    ['campaign_started', 'sent', 'failed', 'waiting', 'hourly_limit',
+        'batch_break', 'window_closed', 'campaign_finished'].forEach(type => {
+        source.addEventListener(type, e => showCampaignEvent(JSON.parse(e.data)));
+    });
+
+    // EventSource reconnects on its own; keep the dashboard fresh meanwhile
+    source.onerror = startPolling;
+}
+
+function showCampaignEvent(event) {
+    clearInterval(countdownTimer);
+
+    switch (event.type) {
+        case 'campaign_started':
+            liveStatusText = `Campaign started (${event.mode === 'new' ? 'new emails' : 'follow-ups'}).`;
+            break;
+        case 'sent':
+            liveStatusText = `✓ Sent ${event.kind === 'followup' ? 'follow-up' : 'email'} #${event.count} to ${event.email}`;
+            break;
+        case 'failed':
+            liveStatusText = `✗ Failed to send to ${event.email} (${event.error})`;
+            break;
+        case 'waiting':
+            startCountdown('⏳ Next email in', event.seconds);
+            return;
+        case 'hourly_limit':
+            startCountdown('⏸ Hourly limit reached. Resuming in', event.seconds);
+            return;
+        case 'batch_break':
+            startCountdown('⏸ Batch break. Resuming in', event.seconds);
+            return;
+        case 'window_closed':
+            liveStatusText = '';
+            setStatusText(event.message, '#64748b');
+            return;
+        case 'campaign_finished':
+            liveStatusText = '';
+            setStatusText((event.stats && event.stats.message) || 'Last Run Complete. Ready for next batch.', '#64748b');
+            return;
+    }
+    setStatusText(liveStatusText, '#059669');
+}
+
+function startCountdown(label, seconds) {
+    const endsAt = Date.now() + seconds * 1000;
+    const tick = () => {
+        const left = Math.max(0, Math.round((endsAt - Date.now()) / 1000));
+        liveStatusText = `${label} ${Math.floor(left / 60)}m ${left % 60}s`;
+        setStatusText(liveStatusText, '#059669');
+        if (left === 0) clearInterval(countdownTimer);
+    };
+    tick();
+    countdownTimer = setInterval(tick, 1000);
+}
+
+function setStatusText(text, color) {
+    const statusText = document.getElementById('campaignStatusText');
+    statusText.textContent = text;
+    statusText.style.color = color;
+}
+
 // Setup file upload handlers
 function setupFileUploads() {
     document.getElementById('csvFile').addEventListener('change', function (e) {
@@ -83,50 +177,51 @@ async function loadStatus() {
 
         // 2. Get Stats
         const statusRes = await fetch('/api/status');
-        const data = await statusRes.json();
-
-        document.getElementById('sentEmails').textContent = data.sent;
-        document.getElementById('sentFollowups').textContent = data.sent_followups;
-        document.getElementById('pendingEmails').textContent = data.pending;
-        document.getElementById('failedEmails').textContent = data.failed;
-
-        // Update indicators
-        updateIndicator('pdfStatus', data.has_pdf, '✓ Attached', 'Missing');
-        updateIndicator('credentialsStatus', data.has_credentials, '✓ Ready', 'Missing');
-        updateIndicator('tokenStatus', data.has_token, '✓ Uploaded', 'Missing (Local Auth Required)');
-
-        // Handle Running State
-        const sendButton = document.getElementById('sendButton');
-        const progressContainer = document.getElementById('progressContainer');
-        const statusText = document.getElementById('campaignStatusText');
-
-        if (data.is_running) {
-            sendButton.disabled = true;
-            sendButton.textContent = 'Running...';
-            progressContainer.style.display = 'block';
-            statusText.textContent = "Campaign is actively sending emails...";
-            statusText.style.color = "#059669";
-        } else {
-            sendButton.disabled = false;
-            sendButton.innerHTML = `
-                <svg width="24" height="24" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
-                    <line x1="22" y1="2" x2="11" y2="13"/>
-                    <polygon points="22 2 15 22 11 13 2 9 22 2"/>
-                </svg>
-                Start Campaign
-            `;
-            progressContainer.style.display = 'none';
-            if (statusText.textContent.includes("Running")) {
-                statusText.textContent = "Last Run Complete. Ready for next batch.";
-                statusText.style.color = "#64748b";
-            }
-        }
-
+        renderStatus(await statusRes.json());
     } catch (error) {
         console.error('Error loading status:', error);
     }
 }
 
+function renderStatus(data) {
+    document.getElementById('sentEmails').textContent = data.sent;
+    document.getElementById('sentFollowups').textContent = data.sent_followups;
+    document.getElementById('pendingEmails').textContent = data.pending;
+    document.getElementById('failedEmails').textContent = data.failed;
+
+    // Update indicators
+    updateIndicator('pdfStatus', data.has_pdf, '✓ Attached', 'Missing');
+    updateIndicator('credentialsStatus', data.has_credentials, '✓ Ready', 'Missing');
+    updateIndicator('tokenStatus', data.has_token, '✓ Uploaded', 'Missing (Local Auth Required)');
+
+    // Handle Running State
+    const sendButton = document.getElementById('sendButton');
+    const progressContainer = document.getElementById('progressContainer');
+    const statusText = document.getElementById('campaignStatusText');
+
+    if (data.is_running) {
+        sendButton.disabled = true;
+        sendButton.textContent = 'Running...';
+        progressContainer.style.display = 'block';
+        statusText.textContent = liveStatusText || "Campaign is actively sending emails...";
+        statusText.style.color = "#059669";
+    } else {
+        sendButton.disabled = false;
+        sendButton.innerHTML = `
+            <svg width="24" height="24" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
+                <line x1="22" y1="2" x2="11" y2="13"/>
+                <polygon points="22 2 15 22 11 13 2 9 22 2"/>
+            </svg>
+            Start Campaign
+        `;
+        progressContainer.style.display = 'none';
+        if (statusText.textContent.includes("Running")) {
+            statusText.textContent = "Last Run Complete. Ready for next batch.";
+            statusText.style.color = "#64748b";
+        }
+    }
+}
+
 function updateModeBadge(data) {
     const badge = document.getElementById('modeDisplay');
     const icon = document.getElementById('modeIcon');
@@ -147,6 +242,14 @@ function updateModeBadge(data) {
         icon.textContent = '⏸';
         text.textContent = `Weekly Rest (${data.day})`;
     }
+
+    if (data.mode === 'new' || data.mode === 'followup') {
+        if (data.window) {
+            text.textContent += ` · until ${data.window.end.slice(11, 16)}`;
+        } else if (data.next_window) {
+            text.textContent += ` · next: ${data.next_window}`;
+        }
+    }
 }
 
 function updateIndicator(elementId, isActive, activeText, inactiveText) {
@@ -174,7 +277,8 @@ async function uploadFile(file, endpoint, type) {
         });
 
         if (response.ok) {
-            showNotification(`${type} uploaded successfully!`, 'success');
+            const data = await response.json();
+            showNotification(data.message || `${type} uploaded successfully!`, 'success');
             loadStatus();
         } else {
             const data = await response.json();
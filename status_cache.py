@@ -0,0 +1,116 @@
+import os
+import pandas as pd
+from journal import SendJournal, journal_path_for
+from ledger import normalize_column
+
+COUNTER_NAMES = ('total', 'pending', 'sent', 'failed', 'sent_followups', 'replied', 'bounced')
+STATUS_COLUMNS = ('status', 'follow_up_status')
+
+
+def file_key(path):
+    """(mtime, size) of a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class CsvStatusCache:
+    """Dashboard counters for emails.csv, kept up to date from the send journal.
+
+    The base CSV is parsed only when its (mtime, size) changes, i.e. after an
+    upload or a journal compaction. Sends in between are picked up by reading
+    just the journal records appended since the last call, so an unchanged
+    ledger costs two stat() calls per request.
+    """
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.journal = SendJournal(journal_path_for(csv_path))
+        self._csv_key = None
+        self._journal_offset = 0
+        self._status = []
+        self._follow_up_status = []
+        self.counts = dict.fromkeys(COUNTER_NAMES, 0)
+
+    def _load_base(self, csv_key):
+        status, follow_up_status = [], []
+        if csv_key is not None:
+            # Always keep the first column so rows are counted even when the
+            # list has no status columns yet
+            df = pd.read_csv(self.csv_path, usecols=lambda c: normalize_column(c) in STATUS_COLUMNS)
+            first = pd.read_csv(self.csv_path, usecols=[0]) if df.columns.empty else df
+            df.columns = [normalize_column(c) for c in df.columns]
+            status = df['status'].tolist() if 'status' in df.columns else ['pending'] * len(first)
+            follow_up_status = (df['follow_up_status'].tolist() if 'follow_up_status' in df.columns
+                                else ['pending'] * len(first))
+
+        self._status = status
+        self._follow_up_status = follow_up_status
+        self.counts = dict.fromkeys(COUNTER_NAMES, 0)
+        self.counts['total'] = len(status)
+        for value in status:
+            self._count(value, 1)
+        for value in follow_up_status:
+            self._count_follow_up(value, 1)
+
+        self._csv_key = csv_key
+        self._journal_offset = 0
+
+    def _count(self, status, delta):
+        if status in ('pending', 'sent', 'failed'):
+            self.counts[status] += delta
+
+    def _count_follow_up(self, status, delta):
+        if status == 'sent':
+            self.counts['sent_followups'] += delta
+        elif status in ('replied', 'bounced'):
+            self.counts[status] += delta
+
+    def _apply(self, record):
+        row = record['row']
+        if not 0 <= row < len(self._status):
+            return
+        if 'status' in record:
+            self._count(self._status[row], -1)
+            self._status[row] = record['status']
+            self._count(record['status'], 1)
+        if 'follow_up_status' in record:
+            self._count_follow_up(self._follow_up_status[row], -1)
+            self._follow_up_status[row] = record['follow_up_status']
+            self._count_follow_up(record['follow_up_status'], 1)
+
+    def get(self):
+        csv_key = file_key(self.csv_path)
+        journal_key = file_key(self.journal.path)
+        journal_size = journal_key[1] if journal_key else 0
+
+        # A new base file, or a journal that was truncated behind our back
+        if csv_key != self._csv_key or journal_size < self._journal_offset:
+            self._load_base(csv_key)
+
+        if journal_size > self._journal_offset:
+            records, self._journal_offset = self.journal.read_from(self._journal_offset)
+            for record in records:
+                self._apply(record)
+        return dict(self.counts)
+
+
+class SqliteStatusCache:
+    """Dashboard counters for the SQLite ledger, re-read only when the database changes."""
+
+    def __init__(self, open_ledger, db_path):
+        self.open_ledger = open_ledger
+        self.db_path = db_path
+        self._key = None
+        self.counts = dict.fromkeys(COUNTER_NAMES, 0)
+
+    def get(self):
+        key = (file_key(self.db_path), file_key(self.db_path + '-wal'))
+        if key != self._key:
+            ledger = self.open_ledger()
+            self.counts = ledger.counts()
+            ledger.close()
+            self._key = key
+        return dict(self.counts)
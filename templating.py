@@ -0,0 +1,104 @@
+import random
+import string
+
+_formatter = string.Formatter()
+# Compiled templates, keyed by their source so they survive module reloads
+_cache = {}
+
+
+class TemplateError(ValueError):
+    """A template references a merge field it cannot fill."""
+
+
+def _compile_text(text, defaults):
+    """Split template text into a render plan of literals and (field, default) slots.
+
+    Merge fields are written {column} or {column|default}; {{ and }} are
+    literal braces.
+    """
+    plan = []
+    fields = []
+    for literal, field, spec, conversion in _formatter.parse(text):
+        if literal:
+            plan.append(literal)
+        if field is None:
+            continue
+        if spec or conversion:
+            raise TemplateError(f"Format specs are not supported in merge field {{{field}}}")
+        column, sep, default = field.partition('|')
+        column = column.strip().lower().replace(' ', '_').replace('-', '_')
+        if not column.isidentifier():
+            raise TemplateError(f"Invalid merge field {{{field}}}")
+        if not sep:
+            default = defaults.get(column)
+        plan.append((column, default))
+        fields.append(column)
+
+    # Merge adjacent literals so rendering touches as few parts as possible
+    merged = []
+    for part in plan:
+        if merged and isinstance(part, str) and isinstance(merged[-1], str):
+            merged[-1] += part
+        else:
+            merged.append(part)
+    return merged, fields
+
+
+def _render_plan(plan, row):
+    out = []
+    for part in plan:
+        if isinstance(part, str):
+            out.append(part)
+            continue
+        value = row.get(part[0])
+        if value is None or value == '':
+            value = part[1] or ''
+        out.append(value if isinstance(value, str) else str(value))
+    return ''.join(out)
+
+
+class CompiledTemplate:
+    """A subject/body pair parsed once into render plans."""
+
+    def __init__(self, subject, body, defaults=None):
+        defaults = defaults or {}
+        self.source = {'subject': subject, 'body': body}
+        self._subject, subject_fields = _compile_text(subject, defaults)
+        self._body, body_fields = _compile_text(body, defaults)
+        self.fields = set(subject_fields) | set(body_fields)
+        # Fields used at least once without any default to fall back on
+        self.required = {part[0] for part in self._subject + self._body
+                         if not isinstance(part, str) and part[1] is None}
+
+    def validate(self, columns):
+        """Raise TemplateError if a field is neither a column nor has a default."""
+        missing = sorted(f for f in self.required if f not in columns)
+        if missing:
+            raise TemplateError(
+                f"Template '{self.source['subject']}' uses {', '.join('{' + f + '}' for f in missing)} "
+                f"but the contact list has no such column and no default is set")
+
+    def render(self, row):
+        return _render_plan(self._subject, row), _render_plan(self._body, row)
+
+
+def compile_templates(templates, defaults=None):
+    """Compile a list of {"subject", "body"} dicts (cached by content)."""
+    defaults = defaults or {}
+    key = (tuple((t['subject'], t['body']) for t in templates), tuple(sorted(defaults.items())))
+    compiled = _cache.get(key)
+    if compiled is None:
+        compiled = [CompiledTemplate(t['subject'], t['body'], defaults) for t in templates]
+        _cache[key] = compiled
+    return compiled
+
+
+def validate_templates(compiled, columns):
+    for template in compiled:
+        template.validate(set(columns))
+
+
+def render_batch(compiled, rows, rng=random):
+    """Render a rotating template for each row in one pass: [(subject, body), ...]."""
+    choices = rng.choices(compiled, k=len(rows))
+    return [template.render(row) for template, row in zip(choices, rows)]
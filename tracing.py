@@ -0,0 +1,133 @@
+import json
+import time
+import functools
+import threading
+import contextvars
+from contextlib import nullcontext
+
+# Returned by span() while tracing is off, so a disabled span costs one call
+_NULL_SPAN = nullcontext()
+
+_active = None
+# Lane for spans that do not name one (set per sender account task)
+_lane = contextvars.ContextVar('trace_lane', default=None)
+
+
+class _Span:
+    def __init__(self, tracer, name, lane, args):
+        self.tracer = tracer
+        self.name = name
+        self.lane = lane
+        self.args = args
+
+    def __enter__(self):
+        self.start = self.tracer.clock.now()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.record(self.name, self.start, self.tracer.clock.now(),
+                           time.perf_counter() - self.wall_start, self.lane, self.args)
+        return False
+
+
+class Tracer:
+    """Collects timed spans of one campaign run.
+
+    Times come from the campaign's clock, so a simulated run
+    (transport.simulate_campaign) traces simulated time; each span also
+    keeps its real wall time ('wall_ms'), which is what CPU-bound steps
+    cost in a simulation. Spans are grouped
+    into lanes (one per sender account, see set_lane(), otherwise one per
+    thread) and exported as Chrome trace events: open the file in
+    chrome://tracing or https://ui.perfetto.dev.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.started = clock.now()
+        self.events = []
+        self._lanes = {}
+        self._lock = threading.Lock()
+
+    def span(self, name, lane=None, **args):
+        return _Span(self, name, lane or _lane.get() or threading.current_thread().name, args)
+
+    def record(self, name, start, end, wall_seconds, lane, args):
+        with self._lock:
+            tid = self._lanes.setdefault(lane, len(self._lanes) + 1)
+            self.events.append({
+                'name': name, 'ph': 'X', 'pid': 1, 'tid': tid,
+                'ts': (start - self.started).total_seconds() * 1e6,
+                'dur': (end - start).total_seconds() * 1e6,
+                'args': dict(args, wall_ms=round(wall_seconds * 1000, 3)),
+            })
+
+    def export(self, path):
+        """Write the spans as Chrome trace-event JSON."""
+        with self._lock:
+            lanes = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': lane}}
+                     for lane, tid in self._lanes.items()]
+            events = lanes + list(self.events)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, default=str)
+
+    def summary(self):
+        """[(name, count, total_seconds, max_seconds, wall_seconds)], slowest total first."""
+        totals = {}
+        with self._lock:
+            for event in self.events:
+                count, total, longest, wall = totals.get(event['name'], (0, 0.0, 0.0, 0.0))
+                seconds = event['dur'] / 1e6
+                totals[event['name']] = (count + 1, total + seconds, max(longest, seconds),
+                                         wall + event['args']['wall_ms'] / 1000)
+        return sorted(((name,) + values for name, values in totals.items()), key=lambda row: (-row[2], -row[4]))
+
+    def print_summary(self):
+        elapsed = (self.clock.now() - self.started).total_seconds()
+        print(f"⏱  Trace summary ({elapsed:.1f}s run; spans overlap their parents and other accounts' spans)")
+        print(f"   {'span':<20}{'count':>7}{'total s':>11}{'mean s':>10}{'max s':>10}{'% run':>8}{'wall s':>10}")
+        for name, count, total, longest, wall in self.summary():
+            share = total / elapsed * 100 if elapsed else 0.0
+            print(f"   {name:<20}{count:>7}{total:>11.3f}{total / count:>10.3f}{longest:>10.3f}"
+                  f"{share:>7.1f}%{wall:>10.3f}")
+
+
+def start(clock):
+    """Begin tracing; spans from any thread go to the returned tracer until stop()."""
+    global _active
+    _active = Tracer(clock)
+    return _active
+
+
+def stop():
+    global _active
+    tracer, _active = _active, None
+    return tracer
+
+
+def span(name, lane=None, **args):
+    """A span on the active tracer, or a no-op context when tracing is off."""
+    if _active is None:
+        return _NULL_SPAN
+    return _active.span(name, lane, **args)
+
+
+def traced(name):
+    """Decorator form of span(name)."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return fn(*args, **kwargs)
+            with _active.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def set_lane(name):
+    """Put spans from the current task (and the blocking calls it makes) in lane `name`."""
+    _lane.set(name)
@@ -0,0 +1,489 @@
+import json
+import random
+import time
+import asyncio
+import base64
+import email
+import heapq
+import itertools
+import threading
+from datetime import datetime, timedelta
+import httplib2
+from googleapiclient.errors import HttpError
+from engine import blocking_calls
+
+
+class SystemClock:
+    """Wall-clock time and real sleeps (the default for live campaigns)."""
+
+    def now(self):
+        return datetime.now()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    async def sleep_async(self, seconds):
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+
+class VirtualClock:
+    """Simulated time, run as a discrete-event scheduler.
+
+    Every sleep registers a wake-up time. Once nothing on the event loop
+    can run and no blocking call is in progress except the ones asleep
+    here, the clock jumps to the earliest wake-up and wakes whoever is due
+    then. So senders waiting at the same time wait in parallel, as they
+    would in real time. Sleeps made while no loop uses the clock (between
+    simulated runs) just move it forward.
+    """
+
+    # Loop turns with nothing to do before the clock moves on
+    SETTLE_TURNS = 10
+
+    def __init__(self, start=None):
+        self.current = start or datetime.now()
+        self.slept = 0.0
+        self._lock = threading.Lock()
+        # (wake-up time, sequence, future or threading.Event)
+        self._wakeups = []
+        self._sequence = itertools.count()
+        self._sleeping_threads = 0
+        self._loop = None
+        self._loop_thread = None
+        self._scheduler = None
+
+    def now(self):
+        return self.current
+
+    def _advance(self, until):
+        if until > self.current:
+            self.slept += (until - self.current).total_seconds()
+            self.current = until
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        loop = self._loop
+        if loop is None or loop.is_closed() or threading.current_thread() is self._loop_thread:
+            # No scheduler to wait for (or this is its own thread)
+            with self._lock:
+                self._advance(self.current + timedelta(seconds=seconds))
+            return
+        # A blocking call on the executor (e.g. send latency): park the thread
+        woken = threading.Event()
+        with self._lock:
+            heapq.heappush(self._wakeups, (self.current + timedelta(seconds=seconds), next(self._sequence), woken))
+            self._sleeping_threads += 1
+        loop.call_soon_threadsafe(self._ensure_scheduler)
+        woken.wait()
+
+    async def sleep_async(self, seconds):
+        if seconds <= 0:
+            # Still yield so other campaigns on the loop get a turn
+            await asyncio.sleep(0)
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.current_thread()
+        future = self._loop.create_future()
+        with self._lock:
+            heapq.heappush(self._wakeups, (self.current + timedelta(seconds=seconds), next(self._sequence), future))
+        self._ensure_scheduler()
+        await future
+
+    def _ensure_scheduler(self):
+        if self._scheduler is None or self._scheduler.done():
+            self._scheduler = self._loop.create_task(self._run_scheduler())
+
+    def _busy(self):
+        with self._lock:
+            return blocking_calls() > self._sleeping_threads
+
+    async def _settle(self):
+        """Return once everything that can run without the clock moving has run."""
+        idle = 0
+        while idle < self.SETTLE_TURNS:
+            if self._busy():
+                idle = 0
+                await asyncio.sleep(0.001)
+            else:
+                idle += 1
+                await asyncio.sleep(0)
+
+    async def _run_scheduler(self):
+        while True:
+            await self._settle()
+            with self._lock:
+                if not self._wakeups:
+                    return
+                when = self._wakeups[0][0]
+                self._advance(when)
+                due = []
+                while self._wakeups and self._wakeups[0][0] <= when:
+                    due.append(heapq.heappop(self._wakeups)[2])
+                for waiter in due:
+                    if isinstance(waiter, threading.Event):
+                        self._sleeping_threads -= 1
+            for waiter in due:
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                elif not waiter.done():
+                    waiter.set_result(None)
+
+
+SYSTEM_CLOCK = SystemClock()
+
+
+class GmailTransport:
+    """Sends through the real Gmail API (token.json / credentials.json by default)."""
+
+    def __init__(self, token_file=None, credentials_file=None):
+        self.token_file = token_file
+        self.credentials_file = credentials_file
+
+    def connect(self):
+        import send_emails
+        return send_emails.authenticate_gmail(token_file=self.token_file,
+                                              credentials_file=self.credentials_file)
+
+
+class FakeTransport:
+    """Hands out an in-process FakeGmailService instead of a real API client."""
+
+    def __init__(self, service):
+        self.service = service
+
+    def connect(self):
+        return self.service
+
+
+def _http_error(status, reason):
+    resp = httplib2.Response({'status': status})
+    resp.reason = reason
+    content = json.dumps({'error': {'code': status, 'message': reason}}).encode()
+    return HttpError(resp, content)
+
+
+class _Call:
+    """Mimics a googleapiclient request object: call .execute() to run it."""
+
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self):
+        return self._fn()
+
+
+class _FakeBatch:
+    def __init__(self, service, callback):
+        self._service = service
+        self._callback = callback
+        self._calls = []
+
+    def add(self, request, request_id=None, callback=None):
+        self._calls.append((request, request_id or str(len(self._calls)), callback or self._callback))
+
+    def execute(self):
+        # One round trip for the whole batch
+        self._service._pause()
+        for request, request_id, callback in self._calls:
+            try:
+                response = request._fn(latency=False)
+            except HttpError as error:
+                callback(request_id, None, error)
+            else:
+                callback(request_id, response, None)
+
+
+class _FakeHistory:
+    """users().history() of a FakeGmailService."""
+
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId='me', startHistoryId=None, historyTypes=None, labelId=None, pageToken=None,
+             maxResults=100):
+        service = self._service
+
+        def run(latency=True):
+            if latency:
+                service._pause()
+            start = int(startHistoryId)
+            if start < service.history_floor:
+                raise _http_error(404, 'Requested entity was not found.')
+            records = [(history_id, message) for history_id, message in service.history_log
+                       if history_id > start and (labelId is None or labelId in message['labelIds'])]
+            offset = int(pageToken or 0)
+            page = records[offset:offset + maxResults]
+            response = {'historyId': str(service.history_id),
+                        'history': [{'id': str(history_id),
+                                     'messagesAdded': [{'message': {'id': m['id'], 'threadId': m['threadId'],
+                                                                    'labelIds': list(m['labelIds'])}}]}
+                                    for history_id, m in page]}
+            if offset + maxResults < len(records):
+                response['nextPageToken'] = str(offset + maxResults)
+            return response
+        return _Call(run)
+
+
+class FakeGmailService:
+    """In-process stand-in for the Gmail API client returned by build().
+
+    Supports the calls the campaign makes (users().getProfile(),
+    users().messages().send(), .list() and .get(), users().history().list(),
+    new_batch_http_request()). Each call "takes" a random latency on the
+    supplied clock, and fails with a 429 or 5xx at the configured rates.
+    Sent messages are kept in `sent`; deliver(), reply() and bounce() put
+    incoming mail in `inbox`, and every message gets a history record.
+    """
+
+    def __init__(self, clock=None, email_address='sender@example.com', latency=(0.2, 0.8),
+                 rate_limit_rate=0.0, server_error_rate=0.0, seed=None):
+        self.clock = clock or SYSTEM_CLOCK
+        self.email_address = email_address
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.random = random.Random(seed)
+        self.sent = []
+        self.inbox = []
+        self.calls = 0
+        self.errors = {'429': 0, '5xx': 0}
+        self._ids = itertools.count(1)
+        # (history id, message) per added message; ids below the floor have expired
+        self.history_log = []
+        self.history_id = 1000
+        self.history_floor = 0
+
+    def _add(self, folder, message):
+        self.history_id += 1
+        folder.append(message)
+        self.history_log.append((self.history_id, message))
+        return message
+
+    def expire_history(self):
+        """Forget all history so far (Gmail keeps it for about a week)."""
+        self.history_log = []
+        self.history_floor = self.history_id
+
+    def deliver(self, from_address, subject='', thread_id=None, headers=None):
+        """Put an incoming message in the inbox; returns it."""
+        message_id = f"fake{next(self._ids):08x}"
+        headers = dict(headers or {})
+        headers.setdefault('From', from_address)
+        headers.setdefault('To', self.email_address)
+        headers.setdefault('Subject', subject)
+        headers.setdefault('Message-ID', f"<{message_id}@mail.example.com>")
+        return self._add(self.inbox, {'id': message_id, 'threadId': thread_id or message_id, 'to': headers['To'],
+                                      'subject': subject, 'message_id': headers['Message-ID'],
+                                      'time': self.clock.now(), 'labelIds': ['INBOX', 'UNREAD'],
+                                      'headers': headers})
+
+    def _sent_to(self, address):
+        for message in reversed(self.sent):
+            if address.lower() in (message['to'] or '').lower():
+                return message
+        raise KeyError(f"Nothing was sent to {address}")
+
+    def reply(self, address, headers=None):
+        """A reply from `address` in the thread of the last message sent to it."""
+        original = self._sent_to(address)
+        headers = dict(headers or {})
+        headers.setdefault('In-Reply-To', original['message_id'])
+        headers.setdefault('References', original['message_id'])
+        return self.deliver(address, f"Re: {original['subject']}", original['threadId'], headers)
+
+    def bounce(self, address):
+        """A delivery failure notice for the last message sent to `address`."""
+        original = self._sent_to(address)
+        return self.deliver('mailer-daemon@googlemail.com', 'Delivery Status Notification (Failure)',
+                            original['threadId'], {'X-Failed-Recipients': address})
+
+    def _pause(self):
+        self.calls += 1
+        self.clock.sleep(self.random.uniform(*self.latency))
+
+    def _maybe_fail(self):
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            self.errors['429'] += 1
+            raise _http_error(429, 'userRateLimitExceeded')
+        if roll < self.rate_limit_rate + self.server_error_rate:
+            self.errors['5xx'] += 1
+            raise _http_error(503, 'backendError')
+
+    # --- users() resource ---
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def history(self):
+        return _FakeHistory(self)
+
+    def getProfile(self, userId='me'):
+        def run(latency=True):
+            if latency:
+                self._pause()
+            return {'emailAddress': self.email_address, 'messagesTotal': len(self.sent) + len(self.inbox),
+                    'historyId': str(self.history_id)}
+        return _Call(run)
+
+    def send(self, userId='me', body=None):
+        def run(latency=True):
+            if latency:
+                self._pause()
+            self._maybe_fail()
+            raw = base64.urlsafe_b64decode(body['raw'])
+            parsed = email.message_from_bytes(raw)
+            message_id = f"fake{next(self._ids):08x}"
+            self._add(self.sent, {'id': message_id, 'threadId': message_id, 'to': parsed['to'],
+                                  'subject': parsed['subject'], 'message_id': parsed['Message-ID'],
+                                  'time': self.clock.now(), 'size': len(raw), 'labelIds': ['SENT'],
+                                  'headers': dict(parsed.items())})
+            return {'id': message_id, 'threadId': message_id, 'labelIds': ['SENT']}
+        return _Call(run)
+
+    def list(self, userId='me', q='', maxResults=100, pageToken=None, **kwargs):
+        """Search messages; understands in:, rfc822msgid:, to: and after: terms."""
+        def run(latency=True):
+            if latency:
+                self._pause()
+            matches = self.sent + self.inbox
+            for term in q.split():
+                name, _, value = term.partition(':')
+                if name == 'in':
+                    matches = [m for m in matches if value.upper() in m['labelIds']]
+                elif name == 'rfc822msgid':
+                    matches = [m for m in matches if (m['message_id'] or '').strip('<>') == value.strip('<>')]
+                elif name == 'to':
+                    matches = [m for m in matches if value in (m['to'] or '')]
+                elif name == 'after':
+                    after = datetime.strptime(value, '%Y/%m/%d')
+                    matches = [m for m in matches if m['time'] >= after]
+            matches.sort(key=lambda m: m['time'], reverse=True)  # Newest first, like Gmail
+            offset = int(pageToken or 0)
+            found = [{'id': m['id'], 'threadId': m['threadId']} for m in matches[offset:offset + maxResults]]
+            if not found:
+                return {'resultSizeEstimate': 0}
+            response = {'messages': found, 'resultSizeEstimate': len(matches)}
+            if offset + maxResults < len(matches):
+                response['nextPageToken'] = str(offset + maxResults)
+            return response
+        return _Call(run)
+
+    def get(self, userId='me', id=None, format='full', metadataHeaders=None):
+        """One message with its headers (format='metadata')."""
+        def run(latency=True):
+            if latency:
+                self._pause()
+            for message in self.sent + self.inbox:
+                if message['id'] == id:
+                    wanted = {h.lower() for h in metadataHeaders} if metadataHeaders else None
+                    headers = [{'name': name, 'value': value} for name, value in message['headers'].items()
+                               if wanted is None or name.lower() in wanted]
+                    return {'id': message['id'], 'threadId': message['threadId'],
+                            'labelIds': list(message['labelIds']), 'payload': {'headers': headers}}
+            raise _http_error(404, 'Requested entity was not found.')
+        return _Call(run)
+
+    def new_batch_http_request(self, callback=None):
+        return _FakeBatch(self, callback)
+
+
+def _add_run_stats(total, run):
+    """Fold one window's run_campaign() stats into the day's."""
+    for key in ('sent_new', 'sent_followup', 'failed', 'replied', 'bounced'):
+        total[key] += run[key]
+    for sender, account_stats in run['accounts'].items():
+        day = total['accounts'].setdefault(sender, {'sent': 0, 'failed': 0})
+        day['sent'] += account_stats['sent']
+        day['failed'] += account_stats['failed']
+    total['message'] = run['message'] or total['message']
+    return total
+
+
+def simulate_campaign(contacts=100000, start=None, latency=(0.2, 0.8), rate_limit_rate=0.0,
+                      server_error_rate=0.0, seed=1, workdir=None, accounts=1, backend='csv'):
+    """Run a full day's run_campaign() against the fake service on a virtual clock.
+
+    Builds a throwaway contact list with `contacts` pending rows in `workdir`
+    (a temp dir by default) and runs the campaign once per sending window of
+    the day, as auto_runner does. With accounts > 1 each sender account gets
+    its own fake service. Returns (stats summed over the windows, services, clock).
+    """
+    import os
+    import tempfile
+    import send_emails as se
+
+    workdir = workdir or tempfile.mkdtemp(prefix='campaign-sim-')
+    csv_path = os.path.join(workdir, 'emails.csv')
+    with open(csv_path, 'w') as f:
+        f.write('email,name,status,follow_up_status\n')
+        for i in range(contacts):
+            f.write(f'contact{i}@example.com,Contact {i},pending,pending\n')
+
+    calendar = se.get_send_calendar()
+    if start is None:
+        # Next new-email day, at the opening of its first window
+        day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        start = next(w.start for w in calendar.upcoming(day) if w.kind == 'new')
+    windows = [w for w in calendar.windows_on(start) if w.end > start]
+
+    clock = VirtualClock(start)
+    services = [FakeGmailService(clock, email_address=f'sender{i + 1}@example.com', latency=latency,
+                                 rate_limit_rate=rate_limit_rate, server_error_rate=server_error_rate,
+                                 seed=seed + i)
+                for i in range(accounts)]
+    random.seed(seed)
+
+    # Every ledger and state file points into `workdir`, so a simulation
+    # never touches the real contact list
+    saved = (se.EMAILS_FILE, se.LEDGER_DB_FILE, se.STORAGE_BACKEND, se.RATE_LIMIT_STATE_FILE,
+             se.MAILBOX_SYNC_STATE_FILE)
+    se.EMAILS_FILE, se.STORAGE_BACKEND = csv_path, backend
+    se.LEDGER_DB_FILE = os.path.join(workdir, 'emails.db')
+    se.RATE_LIMIT_STATE_FILE = os.path.join(workdir, 'rate_limits.json')
+    se.MAILBOX_SYNC_STATE_FILE = os.path.join(workdir, 'mailbox_sync.json')
+    stats = None
+    try:
+        for window in windows or [None]:
+            if window is not None and clock.now() < window.start:
+                clock.sleep((window.start - clock.now()).total_seconds())
+            run_stats = se.run_campaign(transport=[FakeTransport(s) for s in services], clock=clock)
+            stats = run_stats if stats is None else _add_run_stats(stats, run_stats)
+    finally:
+        (se.EMAILS_FILE, se.LEDGER_DB_FILE, se.STORAGE_BACKEND, se.RATE_LIMIT_STATE_FILE,
+         se.MAILBOX_SYNC_STATE_FILE) = saved
+    return stats, services, clock
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simulate a day's campaign against a fake Gmail service.")
+    parser.add_argument('--contacts', type=int, default=100000)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of sends failing with 429')
+    parser.add_argument('--server-error-rate', type=float, default=0.0, help='Fraction of sends failing with 503')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--accounts', type=int, default=1, help='Number of sender accounts')
+    parser.add_argument('--backend', choices=['csv', 'stream', 'sqlite'], default='csv', help='Contact storage backend')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats, services, clock = simulate_campaign(args.contacts, rate_limit_rate=args.rate_limit_rate,
+                                               server_error_rate=args.server_error_rate, seed=args.seed,
+                                               accounts=args.accounts, backend=args.backend)
+    elapsed = time.perf_counter() - started
+
+    print("\n" + "=" * 60)
+    print("🧪 Simulation Summary")
+    print(f"✓ Contacts: {args.contacts}")
+    for service in services:
+        print(f"✓ {service.email_address}: sent {len(service.sent)} ({service.calls} API calls, errors: {service.errors})")
+    print(f"✓ Simulated time: {clock.slept / 3600:.2f} h (ended {clock.now():%a %H:%M})")
+    print(f"✓ Wall time: {elapsed:.2f} s")
+    print(f"✓ Stats: {stats}")
+    print("=" * 60)